@@ -1,6 +1,9 @@
 # Database initialization function
 def init_db():
     db.create_all()
+    # Trigram index for the records search box (PostgreSQL only)
+    with db.engine.begin() as connection:
+        app.config['RECORD_SEARCH'] = 'trigram' if ensure_search_index(connection) else 'ngram'
     # Create admin if not exists
     admin = User.query.filter_by(username='admin').first()
     if not admin:
@@ -15,22 +18,64 @@ def init_db():
         print('✓ Admin user created: admin/admin123')
     else:
         print('✓ Database initialized')
-from flask import Flask, render_template, request, jsonify, send_file, session, redirect, url_for
+from flask import Flask, render_template, request, jsonify, send_file, session, redirect, url_for, g, has_app_context
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
+from werkzeug.http import parse_options_header
 from werkzeug.security import generate_password_hash, check_password_hash
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import json
 import os
+import tempfile
+import threading
 from datetime import datetime
 import io
 from docx import Document
 from docx.shared import Inches, Pt
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
+from app_package.services.aggregation import AggregationError, aggregate
+from app_package.services.analytics import active_engine, configure_engine, group_aggregate, pivot_table as analytics_pivot_table
+from app_package.services.background import ProgressJobs, RefreshWorker
+from app_package.services.bitmaps import BitmapIndex
+from app_package.services.changes import (
+    DELETE as CHANGE_DELETE, INSERT as CHANGE_INSERT, LOCK_KEY as CHANGE_LOG_LOCK, MAX_DELTA_RECORDS, RESET as CHANGE_RESET,
+    UPDATE as CHANGE_UPDATE, ChangeLogError, collapse as collapse_changes, parse_since,
+)
+from app_package.services.chart_data import (
+    BATCH_WORKERS as CHART_BATCH_WORKERS, MAX_BATCH_CHARTS, MAX_POINTS as CHART_MAX_POINTS, ChartDataError,
+    chart_series,
+)
+from app_package.services.dates import DateParser, broadcast, distinct_codes
+from app_package.services.exports import ArtifactCache, ExportJobError, ExportJobs, artifact_key, download_name
+from app_package.services.filters import (
+    FilterError, apply_filters, compile_sql, filter_records, parse_filters, value_text,
+)
+from app_package.services.filter_state import FilterStateCache
+from app_package.services.formats import (
+    ARROW_MIMETYPE, FormatError, arrow_stream, columnar, parse_format, records_columnar,
+)
+from app_package.services.lookups import reference_lookups
+from app_package.services.numeric import to_numeric as clean_numeric
+from app_package.services.paging import PagingError, paginate
+from app_package.services.pivot import PivotCache, PivotError, multi_pivot, parse_pivot_spec, spec_key
+from app_package.services.renderer import ChartRenderer
+from app_package.services.rollup import GRAIN as ROLLUP_GRAIN, LEVELS as ROLLUP_LEVELS, RollupCube, drill_down, roll_up
+from app_package.services.search import (
+    NgramIndexCache, SearchError, compile_search, decode_cursor as decode_search_cursor,
+    encode_cursor as encode_search_cursor, ensure_search_index, parse_query,
+)
+from app_package.services.sketches import SketchStore
+from app_package.services.snapshot import DerivedCache, SnapshotCache, decode_frame
+from app_package.services.spreadsheet import fill_sheet, frame_rows, open_workbook, write_rows
+from app_package.services.streaming import StreamError, parse_stream_options, stream_chunks, stream_file
+from app_package.services.word_tables import WORD_TABLE_ROWS, add_table, frame_columns, number_text, plain_text
 
 app = Flask(__name__)
 
@@ -55,110 +100,134 @@ def health_check():
 @app.route('/')
 def root_data():
     print(f"[LOG] Received request for / from {request.remote_addr} Origin: {request.headers.get('Origin')}")
-    # Fetch all records from the database
-    records = DatabaseRecord.query.order_by(DatabaseRecord.id.desc()).all()
-    data = [json.loads(r.data) for r in records]
-
-    # Calculate summary fields for dashboard
-    totalEklenen = len(data)
-    yeniEklenen = len([r for r in data if r.get('Status', '').lower() == 'yeni']) if data else 0
-    toplamKar = sum(float(r.get('KAR-ZARAR', 0) or 0) for r in data)
-
-    # Support ?year=YYYY for MonthlySalesChart
-    year = request.args.get('year', type=int)
-    sales = None
-    if year:
-        # Group by month, sum KAR-ZARAR for each month
-        sales_by_month = [0] * 12
-        for r in data:
-            date_str = r.get('(Week / Month)') or r.get('Tarih') or r.get('Date')
-            kar_zarar = float(r.get('KAR-ZARAR', 0) or 0)
-            if date_str:
-                try:
-                    # Try to extract month and year
-                    dt = None
-                    for fmt in ("%Y-%m-%d", "%d.%m.%Y", "%Y/%m/%d", "%d/%m/%Y"):
-                        try:
-                            dt = datetime.strptime(date_str[:10], fmt)
-                            break
-                        except Exception:
-                            continue
-                    if dt and dt.year == year:
-                        sales_by_month[dt.month - 1] += kar_zarar
-                except Exception:
-                    continue
-        sales = sales_by_month
-
-    response = {
-        "success": True,
-        "records": data,
-        "totalEklenen": totalEklenen,
-        "yeniEklenen": yeniEklenen,
-        "toplamKar": toplamKar
-    }
-    if sales is not None:
-        response["sales"] = sales
-    return jsonify(response)
+    try:
+        return tabular_response(dashboard_summary(request.args.get('year', type=int)), key='records')
+    except FormatError as e:
+        return jsonify({'error': str(e)}), 400
 
 @app.route('/api/data')
 def get_data():
     print(f"[LOG] Received request for /api/data from {request.remote_addr} Origin: {request.headers.get('Origin')}")
+    try:
+        return tabular_response(dashboard_summary(request.args.get('year', type=int)), key='records')
+    except FormatError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/data/changes')
+def get_data_changes():
+    """Records added, changed or deleted after version ?since= of the change log.
+
+    For clients keeping a local copy of the records: the response has version
+    (the since of the next call), records (each with its id) and deleted
+    (ids). With reset true, records is the full set and replaces the copy;
+    that happens for since=0 and whenever a delta would not bring the copy up
+    to date.
+    """
+    try:
+        since = parse_since(request.args.get('since'))
+        from sqlalchemy import func
+        latest, oldest = db.session.query(func.max(RecordChange.version), func.min(RecordChange.version)).one()
+        latest = latest or 0
+        
+        # Changes before the oldest retained one (or a reset) are gone; a since past latest is from another database
+        reset = since == 0 or oldest is None or since < oldest or since > latest
+        deleted = []
+        if not reset:
+            changes = db.session.query(RecordChange.record_id, RecordChange.operation).filter(
+                RecordChange.version > since, RecordChange.version <= latest, RecordChange.operation != CHANGE_RESET,
+            ).order_by(RecordChange.version).all()
+            changed, deleted = collapse_changes(changes)
+            reset = len(changed) + len(deleted) > MAX_DELTA_RECORDS
+        
+        if reset:
+            records = DatabaseRecord.query.order_by(DatabaseRecord.id.desc()).all()
+            deleted = []
+        else:
+            records = DatabaseRecord.query.filter(DatabaseRecord.id.in_(changed)).order_by(DatabaseRecord.id.desc()).all() if changed else []
+            # Deleted after the versions read above; their delete comes again in the next delta
+            found = {record.id for record in records}
+            deleted = sorted(set(deleted) | {record_id for record_id in changed if record_id not in found})
+        
+        return tabular_response({
+            'success': True,
+            'version': latest,
+            'reset': reset,
+            'records': [{**json.loads(record.data), 'id': record.id} for record in records],
+            'deleted': deleted,
+        }, key='records')
+    except (ChangeLogError, FormatError) as e:
+        return jsonify({'error': str(e)}), 400
+
+def response_format():
+    """format= from the query string, JSON body or form (rows when absent)"""
+    value = request.args.get('format')
+    if value is None and request.is_json:
+        value = (request.get_json(silent=True) or {}).get('format')
+    if value is None:
+        value = request.form.get('format')
+    return parse_format(value)
+
+def tabular_response(payload, rows=None, key='data', blank=None):
+    """jsonify payload with rows (a DataFrame, or payload[key] as record dicts) in the requested format.
+
+    format=columnar replaces payload[key] by columns plus a column -> values
+    dict; format=arrow sends the rows as an Arrow IPC stream with the rest of
+    the payload in its schema metadata. blank fills missing values of a
+    DataFrame in row JSON only; the other formats send them as nulls, so
+    numeric columns stay numeric.
+    """
+    fmt = response_format()
+    if rows is None:
+        rows = payload[key]
+    if fmt == 'rows':
+        if isinstance(rows, pd.DataFrame):
+            payload[key] = (rows.fillna(blank) if blank is not None else rows).to_dict('records')
+        else:
+            payload[key] = rows
+        return jsonify(payload)
+    payload = {name: value for name, value in payload.items() if name != key}
+    if fmt == 'columnar':
+        return jsonify({**payload, **(columnar(rows) if isinstance(rows, pd.DataFrame) else records_columnar(rows))})
+    frame = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(rows)
+    return app.response_class(arrow_stream(frame, payload), mimetype=ARROW_MIMETYPE)
+
+def dashboard_summary(year=None):
+    """All records plus the dashboard counters; with year, monthly KAR-ZARAR for the MonthlySalesChart"""
     # Fetch all records from the database
     records = DatabaseRecord.query.order_by(DatabaseRecord.id.desc()).all()
     data = [json.loads(r.data) for r in records]
 
-    # Calculate summary fields for dashboard
-    totalEklenen = len(data)
-    yeniEklenen = len([r for r in data if r.get('Status', '').lower() == 'yeni']) if data else 0
-    toplamKar = sum(float(r.get('KAR-ZARAR', 0) or 0) for r in data)
-
-    # Support ?year=YYYY for MonthlySalesChart
-    year = request.args.get('year', type=int)
-    sales = None
-    if year:
-        # Group by month, sum KAR-ZARAR for each month
-        sales_by_month = [0] * 12
-        for r in data:
-            date_str = r.get('(Week / Month)') or r.get('Tarih') or r.get('Date')
-            kar_zarar = float(r.get('KAR-ZARAR', 0) or 0)
-            if date_str:
-                try:
-                    # Try to extract month and year
-                    dt = None
-                    for fmt in ("%Y-%m-%d", "%d.%m.%Y", "%Y/%m/%d", "%d/%m/%Y"):
-                        try:
-                            dt = datetime.strptime(date_str[:10], fmt)
-                            break
-                        except Exception:
-                            continue
-                    if dt and dt.year == year:
-                        sales_by_month[dt.month - 1] += kar_zarar
-                except Exception:
-                    continue
-        sales = sales_by_month
+    # Status counts from the snapshot; KAR-ZARAR totals from the rollup cubes
+    result = aggregate(get_snapshot().frame, {'queries': {
+        'status': {'dimensions': ['Status'], 'measures': {'count': {'field': 'records', 'agg': 'count'}}},
+    }})
+    rollups = get_rollups()
+    kar_zarar = {'karZarar': {'field': 'recordedKarZarar', 'agg': 'sum'}}
+    totals = rollups.query(measures=kar_zarar)[0]
 
     response = {
         "success": True,
         "records": data,
-        "totalEklenen": totalEklenen,
-        "yeniEklenen": yeniEklenen,
-        "toplamKar": toplamKar
+        "totalEklenen": len(data),
+        "yeniEklenen": sum(row['count'] for row in result['status'] if row['Status'].lower() == 'yeni'),
+        "toplamKar": totals['karZarar']
     }
-    if sales is not None:
-        response["sales"] = sales
-    return jsonify(response)
+    if year:
+        # Group by month, sum KAR-ZARAR for each month
+        sales_by_month = [0] * 12
+        for row in rollups.query(level='month', year=year, measures=kar_zarar):
+            sales_by_month[int(row['period'][5:7]) - 1] = row['karZarar']
+        response["sales"] = sales_by_month
+    return response
 
 # New endpoint for StatisticsChart and PieChart
 @app.route('/api/stats')
 def get_stats():
-    records = DatabaseRecord.query.order_by(DatabaseRecord.id.desc()).all()
-    data = [json.loads(r.data) for r in records]
-    
-    apcb_keywords = ['AP-CB']
-    subcon_keywords = ['Subcon']
+    result = aggregate(get_snapshot().frame, {'queries': {'types': {
+        'dimensions': ['AP-CB / Subcon'], 'measures': {'count': {'field': 'records', 'agg': 'count'}}}}})
 
-    apcb = sum(1 for r in data if any(kw in r.get('AP-CB / Subcon', '') for kw in apcb_keywords))
-    subcon = sum(1 for r in data if any(kw in r.get('AP-CB / Subcon', '') for kw in subcon_keywords))
+    apcb = sum(row['count'] for row in result['types'] if 'AP-CB' in row['AP-CB / Subcon'])
+    subcon = sum(row['count'] for row in result['types'] if 'Subcon' in row['AP-CB / Subcon'])
     return jsonify({"apcb": apcb, "subcon": subcon})
 
 @app.route('/api/auto-calculated-fields')
@@ -312,24 +381,134 @@ app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
     'pool_pre_ping': True,
 }
 
+# Analytics engine for pivots and chart group-bys: 'auto' uses DuckDB when installed, else pandas
+app.config['ANALYTICS_ENGINE'] = os.environ.get('ANALYTICS_ENGINE', 'auto')
+configure_engine(app.config['ANALYTICS_ENGINE'])
+
+# Answer distinct counts and top-N slices from sketches unless a request passes approx=0
+app.config['APPROXIMATE_ANALYTICS'] = os.environ.get('APPROXIMATE_ANALYTICS', '').lower() in ('1', 'true', 'yes')
+
+# Worker processes rendering chart images for the Word exports
+app.config['CHART_RENDER_WORKERS'] = int(os.environ.get('CHART_RENDER_WORKERS', 2))
+_chart_renderer = ChartRenderer(workers=app.config['CHART_RENDER_WORKERS'])
+
+# Threads building queued exports, and where finished export files are cached
+app.config['EXPORT_JOB_WORKERS'] = int(os.environ.get('EXPORT_JOB_WORKERS', 2))
+app.config['EXPORT_CACHE_FOLDER'] = os.environ.get('EXPORT_CACHE_FOLDER', os.path.join(app.config['UPLOAD_FOLDER'], 'export_cache'))
+
+# Record changes kept for /api/data/changes; clients further behind get a full reload
+app.config['CHANGE_LOG_RETENTION'] = int(os.environ.get('CHANGE_LOG_RETENTION', 100000))
+
+# Threads filling uploaded DATABASE sheets, and rows read, filled and written per chunk
+app.config['FILL_JOB_WORKERS'] = int(os.environ.get('FILL_JOB_WORKERS', 1))
+app.config['FILL_CHUNK_ROWS'] = int(os.environ.get('FILL_CHUNK_ROWS', 5000))
+
 db = SQLAlchemy(app)
 
 # Cache for data to avoid reloading from database every time
-_data_cache = {
-    'data': None,
-    'timestamp': None,
-    'record_count': 0
-}
+_snapshot_cache = SnapshotCache()
+
+def get_dataset_version():
+    """Fingerprint of the records table; changes on every insert, update, delete and local write.
+
+    The table is read once per request (see forget_dataset_version for writes within it).
+    """
+    fingerprint = g.get('records_fingerprint')
+    if fingerprint is None:
+        from sqlalchemy import func
+        count, max_id, last_update = db.session.query(
+            func.count(DatabaseRecord.id), func.max(DatabaseRecord.id), func.max(DatabaseRecord.updated_at)
+        ).one()
+        fingerprint = g.records_fingerprint = f"{count}-{max_id or 0}-{last_update.isoformat() if last_update else ''}"
+    return f"{fingerprint}-{_snapshot_cache.generation}"
+
+def forget_dataset_version():
+    """Drop this request's reading of the records table after it wrote records"""
+    if has_app_context():
+        g.pop('records_fingerprint', None)
+
+def get_snapshot():
+    """Get the parsed records snapshot for the current dataset version"""
+    def load_rows():
+        print("Loading data from database...")
+        return db.session.query(DatabaseRecord.id, DatabaseRecord.personel, DatabaseRecord.data).all()
+    return _snapshot_cache.get(get_dataset_version(), load_rows)
+
+_search_index_cache = NgramIndexCache()
+
+_sketch_cache = DerivedCache(SketchStore.build)
+
+def get_sketches():
+    """Distinct-count and heavy-hitter sketches for the current dataset version"""
+    return _sketch_cache.get(get_dataset_version(), get_snapshot)
+
+_rollup_cache = DerivedCache(RollupCube.build)
+
+def get_rollups():
+    """MH and KAR/ZARAR rollup cubes for the current dataset version"""
+    return _rollup_cache.get(get_dataset_version(), get_snapshot)
+
+# Bitmap indexes for the filter option lists; rebuilt for each dataset version
+_bitmap_cache = DerivedCache(lambda snapshot: BitmapIndex(calculated_frame(snapshot), snapshot.version))
+
+def get_bitmap_index():
+    """Bitmap index over the current snapshot plus calculated columns"""
+    return _bitmap_cache.get(get_dataset_version(), get_snapshot)
+
+def record_change(version_before, added=(), removed=()):
+    """Fold a committed single-record write into the sketches and rollups instead of rebuilding them.
+
+    removed are the JSON texts of the replaced or deleted records.
+    """
+    version_after = get_dataset_version()
+    for name, cache in (('SKETCH', _sketch_cache), ('ROLLUP', _rollup_cache)):
+        try:
+            cache.apply(version_before, version_after, added, [json.loads(data) for data in removed])
+        except Exception as e:
+            print(f"[{name}] Incremental update failed, rebuilding on next use: {e}")
+            cache.invalidate()
+
+def distinct_within(df, col, limit, sketches=None, complete=False):
+    """Whether df[col] has 1..limit distinct values.
 
-def get_cache_key():
-    """Get cache key based on database record count"""
-    count = DatabaseRecord.query.count()
-    return count
+    sketches (over the whole database) settle clear cases without counting:
+    a subset never has more distinct values than the whole, and when df is the
+    whole database (complete) a column well above the limit is skipped too.
+    """
+    distinct = sketches.distinct_count(col) if sketches is not None else None
+    if distinct is not None:
+        if distinct['high'] <= limit:
+            return bool(df[col].notna().any())
+        if complete and distinct['low'] > limit:
+            return False
+    unique_count = df[col].nunique()
+    return 0 < unique_count <= limit
+
+def approximate_requested():
+    """Whether this request wants sketch-based answers (approx=1 in the query or JSON body, else the app default)"""
+    value = request.args.get('approx')
+    if value is None and request.is_json:
+        value = (request.get_json(silent=True) or {}).get('approx')
+    if value is None:
+        return app.config['APPROXIMATE_ANALYTICS']
+    return str(value).lower() in ('1', 'true', 'yes')
+
+# Last cascading-filter selection per session (see get_filtered_options)
+_filter_states = FilterStateCache()
+
+def filter_session_key():
+    """Key of this browser session in per-session caches"""
+    if 'filter_session' not in session:
+        session['filter_session'] = secrets.token_hex(8)
+    return session['filter_session']
 
 def clear_data_cache():
     """Clear the data cache"""
-    global _data_cache
-    _data_cache = {'data': None, 'timestamp': None, 'record_count': 0}
+    forget_dataset_version()
+    _snapshot_cache.invalidate()
+    _filter_states.invalidate()
+    # Materialized saved filters are refreshed for the new data off the request thread
+    _materialize_worker.schedule()
 
 # Database Models
 class User(db.Model):
@@ -361,6 +540,64 @@ class SavedFilter(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
+class MaterializedFilter(db.Model):
+    """Precomputed result of a saved filter marked "materialize", valid for one dataset version"""
+    id = db.Column(db.Integer, primary_key=True)
+    filter_id = db.Column(db.Integer, db.ForeignKey('saved_filter.id'), nullable=False, unique=True)
+    dataset_version = db.Column(db.String(200))  # None until first refreshed
+    row_ids = db.Column(db.Text)  # JSON list of matching DatabaseRecord ids
+    payload = db.Column(db.Text)  # JSON response of the pivot / charts for this filter
+    error = db.Column(db.Text)
+    refreshed_at = db.Column(db.DateTime)
+
+
+class RecordChange(db.Model):
+    """One insert, update or delete of a DatabaseRecord; version orders the changes.
+
+    A reset (record_id None) replaces every change before it when the table is cleared.
+    """
+    # Versions never go back, even after the log is emptied by a reset
+    __table_args__ = {'sqlite_autoincrement': True}
+    version = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    record_id = db.Column(db.Integer, index=True)
+    operation = db.Column(db.String(10), nullable=False)  # 'insert', 'update', 'delete' or 'reset'
+    changed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+@event.listens_for(db.session, 'after_flush')
+def log_record_changes(session, flush_context):
+    """Append the records written by this flush to the change log, in the same transaction"""
+    now = datetime.utcnow()
+    changes = [(CHANGE_INSERT, obj) for obj in session.new if isinstance(obj, DatabaseRecord)]
+    changes += [(CHANGE_UPDATE, obj) for obj in session.dirty
+                if isinstance(obj, DatabaseRecord) and session.is_modified(obj)]
+    changes += [(CHANGE_DELETE, obj) for obj in session.deleted if isinstance(obj, DatabaseRecord)]
+    if not changes:
+        return
+    forget_dataset_version()
+    connection = session.connection()
+    lock_change_log(connection)
+    connection.execute(RecordChange.__table__.insert(), [
+        {'record_id': obj.id, 'operation': operation, 'changed_at': now} for operation, obj in changes
+    ])
+    # Keep the newest CHANGE_LOG_RETENTION changes
+    from sqlalchemy import func, select
+    latest = connection.execute(select(func.max(RecordChange.version))).scalar()
+    connection.execute(RecordChange.__table__.delete().where(
+        RecordChange.version < latest - app.config['CHANGE_LOG_RETENTION']))
+
+def lock_change_log(connection):
+    """Hold the change log until this transaction ends, so versions commit in the order they were assigned"""
+    if connection.dialect.name == 'postgresql':
+        from sqlalchemy import text
+        connection.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': CHANGE_LOG_LOCK})
+
+def log_records_reset():
+    """Replace the change log by a reset, for writes that bypass the session (bulk deletes)"""
+    lock_change_log(db.session.connection())
+    RecordChange.query.delete()
+    db.session.add(RecordChange(operation=CHANGE_RESET))
+
 
 # File upload endpoint for frontend
 @app.route('/upload', methods=['POST'])
@@ -1140,91 +1377,49 @@ def load_excel_data(file_path, user_filter=None):
     
     return df
 
-def get_data_from_db(user_filter=None):
-    """Get data from database records with caching"""
-    global _data_cache
-    
+def get_data_from_db(user_filter=None, filters=None, encoded=False, numeric=None, calculated=False):
+    """Get data from database records with caching.
+
+    filters (a filter spec) is evaluated on the dictionary-encoded snapshot
+    before rows are copied out; keys that are not snapshot columns (calculated
+    columns) are left for the caller. encoded=True keeps Categorical columns
+    for read-only callers. Columns named in numeric come back as float64,
+    cleaned of currency formatting once per dataset version. calculated=True
+    includes the add_calculated_columns columns, computed once per version.
+    """
     try:
-        # DISABLE CACHE TEMPORARILY FOR DEBUGGING
-        # Check if we can use cached data (only for no filter case)
-        current_count = DatabaseRecord.query.count()
-        
-        print(f"DEBUG: Database has {current_count} records")
-        
-        # FORCE RELOAD - skip cache
-        # if user_filter is None and _data_cache['data'] is not None and _data_cache['record_count'] == current_count:
-        #     print(f"Using cached data ({current_count} records, {len(_data_cache['data'])} rows)")
-        #     return _data_cache['data'].copy()
-        
-        # Load fresh data from database
-        print(f"Loading data from database ({current_count} records)...")
-        if user_filter:
-            records = DatabaseRecord.query.filter_by(personel=user_filter).all()
-            print(f"DEBUG: Filtered to {len(records)} records for user {user_filter}")
-        else:
-            records = DatabaseRecord.query.all()
-            print(f"DEBUG: Loaded all {len(records)} records")
-        
-        if not records:
+        snapshot = get_snapshot()
+        if snapshot.frame.empty:
             print("DEBUG: No records found")
             return pd.DataFrame()
         
-        records_list = []
-        for record in records:
-            try:
-                record_dict = json.loads(record.data)
-                # Debug: Check date format after loading from database
-                if len(records_list) == 0 and '(Week / Month)' in record_dict:
-                    print(f"DEBUG LOAD: First date value after DB load: {record_dict['(Week / Month)']}")
-                records_list.append(record_dict)
-            except:
-                continue
-        
-        print(f"DEBUG: Parsed {len(records_list)} records into DataFrame")
-        
-        if records_list:
-            # Create DataFrame without automatic date parsing
-            df = pd.DataFrame(records_list, dtype=object)
-            
-            # Ensure date columns stay as strings (don't let pandas auto-convert)
-            for col in df.columns:
-                if 'week' in str(col).lower() or 'month' in str(col).lower() or 'date' in str(col).lower():
-                    df[col] = df[col].astype(str)
-            
-            # DEBUG: Force print to console
-            import sys
-            print("\n" + "="*80, file=sys.stderr, flush=True)
-            print(f"DEBUG DF: Created DataFrame with {len(df)} rows and {len(df.columns)} columns", file=sys.stderr, flush=True)
-            
-            # Debug: Check date column in DataFrame
-            if '(Week / Month)' in df.columns:
-                first_dates = df['(Week / Month)'].head(5).tolist()
-                print(f"DEBUG DF: (Week / Month) first 5 values: {first_dates}", file=sys.stderr, flush=True)
-                print(f"DEBUG DF: Sample date length: {len(first_dates[0]) if first_dates else 0}", file=sys.stderr, flush=True)
-            print("="*80 + "\n", file=sys.stderr, flush=True)
-            
-            # Ensure PERSONEL column exists for filtering but don't expose it
-            if 'Name Surname' in df.columns and 'PERSONEL' not in df.columns:
-                df['PERSONEL'] = df['Name Surname']
-            elif 'PERSONEL' in df.columns and 'Name Surname' not in df.columns:
-                # If only PERSONEL exists, create Name Surname
-                df['Name Surname'] = df['PERSONEL']
-            
-            # Cache the data if no filter
-            if user_filter is None:
-                _data_cache['data'] = df.copy()
-                _data_cache['timestamp'] = datetime.now()
-                _data_cache['record_count'] = current_count
-                print(f"Data cached successfully")
-            
-            return df
-        return pd.DataFrame()
+        if calculated:
+            df = calculated_frame(snapshot)
+            if user_filter is not None:
+                df = df[snapshot.rows_for_user(user_filter)]
+        else:
+            df = snapshot.view(user_filter)
+        if isinstance(filters, dict) and filters:
+            df = apply_filters(df, {key: spec for key, spec in filters.items() if key in df.columns})
+        print(f"DEBUG: Using snapshot {snapshot.version} ({len(df)} of {len(snapshot)} rows)")
+        # Callers add and convert columns in place, so hand out a copy of the cached frame
+        df = df.copy() if encoded else decode_frame(df)
+        if isinstance(numeric, str):
+            numeric = [numeric]
+        # The snapshot frame has a RangeIndex, so index labels are snapshot positions
+        positions = df.index.to_numpy()
+        for col in numeric or []:
+            if isinstance(col, str) and col in snapshot.frame.columns:
+                df[col] = snapshot.numeric(col)[positions]
+        return df
+    except FilterError:
+        raise
     except Exception as e:
         print(f"Database load error: {str(e)}")
         return pd.DataFrame()
 
-def get_combined_data(file_path=None, user_filter=None):
-    """Get data from both Excel file and database"""
+def get_combined_data(file_path=None, user_filter=None, filters=None, encoded=False, numeric=None, calculated=False):
+    """Get data from both Excel file and database; see get_data_from_db for filters, encoded and calculated"""
     dfs = []
     
     # Load from Excel if file exists
@@ -1232,32 +1427,97 @@ def get_combined_data(file_path=None, user_filter=None):
         try:
             df_excel = load_excel_data(file_path, user_filter)
             if not df_excel.empty:
-                dfs.append(df_excel)
+                dfs.append(add_calculated_columns(df_excel) if calculated else df_excel)
         except:
             pass
     
     # Load from database
-    df_db = get_data_from_db(user_filter)
+    df_db = get_data_from_db(user_filter, filters, encoded, numeric, calculated)
     if not df_db.empty:
         dfs.append(df_db)
     
     # Combine dataframes
+    if len(dfs) > 1 and calculated:
+        combined_df = pd.concat(dfs, ignore_index=True)
+        # Calculated columns last, as when they are added to the combined frame
+        order = [col for col in combined_df.columns if col not in CALCULATED_COLUMNS]
+        combined_df = combined_df[order + [col for col in CALCULATED_COLUMNS if col in combined_df.columns]]
+        combined_df.attrs[CALCULATED_FLAG] = True
+        return combined_df
     if dfs:
         combined_df = pd.concat(dfs, ignore_index=True)
         return combined_df
     return pd.DataFrame()
 
+# Dashboard filters use camelCase keys; each maps to the column names a record may use
+DASHBOARD_FILTER_FIELDS = {
+    'nameSurname': ['Name Surname', 'nameSurname', 'Name-Surname'],
+    'discipline': ['Discipline', 'discipline'],
+    'company': ['Company', 'company'],
+    'projectsGroup': ['Projects/Group', 'projectsGroup', 'Projects-Group'],
+    'scope': ['Scope', 'scope'],
+    'projects': ['Projects', 'projects'],
+    'nationality': ['Nationality', 'nationality'],
+    'status': ['Status', 'status'],
+    'northSouth': ['North/South', 'northSouth', 'North-South'],
+    'control1': ['Control-1', 'control1', 'Control1'],
+    'no1': ['NO-1', 'no1', 'NO1'],
+    'no2': ['NO-2', 'no2', 'NO2'],
+    'no3': ['NO-3', 'no3', 'NO3'],
+    'no10': ['NO-10', 'no10', 'NO10'],
+    'kontrol1': ['Kontrol-1', 'kontrol1', 'Kontrol1'],
+    'kontrol2': ['Kontrol-2', 'kontrol2', 'Kontrol2'],
+    'lsUnitRate': ['LS/Unit Rate', 'lsUnitRate', 'LS-Unit-Rate'],
+}
+
+# Record fields the dashboard option lists are read from, per filter key
+DASHBOARD_OPTION_FIELDS = {
+    'nameSurname': ['Name Surname', 'nameSurname', 'Name-Surname'],
+    'discipline': ['Discipline', 'discipline'],
+    'company': ['Company', 'company'],
+    'projectsGroup': ['Projects/Group', 'projectsGroup', 'Projects-Group'],
+    'scope': ['Scope', 'scope'],
+    'projects': ['Projects', 'projects'],
+    'nationality': ['Nationality', 'nationality'],
+    'status': ['Status', 'status'],
+    'northSouth': ['North/\nSouth', 'northSouth', 'North-South', "North/ South"],
+    'control1': ['Control-1', 'control1', 'Control1'],
+    'no1': ['NO-1', 'no1', 'NO1'],
+    'no2': ['NO-2', 'no2', 'NO2'],
+    'no3': ['NO-3', 'no3', 'NO3'],
+    'no10': ['NO-10', 'no10', 'NO10'],
+    'kontrol1': ['Konrol-1', 'kontrol1', 'Kontrol1'],
+    'kontrol2': ['Knrtol-2', 'kontrol2', 'Kontrol2'],
+    'lsUnitRate': ['LS/Unit Rate', 'lsUnitRate', 'LS-Unit-Rate'],
+}
+
+def query_records(filters=None, aliases=None, loose=False):
+    """Load record dicts from the database, pushing the filter spec down into SQL"""
+    from sqlalchemy import text
+    predicate = parse_filters(filters, aliases=aliases, loose=loose)
+    compiled = compile_sql(predicate, db.engine.dialect.name)
+    query = DatabaseRecord.query
+    if compiled.clause:
+        query = query.filter(text(compiled.clause).bindparams(**compiled.params))
+    data = [json.loads(r.data) for r in query.all()]
+    # Predicates SQL cannot express exactly (date windows, case-insensitive matching on SQLite) run on the loaded rows
+    return filter_records(data, compiled.residual)
+
+# Set in DataFrame.attrs once add_calculated_columns has run (also when source columns are missing)
+CALCULATED_FLAG = 'calculated_columns'
+CALCULATED_COLUMNS = ['KAR/ZARAR', 'BF KAR/ZARAR']
+
 def add_calculated_columns(df):
-    """Add KAR/ZARAR and BF KAR/ZARAR columns"""
+    """Add KAR/ZARAR and BF KAR/ZARAR columns; frames that already have them are returned as they are"""
     if df.empty:
         return df
     
-    df = df.copy()
-    
     # Check if columns already exist (cached data)
-    if 'KAR/ZARAR' in df.columns and 'BF KAR/ZARAR' in df.columns:
+    if ('KAR/ZARAR' in df.columns and 'BF KAR/ZARAR' in df.columns) or df.attrs.get(CALCULATED_FLAG):
         return df
     
+    df = df.copy()
+    
     col_isveren = None
     col_general = None
     col_birim = None
@@ -1309,10 +1569,18 @@ def add_calculated_columns(df):
             except:
                 return val
         
-        df[week_month_col] = df[week_month_col].apply(format_week_month)
+        # Dates repeat across rows, so format each distinct value once
+        codes, uniques = pd.factorize(df[week_month_col], use_na_sentinel=True)
+        formatted = np.array([format_week_month(v) for v in uniques] + [np.nan], dtype=object)
+        df[week_month_col] = formatted[codes]
     
+    df.attrs[CALCULATED_FLAG] = True
     return df
 
+def calculated_frame(snapshot):
+    """The snapshot frame with calculated columns, computed once per dataset version"""
+    return snapshot.derived('calculated', add_calculated_columns)
+
 def load_favorites():
     """Load favorite reports from JSON file"""
     try:
@@ -1641,39 +1909,19 @@ def download_calculated_data():
         # Get user filter (None for admin, name for regular users)
         user_filter = None if session.get('role') == 'admin' else session.get('name')
         
-        # Get all records from database
-        df = get_data_from_db(user_filter)
+        # All records, with the calculated columns (KAR/ZARAR, BF KAR/ZARAR); text columns
+        # stay dictionary-encoded and are converted one block of rows at a time
+        df = get_data_from_db(user_filter, calculated=True, encoded=True)
         
         if df.empty:
             return jsonify({'error': 'No data available'}), 404
         
-        # Add calculated columns (KAR/ZARAR, BF KAR/ZARAR)
-        df = add_calculated_columns(df)
-        
-        # Replace NaN and Inf values to prevent Excel export errors
-        # Replace NaN with empty string for object columns, 0 for numeric columns
-        import numpy as np
-        for col in df.columns:
-            if pd.api.types.is_numeric_dtype(df[col]):
-                # Replace Inf and -Inf with 0
-                df[col] = df[col].replace([np.inf, -np.inf], 0)
-                # Replace NaN with 0
-                df[col] = df[col].fillna(0)
-            else:
-                # Replace NaN with empty string for text columns
-                df[col] = df[col].fillna('')
-        
-        # Create Excel file in memory
-        from io import BytesIO
-        output = BytesIO()
-        
-        # Use pandas ExcelWriter with xlsxwriter engine for better formatting
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            df.to_excel(writer, sheet_name='Calculated Data', index=False)
-            
-            # Get workbook and worksheet objects
-            workbook = writer.book
-            worksheet = writer.sheets['Calculated Data']
+        # Spool the workbook to an anonymous temporary file in constant-memory mode and stream it;
+        # the file is deleted once the response closes it
+        spool = tempfile.TemporaryFile(suffix='.xlsx')
+        try:
+            workbook = open_workbook(spool)
+            worksheet = workbook.add_worksheet('Calculated Data')
             
             # Define formats
             header_format = workbook.add_format({
@@ -1715,50 +1963,50 @@ def download_calculated_data():
                 'Kontrol-2', 'Konrol-1', 'Knrtol-2', 'KAR/ZARAR', 'BF KAR/ZARAR'
             ]
             
-            # Format header row
+            # Column formats: numeric auto-calculated cells get the number format,
+            # other columns a background color
+            number_columns = {}
             for col_num, col_name in enumerate(df.columns):
-                worksheet.write(0, col_num, col_name, header_format)
-                
                 # Determine if column is auto-calculated
                 is_auto_calc = any(field.lower() in col_name.lower().replace('\n', ' ') 
                                   for field in auto_calc_fields)
                 
-                # Apply formatting to data cells
                 if is_auto_calc:
                     # Check if numeric column
                     if pd.api.types.is_numeric_dtype(df[col_name]):
-                        for row_num in range(len(df)):
-                            worksheet.write(row_num + 1, col_num, df.iloc[row_num, col_num], number_format)
+                        number_columns[col_num] = number_format
                     else:
                         worksheet.set_column(col_num, col_num, 15, auto_calc_format)
                 else:
                     worksheet.set_column(col_num, col_num, 15, manual_format)
             
-            # Add a legend sheet
-            legend_df = pd.DataFrame({
-                'Field Type': ['Manual Input', 'Auto-Calculated'],
-                'Color Code': ['Light Blue', 'Light Green'],
-                'Description': [
-                    'Fields that require manual input from users',
-                    'Fields automatically calculated based on Excel formulas'
-                ]
-            })
-            legend_df.to_excel(writer, sheet_name='Legend', index=False)
+            # Rows in order, NaN and Inf written as 0 in numeric columns and blank in text columns
+            write_rows(workbook, worksheet, df.columns, frame_rows(df, fill_numeric=0),
+                       header_format=header_format, column_formats=number_columns)
             
-            # Format legend sheet
-            legend_sheet = writer.sheets['Legend']
-            for col_num, col_name in enumerate(legend_df.columns):
-                legend_sheet.write(0, col_num, col_name, header_format)
+            # Add a legend sheet
+            legend_sheet = workbook.add_worksheet('Legend')
+            legend_columns = ['Field Type', 'Color Code', 'Description']
+            legend_rows = [
+                ('Manual Input', 'Light Blue', 'Fields that require manual input from users'),
+                ('Auto-Calculated', 'Light Green', 'Fields automatically calculated based on Excel formulas'),
+            ]
+            for col_num in range(len(legend_columns)):
                 legend_sheet.set_column(col_num, col_num, 20)
-        
-        output.seek(0)
+            write_rows(workbook, legend_sheet, legend_columns, legend_rows, header_format=header_format)
+            
+            workbook.close()
+            spool.seek(0)
+        except Exception:
+            spool.close()
+            raise
         
         # Generate filename with timestamp
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         filename = f'calculated_data_{timestamp}.xlsx'
         
         return send_file(
-            output,
+            spool,
             mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
             as_attachment=True,
             download_name=filename
@@ -1820,6 +2068,7 @@ def add_record():
             print(f'DEBUG: Merged manual values: {manual_values}')
         
         # Create new record
+        version_before = get_dataset_version()
         new_record = DatabaseRecord(
             personel=personel,
             data=json.dumps(record_data)
@@ -1829,6 +2078,7 @@ def add_record():
         
         # Clear cache to force reload
         clear_data_cache()
+        record_change(version_before, added=[record_data])
         
         return jsonify({'success': True, 'message': 'Record added successfully'})
     except Exception as e:
@@ -1850,39 +2100,22 @@ def get_records():
             page = 1
             per_page = 10
 
-        # Search parameter (search by personel / Name Surname)
+        # Search across name, Company, Projects, Scope and ID
         search = (request.args.get('search') or '').strip()
+        personel = None if session.get('role') == 'admin' else session.get('name')
+
+        if search:
+            return search_records(search, page, per_page, personel, request.args.get('after'))
 
         # Build base query depending on role
-        if session.get('role') == 'admin':
+        if personel is None:
             base_query = DatabaseRecord.query
         else:
-            base_query = DatabaseRecord.query.filter_by(personel=session.get('name'))
-
-        # Apply search filter on the personel column
-        if search:
-            try:
-                base_query = base_query.filter(DatabaseRecord.personel.ilike(f"%{search}%"))
-            except Exception:
-                # Fallback to simple filter (case-sensitive) if ilike not supported
-                base_query = base_query.filter(DatabaseRecord.personel.contains(search))
+            base_query = DatabaseRecord.query.filter_by(personel=personel)
 
         # Use SQLAlchemy pagination to avoid loading everything into memory
         pagination = base_query.order_by(DatabaseRecord.id.desc()).paginate(page=page, per_page=per_page, error_out=False)
-        items = pagination.items
-
-        records_list = []
-        for record in items:
-            record_dict = json.loads(record.data)
-            record_dict['id'] = record.id
-            
-            # Remove duplicate field names (keep only the standard ones)
-            if 'North/\nSouth' in record_dict:
-                del record_dict['North/\nSouth']
-            if 'North/ South' in record_dict:
-                del record_dict['North/ South']
-            
-            records_list.append(record_dict)
+        records_list = [record_to_dict(record) for record in pagination.items]
 
         return jsonify({
             'success': True,
@@ -1892,10 +2125,64 @@ def get_records():
             'pages': pagination.pages,
             'total': pagination.total
         })
+    except SearchError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+def record_to_dict(record):
+    """Record payload for the records table"""
+    record_dict = json.loads(record.data)
+    record_dict['id'] = record.id
+
+    # Remove duplicate field names (keep only the standard ones)
+    if 'North/\nSouth' in record_dict:
+        del record_dict['North/\nSouth']
+    if 'North/ South' in record_dict:
+        del record_dict['North/ South']
+    return record_dict
+
+
+def search_records(search, page, per_page, personel=None, after=None):
+    """Ranked search response; 'after' is the keyset cursor from the previous page's next_cursor"""
+    from sqlalchemy import text
+    terms = parse_query(search)
+    page = max(page, 1)
+    per_page = max(min(per_page, 500), 1)
+    after_key = decode_search_cursor(after) if after else None
+    # Page numbers still work for the table's page links; keyset cursors skip the offset
+    offset = 0 if after_key else (page - 1) * per_page
+
+    if app.config.get('RECORD_SEARCH') == 'trigram':
+        page_sql, count_sql, params = compile_search(terms, personel=personel, after=after_key)
+        rows = db.session.execute(text(page_sql), {**params, 'limit': per_page, 'offset': offset}).all()
+        ids, scores = [row[0] for row in rows], [float(row[1]) for row in rows]
+        total = db.session.execute(text(count_sql), params).scalar()
+    else:
+        snapshot = get_snapshot()
+        rows = None if personel is None else snapshot.rows_for_user(personel)
+        ids, scores, total = _search_index_cache.get(snapshot).page(terms, per_page, offset, after_key, rows)
+
+    records = {record.id: record for record in DatabaseRecord.query.filter(DatabaseRecord.id.in_(ids)).all()} if ids else {}
+    records_list = []
+    for record_id, score in zip(ids, scores):
+        if record_id in records:
+            record_dict = record_to_dict(records[record_id])
+            record_dict['_score'] = score
+            records_list.append(record_dict)
+
+    return jsonify({
+        'success': True,
+        'records': records_list,
+        'page': page,
+        'per_page': per_page,
+        'pages': (total + per_page - 1) // per_page,
+        'total': total,
+        'next_cursor': encode_search_cursor(scores[-1], ids[-1]) if len(ids) == per_page else None
+    })
+
+
 @app.route('/api/get-record/<int:record_id>', methods=['GET'])
 @login_required
 def get_record(record_id):
@@ -1950,6 +2237,8 @@ def update_record(record_id):
         # Apply automatic calculations
         record_data = calculate_auto_fields(record_data, file_path)
         
+        version_before = get_dataset_version()
+        old_data = record.data
         record.personel = record_data.get('PERSONEL', record.personel)
         record.data = json.dumps(record_data)
         record.updated_at = datetime.utcnow()
@@ -1958,6 +2247,7 @@ def update_record(record_id):
         
         # Clear cache to force reload
         clear_data_cache()
+        record_change(version_before, added=[record_data], removed=[old_data])
         
         return jsonify({'success': True, 'message': 'Record updated successfully'})
     except Exception as e:
@@ -1978,8 +2268,15 @@ def delete_record(record_id):
         if not record:
             return jsonify({'error': 'Record not found'}), 404
         
+        version_before = get_dataset_version()
+        old_data = record.data
         db.session.delete(record)
         db.session.commit()
+        
+        # Clear cache to force reload
+        clear_data_cache()
+        record_change(version_before, removed=[old_data])
+        
         return jsonify({'success': True, 'message': 'Record deleted successfully'})
     except Exception as e:
         db.session.rollback()
@@ -2553,6 +2850,7 @@ def clear_database():
         
         deleted = DatabaseRecord.query.delete()
         print(f"DEBUG: Deleted {deleted} records", file=sys.stderr, flush=True)
+        log_records_reset()
         
         db.session.commit()
         print("DEBUG: Database commit successful", file=sys.stderr, flush=True)
@@ -2640,13 +2938,17 @@ def check_session():
         
         # Get combined data from file and database
         file_path = session.get('current_file')
-        df = get_combined_data(file_path, user_filter)
+        df = get_combined_data(file_path, user_filter, calculated=True)
+        # Sketches cover the whole database; usable when this is exactly that
+        sketches = None
+        if approximate_requested() and user_filter is None and not (file_path and os.path.exists(file_path)):
+            sketches = get_sketches()
         
         if df.empty:
             return jsonify({'hasData': False})
         
-        # Add calculated columns (will use cached if available)
-        df_with_calc = add_calculated_columns(df)
+        # Calculated columns come with the data, computed once per dataset version
+        df_with_calc = df
         
         # Get all columns including calculated ones
         all_columns = df_with_calc.columns.tolist()
@@ -2666,7 +2968,7 @@ def check_session():
         
         # Always add Name Surname filter first (important for filtering by person)
         if 'Name Surname' in df_with_calc.columns:
-            name_values = sorted([str(v) for v in df_with_calc['Name Surname'].dropna().unique()])
+            name_values = sorted([value_text(v) for v in df_with_calc['Name Surname'].dropna().unique()])
             if name_values:
                 filter_cols.append({
                     'name': 'Name Surname',
@@ -2681,12 +2983,9 @@ def check_session():
             # Check if column is categorical (not purely numeric)
             try:
                 # Try to detect categorical columns
-                unique_count = df_with_calc[col].nunique()
-                total_count = len(df_with_calc[col].dropna())
-                
                 # If column has reasonable number of unique values, add to filters
                 # Max 200 unique values to accommodate other columns
-                if unique_count > 0 and unique_count <= 200:
+                if distinct_within(df_with_calc, col, 200, sketches, complete=True):
                     # Check if it's not a purely numeric column with many values
                     non_null_values = df_with_calc[col].dropna()
                     if len(non_null_values) > 0:
@@ -2699,7 +2998,7 @@ def check_session():
                             print(f"DEBUG RAW DF: Dtype: {df_with_calc[col].dtype}", file=sys.stderr, flush=True)
                         
                         # Add to filters
-                        unique_values = sorted([str(v) for v in df_with_calc[col].dropna().unique()])
+                        unique_values = sorted([value_text(v) for v in df_with_calc[col].dropna().unique()])
                         
                         # Debug date column - FORCE OUTPUT
                         if 'week' in col.lower() or 'month' in col.lower():
@@ -2856,6 +3155,9 @@ def upload_file():
         if session.get('role') != 'admin':
             return jsonify({'error': 'Only admin can upload files'}), 403
         
+        # Reject an unknown format= before any rows are saved
+        response_format()
+        
         if 'file' not in request.files:
             return jsonify({'error': 'No file provided'}), 400
         
@@ -2987,22 +3289,19 @@ def upload_file():
         # Apply calculated columns after basic info is ready
         df = add_calculated_columns(df)
         
-        # Convert to JSON-friendly format (full dataset)
-        df_clean = df.fillna('')
-        data_json = df_clean.to_dict('records')
-        
         print(f"Upload successful, returning response")
-        return jsonify({
+        return tabular_response({
             'success': True,
             'shape': df.shape,
             'columns': df.columns.tolist(),
             'filter_columns': filter_cols,
-            'data': data_json,
             'saved_to_db': saved_count,
             'skipped': skipped_count,
             'message': f'File uploaded successfully! {df.shape[0]} rows, {df.shape[1]} columns. Saved {saved_count} records to database.'
-        })
+        }, df, blank='')
     
+    except FormatError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Upload error: {str(e)}")
         import traceback
@@ -3049,7 +3348,7 @@ def set_if_empty(df, idx, col_name, value, debug=False):
             return True
     return False
 
-def fill_empty_cells_with_formulas(df, info_df, rates_df, summary_df):
+def fill_empty_cells_with_formulas(df, info_df, rates_df, summary_df, lookups=None):
     """
     Fill empty cells in DATABASE sheet based on Excel formulas.
     
@@ -3061,6 +3360,8 @@ def fill_empty_cells_with_formulas(df, info_df, rates_df, summary_df):
         info_df: DataFrame from Info sheet
         rates_df: DataFrame from Hourly Rates sheet  
         summary_df: DataFrame from Summary sheet
+        lookups: reference_lookups() of the three sheets, to reuse their
+            indexes when the sheet is filled a chunk at a time
         
     Returns:
         DataFrame with empty cells filled
@@ -3068,6 +3369,9 @@ def fill_empty_cells_with_formulas(df, info_df, rates_df, summary_df):
     print(f"Starting to fill empty cells for {len(df)} rows...")
     print(f"Columns in DataFrame: {df.columns.tolist()}")
     
+    # XLOOKUPs on the reference sheets, answered from indexes built on first use
+    info, rates, summary = lookups or reference_lookups(info_df, rates_df, summary_df)
+    
     # Create a copy to avoid modifying original
     result_df = df.copy()
     
@@ -3134,7 +3438,7 @@ def fill_empty_cells_with_formulas(df, info_df, rates_df, summary_df):
         # FORMULA 1: North/South = XLOOKUP($G,Info!$N:$N,Info!$Q:$Q)
         # ============================================================
         if col_north_south:
-            north_south = xlookup(scope, info_df.iloc[:, 13], info_df.iloc[:, 16], '')
+            north_south = info.xlookup(scope, 13, 16, '')
             set_if_empty(result_df, idx, col_north_south, north_south)
         
         # ============================================================
@@ -3144,7 +3448,7 @@ def fill_empty_cells_with_formulas(df, info_df, rates_df, summary_df):
             if person_id == 905264:
                 currency = 'TL'
             else:
-                currency = xlookup(person_id, rates_df.iloc[:, 0], rates_df.iloc[:, 6], 'USD')
+                currency = rates.xlookup(person_id, 0, 6, 'USD')
             set_if_empty(result_df, idx, col_currency, currency)
             currency = result_df.at[idx, col_currency]  # Get actual value (might not have been set)
         else:
@@ -3187,9 +3491,9 @@ def fill_empty_cells_with_formulas(df, info_df, rates_df, summary_df):
         # FORMULA 5: Hourly Base Rate
         # ============================================================
         if ap_cb_subcon == 'Subcon' and ls_unit_rate == 'Unit Rate':
-            hourly_base_rate = safe_float(xlookup(person_id, rates_df.iloc[:, 0], rates_df.iloc[:, 9], 0))
+            hourly_base_rate = safe_float(rates.xlookup(person_id, 0, 9, 0))
         else:
-            hourly_base_rate = safe_float(xlookup(person_id, rates_df.iloc[:, 0], rates_df.iloc[:, 7], 0))
+            hourly_base_rate = safe_float(rates.xlookup(person_id, 0, 7, 0))
         
         if idx == 0:
             print(f"\n=== DEBUG ROW 0 - Hourly Base Rate ===")
@@ -3218,16 +3522,17 @@ def fill_empty_cells_with_formulas(df, info_df, rates_df, summary_df):
         # ============================================================
         currency_normalized = safe_str(currency, 'USD').strip().upper()
         
+        additional_base = 0
         if ls_unit_rate == 'Lumpsum':
             hourly_additional_rate = 0
         elif company == 'AP-CB' or company == 'AP-CB / pergel':
             hourly_additional_rate = 0
         else:
-            additional_base = safe_float(xlookup(person_id, rates_df.iloc[:, 0], rates_df.iloc[:, 11], 0))
+            additional_base = safe_float(rates.xlookup(person_id, 0, 11, 0))
             if currency_normalized == 'USD':
                 hourly_additional_rate = additional_base
             elif currency_normalized == 'TL':
-                tcmb_rate = safe_float(xlookup(week_month, info_df.iloc[:, 20], info_df.iloc[:, 22], 1))
+                tcmb_rate = safe_float(info.xlookup(week_month, 20, 22, 1))
                 hourly_additional_rate = additional_base * tcmb_rate
             else:
                 hourly_additional_rate = 0
@@ -3280,7 +3585,7 @@ def fill_empty_cells_with_formulas(df, info_df, rates_df, summary_df):
         currency_normalized = safe_str(currency, 'USD').strip().upper()
         
         if currency_normalized == "TL":
-            tcmb_rate = safe_float(xlookup(week_month, info_df.iloc[:, 20], info_df.iloc[:, 22], 1))
+            tcmb_rate = safe_float(info.xlookup(week_month, 20, 22, 1))
             # Convert TL to USD by dividing by the USD/TRY exchange rate
             # Example: 292999.25 TL / 34.57 (USD/TRY) = 8475.67 USD
             general_total_cost_usd = cost / tcmb_rate if tcmb_rate != 0 else 0
@@ -3290,7 +3595,7 @@ def fill_empty_cells_with_formulas(df, info_df, rates_df, summary_df):
                 print(f"  Cost (TL): {cost}, General Total Cost USD: {general_total_cost_usd}")
                 
         elif currency_normalized == "EURO":
-            tcmb_eur_usd = safe_float(xlookup(week_month, info_df.iloc[:, 20], info_df.iloc[:, 23], 1))
+            tcmb_eur_usd = safe_float(info.xlookup(week_month, 20, 23, 1))
             # Convert EUR to USD using EUR/USD rate
             general_total_cost_usd = cost * tcmb_eur_usd
             
@@ -3322,17 +3627,17 @@ def fill_empty_cells_with_formulas(df, info_df, rates_df, summary_df):
         # Get NO-1, NO-2, NO-3, NO-10 for İşveren calculations
         # NOTE: Always use calculated values for İşveren calculations
         # ============================================================
-        no_1 = xlookup(scope, info_df.iloc[:, 13], info_df.iloc[:, 9], 0)
+        no_1 = info.xlookup(scope, 13, 9, 0)
         if col_no_1:
             set_if_empty(result_df, idx, col_no_1, no_1)
             # Always use calculated no_1 for İşveren formulas
         
-        no_2 = xlookup(scope, info_df.iloc[:, 13], info_df.iloc[:, 11], '')
+        no_2 = info.xlookup(scope, 13, 11, '')
         if col_no_2:
             set_if_empty(result_df, idx, col_no_2, no_2)
             # Always use calculated no_2 for İşveren formulas
         
-        no_3 = xlookup(scope, info_df.iloc[:, 13], info_df.iloc[:, 12], '')
+        no_3 = info.xlookup(scope, 13, 12, '')
         
         if idx == 0:
             print(f"\n=== DEBUG ROW 0 - NO-3 ===")
@@ -3351,7 +3656,7 @@ def fill_empty_cells_with_formulas(df, info_df, rates_df, summary_df):
             set_if_empty(result_df, idx, col_no_3, no_3)
             # Always use calculated no_3
         
-        no_10 = xlookup(no_1, info_df.iloc[:, 9], info_df.iloc[:, 10], '')
+        no_10 = info.xlookup(no_1, 9, 10, '')
         if col_no_10:
             set_if_empty(result_df, idx, col_no_10, no_10)
             # Always use calculated no_10
@@ -3367,11 +3672,11 @@ def fill_empty_cells_with_formulas(df, info_df, rates_df, summary_df):
         elif no_1_num in [312, 314, 316] or no_2_str == '360-T':
             isveren_hakedis_birim_fiyat = hourly_rate * 1.02
         elif no_2_str == '517-A':
-            isveren_hakedis_birim_fiyat = safe_float(xlookup(person_id, info_df.iloc[:, 28], info_df.iloc[:, 33], 0))
+            isveren_hakedis_birim_fiyat = safe_float(info.xlookup(person_id, 28, 33, 0))
         else:
             if summary_df is not None:
-                val1 = safe_float(xlookup(no_1, summary_df.iloc[:, 2], summary_df.iloc[:, 26], 0))
-                val2 = safe_float(xlookup(no_2, summary_df.iloc[:, 2], summary_df.iloc[:, 26], 0))
+                val1 = safe_float(summary.xlookup(no_1, 2, 26, 0))
+                val2 = safe_float(summary.xlookup(no_2, 2, 26, 0))
                 isveren_hakedis_birim_fiyat = val1 + val2
             else:
                 isveren_hakedis_birim_fiyat = 0
@@ -3396,7 +3701,7 @@ def fill_empty_cells_with_formulas(df, info_df, rates_df, summary_df):
         # FORMULA 13: İşveren Hakediş (USD)
         # ============================================================
         if isveren_currency == 'EURO':
-            eur_usd_rate = safe_float(xlookup(week_month, info_df.iloc[:, 20], info_df.iloc[:, 23], 1))
+            eur_usd_rate = safe_float(info.xlookup(week_month, 20, 23, 1))
             isveren_hakedis_usd = isveren_hakedis * eur_usd_rate
         else:
             isveren_hakedis_usd = isveren_hakedis
@@ -3419,7 +3724,7 @@ def fill_empty_cells_with_formulas(df, info_df, rates_df, summary_df):
         # FORMULA 15: Control-1
         # ============================================================
         if col_control_1:
-            control_1 = xlookup(projects, info_df.iloc[:, 14], info_df.iloc[:, 18], '')
+            control_1 = info.xlookup(projects, 14, 18, '')
             set_if_empty(result_df, idx, col_control_1, control_1)
         
         # ============================================================
@@ -3427,7 +3732,7 @@ def fill_empty_cells_with_formulas(df, info_df, rates_df, summary_df):
         # ============================================================
         if col_tm_liste:
             try:
-                tm_liste = xlookup(person_id, info_df.iloc[:, 58], info_df.iloc[:, 60], '')
+                tm_liste = info.xlookup(person_id, 58, 60, '')
             except:
                 tm_liste = ''
             set_if_empty(result_df, idx, col_tm_liste, tm_liste)
@@ -3436,14 +3741,14 @@ def fill_empty_cells_with_formulas(df, info_df, rates_df, summary_df):
         # FORMULA 17: TM KOD
         # ============================================================
         if col_tm_kod:
-            tm_kod = xlookup(projects, info_df.iloc[:, 14], info_df.iloc[:, 17], '')
+            tm_kod = info.xlookup(projects, 14, 17, '')
             set_if_empty(result_df, idx, col_tm_kod, tm_kod)
         
         # ============================================================
         # FORMULA 18: Kontrol-1
         # ============================================================
         if col_kontrol_1:
-            kontrol_1 = xlookup(projects, info_df.iloc[:, 14], info_df.iloc[:, 9], '')
+            kontrol_1 = info.xlookup(projects, 14, 9, '')
             set_if_empty(result_df, idx, col_kontrol_1, kontrol_1)
         
         # ============================================================
@@ -3492,12 +3797,62 @@ def fill_empty_cells_with_formulas(df, info_df, rates_df, summary_df):
     return result_df
 
 
+def fill_uploaded_workbook(progress, filepath, output_filepath, references):
+    """Fill the DATABASE sheet of an uploaded workbook a chunk of rows at a time into output_filepath"""
+    info_df, rates_df, summary_df = references
+    lookups = reference_lookups(info_df, rates_df, summary_df)
+    
+    def fill(chunk):
+        return fill_empty_cells_with_formulas(chunk, info_df, rates_df, summary_df, lookups=lookups)
+    
+    print(f"Filling DATABASE sheet of {filepath} into {output_filepath}...")
+    try:
+        rows, columns = fill_sheet(filepath, output_filepath, 'DATABASE', fill, progress=progress,
+                                   chunk_rows=app.config['FILL_CHUNK_ROWS'])
+    except Exception:
+        if os.path.exists(output_filepath):
+            os.remove(output_filepath)
+        raise
+    print(f"Filled file saved successfully! {rows} rows")
+    
+    output_filename = os.path.basename(output_filepath)
+    return {
+        'message': f'File processed successfully! {rows} rows processed.',
+        'filled_file': output_filename,
+        'download_url': f'/api/download_filled/{output_filename}',
+        'rows': rows,
+        'columns': columns,
+    }
+
+_fill_jobs = ProgressJobs(fill_uploaded_workbook, workers=app.config['FILL_JOB_WORKERS'], name='fill')
+
+def fill_job_status(job):
+    status = {
+        'success': job['status'] != 'failed',
+        'job_id': job['id'],
+        'status': job['status'],
+        'error': job['error'],
+        'rows_done': job['done'],
+        'rows_total': job['total'],
+        'progress': min(job['done'] / job['total'], 1.0) if job['total'] else None,
+        'status_url': url_for('process_empty_cells_job', job_id=job['id']),
+    }
+    if job['status'] == 'done':
+        status.update(job['result'])
+        status['progress'] = 1.0
+    return status
+
+
 @app.route('/api/process_empty_cells', methods=['POST'])
 @login_required
 def process_empty_cells():
     """
     Handle file upload with empty cells and fill them based on formulas.
     This uses the Info, Hourly Rates, and Summary sheets from previously uploaded files.
+    
+    The DATABASE sheet is read, filled and written a chunk of rows at a time
+    on a background job; the response is the queued job, polled at
+    /api/process_empty_cells/<job_id> for progress and the download URL.
     """
     try:
         # Only admin can upload files
@@ -3527,62 +3882,19 @@ def process_empty_cells():
         file.save(filepath)
         print(f"File saved successfully")
         
-        # Load the DATABASE sheet from uploaded file
-        print(f"Loading DATABASE sheet from uploaded file...")
-        if file_ext == '.xlsb':
-            df_database = pd.read_excel(filepath, sheet_name='DATABASE', engine='pyxlsb')
-        else:
-            df_database = pd.read_excel(filepath, sheet_name='DATABASE')
-        
-        print(f"DATABASE sheet loaded: {df_database.shape[0]} rows, {df_database.shape[1]} columns")
-        
         # Load reference data (Info, Hourly Rates, Summary) from latest uploaded file
         print(f"Loading reference sheets (Info, Hourly Rates, Summary)...")
         if not load_excel_reference_data():
             return jsonify({'error': 'Could not load reference sheets (Info, Hourly Rates, Summary). Please ensure you have uploaded a file with these sheets first.'}), 400
         
-        info_df = _excel_cache['info_df']
-        rates_df = _excel_cache['hourly_rates_df']
-        summary_df = _excel_cache['summary_df']
-        
-        print(f"Reference sheets loaded:")
-        print(f"  - Info: {info_df.shape[0]} rows, {info_df.shape[1]} columns")
-        print(f"  - Hourly Rates: {rates_df.shape[0]} rows, {rates_df.shape[1]} columns")
-        print(f"  - Hourly Rates columns: {rates_df.columns.tolist()}")
-        print(f"  - Hourly Rates column 0 (ID) first 5: {rates_df.iloc[:5, 0].tolist()}")
-        print(f"  - Hourly Rates column 7 first 5: {rates_df.iloc[:5, 7].tolist()}")
-        if summary_df is not None:
-            print(f"  - Summary: {summary_df.shape[0]} rows, {summary_df.shape[1]} columns")
-        else:
-            print(f"  - Summary: Not available")
-        
-        # Fill empty cells based on formulas
-        print(f"Filling empty cells based on formulas...")
-        df_filled = fill_empty_cells_with_formulas(df_database, info_df, rates_df, summary_df)
+        references = (_excel_cache['info_df'], _excel_cache['hourly_rates_df'], _excel_cache['summary_df'])
         
-        # Save the filled DataFrame back to Excel
-        output_filename = f'filled_{timestamp}_{os.path.basename(file.filename)}'
+        # Always written as xlsx: pyxlsb cannot write .xlsb files
+        output_filename = f'filled_{timestamp}_{os.path.splitext(os.path.basename(file.filename))[0]}.xlsx'
         output_filepath = os.path.join(app.config['UPLOAD_FOLDER'], output_filename)
         
-        print(f"Saving filled data to: {output_filepath}")
-        if file_ext == '.xlsb':
-            # For xlsb, we need to save as xlsx since pyxlsb doesn't support writing
-            output_filepath = output_filepath.replace('.xlsb', '.xlsx')
-            df_filled.to_excel(output_filepath, sheet_name='DATABASE', index=False, engine='openpyxl')
-        else:
-            df_filled.to_excel(output_filepath, sheet_name='DATABASE', index=False)
-        
-        print(f"Filled file saved successfully!")
-        
-        return jsonify({
-            'success': True,
-            'message': f'File processed successfully! {df_filled.shape[0]} rows processed.',
-            'original_file': filename,
-            'filled_file': output_filename,
-            'download_url': f'/api/download_filled/{output_filename}',
-            'rows': df_filled.shape[0],
-            'columns': df_filled.shape[1]
-        })
+        job = _fill_jobs.submit(session.get('name'), filepath, output_filepath, references)
+        return jsonify({**fill_job_status(job), 'original_file': filename}), 202
     
     except Exception as e:
         print(f"Process empty cells error: {str(e)}")
@@ -3591,6 +3903,18 @@ def process_empty_cells():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/process_empty_cells/<job_id>', methods=['GET'])
+@login_required
+def process_empty_cells_job(job_id):
+    """Status and progress of a fill job; includes the download URL once it is done"""
+    if session.get('role') != 'admin':
+        return jsonify({'error': 'Only admin can upload files'}), 403
+    job = _fill_jobs.get(job_id, session.get('name'))
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(fill_job_status(job))
+
+
 @app.route('/api/download_filled/<filename>')
 @login_required
 def download_filled(filename):
@@ -3609,39 +3933,144 @@ def download_filled(filename):
 @app.route('/api/filter', methods=['POST'])
 @login_required
 def filter_data():
-    """Apply filters to data"""
+    """Apply filters to data.
+
+    Optional paging parameters return a single window instead of every row:
+    page/page_size (or the next_cursor of a previous response), sort
+    ("col", "-col" or [{"column": ..., "direction": "asc"|"desc"}]) and
+    columns (list of columns to return).
+    """
     try:
-        filters = request.json.get('filters', {})
+        body = request.get_json(silent=True) or {}
+        filters = body.get('filters', {})
+        paged = any(body.get(key) is not None for key in ('page', 'page_size', 'cursor', 'sort', 'columns'))
         
         # Get user filter
         user_filter = None if session.get('role') == 'admin' else session.get('name')
         
         # Load combined data
         file_path = session.get('current_file')
-        df = get_combined_data(file_path, user_filter)
-        df = add_calculated_columns(df)
+        df = get_combined_data(file_path, user_filter, filters, calculated=True)
         
         # Apply filters
-        for col, values in filters.items():
-            if col in df.columns and values:
-                # Convert both to strings for consistent comparison
-                df_col_str = df[col].astype(str)
-                values_str = [str(v) for v in values]
-                df = df[df_col_str.isin(values_str)]
+        df = apply_filters(df, filters)
         
-        # Convert to JSON (replace NaN with empty string)
-        df_clean = df.fillna('')
-        data_json = df_clean.to_dict('records')
+        if not paged:
+            # Row JSON shows missing values as empty strings
+            return tabular_response({
+                'success': True,
+                'shape': df.shape
+            }, df, blank='')
+        
+        # Sort and slice on the server; only the requested window is serialized
+        window, paging = paginate(
+            df,
+            page=body.get('page'),
+            page_size=body.get('page_size'),
+            cursor=body.get('cursor'),
+            sort=body.get('sort'),
+            columns=body.get('columns'),
+            version=get_dataset_version(),
+        )
         
-        return jsonify({
+        return tabular_response({
             'success': True,
-            'data': data_json,
-            'shape': df.shape
-        })
+            'columns': window.columns.tolist(),
+            'shape': df.shape,
+            **paging
+        }, window, blank='')
+    
+    except (FilterError, PagingError, FormatError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/export/stream', methods=['GET', 'POST'])
+@login_required
+def export_stream():
+    """Stream the filtered rows as CSV, NDJSON or Parquet.
+
+    format=csv|ndjson|parquet and compression=gzip|zstd come from the query
+    string or the body; filters (as for /api/filter) and columns from the
+    JSON body, or JSON-encoded in the query string for GET requests.
+    """
+    try:
+        body = request.get_json(silent=True) or {}
+        fmt, compression = parse_stream_options(body.get('format', request.args.get('format')),
+                                                body.get('compression', request.args.get('compression')))
+        filters = body.get('filters', json.loads(request.args.get('filters') or '{}'))
+        columns = body.get('columns', json.loads(request.args.get('columns') or 'null'))
+        
+        # Get user filter
+        user_filter = None if session.get('role') == 'admin' else session.get('name')
+        
+        # Rows stay dictionary-encoded; the encoder converts one block at a time
+        file_path = session.get('current_file')
+        df = get_combined_data(file_path, user_filter, filters, encoded=True, calculated=True)
+        df = apply_filters(df, filters)
+        if columns:
+            if not isinstance(columns, list):
+                return jsonify({'error': 'columns must be a list of column names'}), 400
+            missing = [col for col in columns if col not in df.columns]
+            if missing:
+                return jsonify({'error': f'Unknown columns: {", ".join(map(str, missing))}'}), 400
+            df = df[columns]
+        
+        filename, mimetype = stream_file(fmt, compression, f'data_{datetime.now().strftime("%Y%m%d_%H%M%S")}')
+        print(f"[STREAM] Streaming {len(df)} rows as {filename}")
+        return app.response_class(
+            stream_chunks(df, fmt, compression),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
+        )
     
+    except (FilterError, StreamError) as e:
+        return jsonify({'error': str(e)}), 400
+    except json.JSONDecodeError as e:
+        return jsonify({'error': f'Invalid JSON in query string: {e}'}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Cascading filter panel: columns never offered, and the order of the first ones
+FILTER_OPTION_SKIP = ['PERSONEL', 'id', 'created_at', 'updated_at']
+FILTER_OPTION_ORDER = [
+    'Name Surname',
+    'Discipline',
+    '(Week /\nMonth)',
+    '(Week / Month)',
+    'Week / Month',
+    'Company',
+    'Projects/Group',
+    'Nationality',
+    'Office Location',
+    'Kuzey MH-Person',
+    'Status',
+    'North/\nSouth',
+    'North/South',
+    'Currency',
+    'PP'
+]
+
+def indexed_filter_columns(filters, user_filter, limit=500):
+    """Filter panel options for database rows from the bitmap index; None if filters are not value lists"""
+    index = get_bitmap_index()
+    selection = index.selection(filters)
+    if selection is None:
+        return None
+    if user_filter is not None:
+        selection &= index.pack(get_snapshot().rows_for_user(user_filter))
+    
+    columns = [col for col in FILTER_OPTION_ORDER if col in index.frame.columns]
+    columns += [col for col in index.frame.columns if col not in columns]
+    filter_cols = []
+    for col in columns:
+        if col in FILTER_OPTION_SKIP:
+            continue
+        values = index.field([col]).options(selection)
+        if 0 < len(values) <= limit:
+            filter_cols.append({'name': col, 'values': values})
+    return filter_cols
+
 @app.route('/api/get-filtered-options', methods=['POST'])
 @login_required
 def get_filtered_options():
@@ -3654,59 +4083,47 @@ def get_filtered_options():
         # Get user filter
         user_filter = None if session.get('role') == 'admin' else session.get('name')
         
-        # Load combined data
+        # Sketches describe database rows only, not rows of an uploaded file
         file_path = session.get('current_file')
-        df = get_combined_data(file_path, user_filter)
-        df = add_calculated_columns(df)
-        
-        print(f'DEBUG: Total rows before filtering: {len(df)}')
+        uses_file = bool(file_path and os.path.exists(file_path))
+        sketches = get_sketches() if approximate_requested() and not uses_file else None
+        
+        # Plain value selections over database rows are answered from the bitmap index
+        if not uses_file:
+            filter_cols = indexed_filter_columns(filters, user_filter)
+            if filter_cols is not None:
+                print(f'DEBUG: Returning {len(filter_cols)} filter columns (bitmap index)')
+                return jsonify({
+                    'success': True,
+                    'filter_columns': filter_cols
+                })
         
-        # Apply filters progressively (cascading)
-        for col, values in filters.items():
-            if col in df.columns and values:
-                # Convert both to strings for consistent comparison
-                df_col_str = df[col].astype(str)
-                values_str = [str(v) for v in values]
-                df = df[df_col_str.isin(values_str)]
-                print(f'DEBUG: After filtering {col}: {len(df)} rows remain')
+        # Apply filters (cascading); a selection that narrows this session's last
+        # one only evaluates the added constraints over the rows still selected
+        data_key = (get_dataset_version(), user_filter, file_path,
+                    os.path.getmtime(file_path) if uses_file else None)
+        df, how = _filter_states.select(
+            filter_session_key(), data_key,
+            lambda: get_combined_data(file_path, user_filter, encoded=True, calculated=True),
+            filters,
+        )
         
-        print(f'DEBUG: Total rows after filtering: {len(df)}')
+        print(f'DEBUG: Total rows after filtering: {len(df)} ({how})')
         
         # Get available options for each column after filtering
         # This creates the cascading effect - only show options that exist in filtered data
         filter_cols = []
-        skip_cols = ['PERSONEL', 'id', 'created_at', 'updated_at']
-        
-        # Define preferred order for filters
-        preferred_order = [
-            'Name Surname',
-            'Discipline',
-            '(Week /\nMonth)',
-            '(Week / Month)',
-            'Week / Month',
-            'Company',
-            'Projects/Group',
-            'Nationality',
-            'Office Location',
-            'Kuzey MH-Person',
-            'Status',
-            'North/\nSouth',
-            'North/South',
-            'Currency',
-            'PP'
-        ]
+        skip_cols = FILTER_OPTION_SKIP
         
         # Process columns in preferred order first
         processed_cols = set()
-        for pref_col in preferred_order:
+        for pref_col in FILTER_OPTION_ORDER:
             if pref_col in df.columns and pref_col not in skip_cols:
                 try:
-                    unique_count = df[pref_col].nunique()
-                    
-                    if unique_count > 0 and unique_count <= 500:
+                    if distinct_within(df, pref_col, 500, sketches):
                         non_null_values = df[pref_col].dropna()
                         if len(non_null_values) > 0:
-                            unique_values = sorted([str(v) for v in df[pref_col].dropna().unique()])
+                            unique_values = sorted([value_text(v) for v in df[pref_col].dropna().unique()])
                             
                             filter_cols.append({
                                 'name': pref_col,
@@ -3724,12 +4141,10 @@ def get_filtered_options():
                 continue
                 
             try:
-                unique_count = df[col].nunique()
-                
-                if unique_count > 0 and unique_count <= 500:
+                if distinct_within(df, col, 500, sketches):
                     non_null_values = df[col].dropna()
                     if len(non_null_values) > 0:
-                        unique_values = sorted([str(v) for v in df[col].dropna().unique()])
+                        unique_values = sorted([value_text(v) for v in df[col].dropna().unique()])
                         
                         filter_cols.append({
                             'name': col,
@@ -3747,12 +4162,75 @@ def get_filtered_options():
             'filter_columns': filter_cols
         })
     
+    except FilterError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f'ERROR in get_filtered_options: {e}')
         import traceback
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+def filtered_record_ids(user_filter, filters):
+    """Ids of the database records a filter spec selects, calculated columns included"""
+    snapshot = get_snapshot()
+    if snapshot.frame.empty:
+        return []
+    df = calculated_frame(snapshot)
+    if user_filter is not None:
+        df = df[snapshot.rows_for_user(user_filter)]
+    # apply_filters keeps the index, which is the snapshot position
+    df = apply_filters(df, filters)
+    return snapshot.record_ids[df.index.to_numpy()].tolist()
+
+def _replay_view(view, path, body, user):
+    """JSON of a view function run for user as if they had posted body to path; raises on errors"""
+    with app.test_request_context(path, method='POST', json=body):
+        session.update(user=user.username, user_id=user.id, role=user.role, name=user.name)
+        response = app.make_response(view())
+    if response.status_code != 200:
+        raise ValueError((response.get_json(silent=True) or {}).get('error') or f'HTTP {response.status_code}')
+    return response.get_json()
+
+def materialize_filter(saved_filter):
+    """(row_ids, payload) of a saved filter: matching record ids plus the pivot or chart responses"""
+    config = json.loads(saved_filter.filter_config)
+    filters = config.get('filters') or {}
+    user = User.query.get(saved_filter.user_id)
+    if user is None:
+        raise ValueError('Filter owner no longer exists')
+    user_filter = None if user.role == 'admin' else user.name
+
+    payload = None
+    if saved_filter.filter_type == 'pivot':
+        payload = _replay_view(create_pivot, '/api/pivot', config, user)
+    elif saved_filter.filter_type == 'graph':
+        # Graphs always use the whole database
+        user_filter = None
+        payload = [_replay_view(create_chart, '/api/chart', {**chart, 'filters': filters}, user)
+                   for chart in config.get('chart_configs') or []]
+    return filtered_record_ids(user_filter, filters), payload
+
+def refresh_materialized_filters():
+    """Recompute every materialized saved filter that is not current for the dataset version"""
+    with app.app_context():
+        version = get_dataset_version()
+        for entry in MaterializedFilter.query.all():
+            if entry.dataset_version == version:
+                continue
+            saved_filter = SavedFilter.query.get(entry.filter_id)
+            try:
+                row_ids, payload = materialize_filter(saved_filter)
+                entry.row_ids, entry.payload, entry.error = json.dumps(row_ids), json.dumps(payload), None
+            except Exception as e:
+                print(f"[MATERIALIZE] Filter {entry.filter_id} failed: {e}")
+                entry.row_ids, entry.payload, entry.error = None, None, str(e)
+            entry.dataset_version = version
+            entry.refreshed_at = datetime.utcnow()
+            db.session.commit()
+        db.session.remove()
+
+_materialize_worker = RefreshWorker(refresh_materialized_filters, name='materialize')
+
 @app.route('/api/save-filter', methods=['POST'])
 @login_required
 def save_filter():
@@ -3766,6 +4244,10 @@ def save_filter():
         if not filter_name or not filter_type or not filter_config:
             return jsonify({'error': 'Missing required fields'}), 400
         
+        # Reject configs whose filters could not be replayed later
+        if isinstance(filter_config, dict) and isinstance(filter_config.get('filters'), dict):
+            parse_filters(filter_config['filters'])
+        
         user_id = session.get('user_id')
         
         # Check if filter with same name and type exists for this user
@@ -3779,23 +4261,39 @@ def save_filter():
             # Update existing filter
             existing.filter_config = json.dumps(filter_config)
             existing.updated_at = datetime.utcnow()
+            saved_filter = existing
         else:
             # Create new filter
-            new_filter = SavedFilter(
+            saved_filter = SavedFilter(
                 user_id=user_id,
                 filter_name=filter_name,
                 filter_type=filter_type,
                 filter_config=json.dumps(filter_config)
             )
-            db.session.add(new_filter)
+            db.session.add(saved_filter)
+        db.session.flush()
+        
+        # Opt-in materialization; a changed config invalidates the stored result
+        entry = MaterializedFilter.query.filter_by(filter_id=saved_filter.id).first()
+        materialize = data.get('materialize', entry is not None)
+        if materialize and entry is None:
+            db.session.add(MaterializedFilter(filter_id=saved_filter.id))
+        elif materialize:
+            entry.dataset_version = None
+        elif entry is not None:
+            db.session.delete(entry)
         
         db.session.commit()
+        if materialize:
+            _materialize_worker.schedule()
         
         return jsonify({
             'success': True,
             'message': 'Filter saved successfully'
         })
         
+    except FilterError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -3814,17 +4312,44 @@ def load_filters():
             query = query.filter_by(filter_type=filter_type)
         
         filters = query.order_by(SavedFilter.updated_at.desc()).all()
+        materialized = {
+            entry.filter_id: entry
+            for entry in MaterializedFilter.query.filter(MaterializedFilter.filter_id.in_([f.id for f in filters]))
+        }
+        version = get_dataset_version() if materialized else None
+        include_ids = request.args.get('row_ids') in ('1', 'true')
+        stale = False
         
         result = []
         for f in filters:
-            result.append({
+            item = {
                 'id': f.id,
                 'filter_name': f.filter_name,
                 'filter_type': f.filter_type,
                 'filter_config': json.loads(f.filter_config),
                 'created_at': f.created_at.isoformat(),
-                'updated_at': f.updated_at.isoformat()
-            })
+                'updated_at': f.updated_at.isoformat(),
+                'materialize': f.id in materialized
+            }
+            entry = materialized.get(f.id)
+            if entry is not None and entry.dataset_version == version:
+                row_ids = json.loads(entry.row_ids) if entry.row_ids else []
+                item['materialized'] = {
+                    'version': entry.dataset_version,
+                    'refreshed_at': entry.refreshed_at.isoformat(),
+                    'row_count': len(row_ids),
+                    'payload': json.loads(entry.payload) if entry.payload else None,
+                    'error': entry.error,
+                }
+                if include_ids:
+                    item['materialized']['row_ids'] = row_ids
+            elif entry is not None:
+                # Being refreshed; the client replays the config meanwhile
+                item['materialized'] = None
+                stale = True
+            result.append(item)
+        if stale:
+            _materialize_worker.schedule()
         
         return jsonify({
             'success': True,
@@ -3850,6 +4375,7 @@ def delete_filter(filter_id):
         if not saved_filter:
             return jsonify({'error': 'Filter not found'}), 404
         
+        MaterializedFilter.query.filter_by(filter_id=saved_filter.id).delete()
         db.session.delete(saved_filter)
         db.session.commit()
         
@@ -3862,12 +4388,43 @@ def delete_filter(filter_id):
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+_pivot_cache = PivotCache()
+
+def multi_level_pivot(config):
+    """Pivot with several row/column dimensions and measures, subtotals and grand totals; cached per dataset version"""
+    user_filter = None if session.get('role') == 'admin' else session.get('name')
+    file_path = session.get('current_file')
+    file_stamp = os.path.getmtime(file_path) if file_path and os.path.exists(file_path) else None
+    rows, columns, measures = parse_pivot_spec(config)
+    filters = config.get('filters', {})
+    key = spec_key(get_dataset_version(), user_filter, file_path, file_stamp,
+                   rows, columns, measures, filters)
+    if request.if_none_match.contains(key):
+        return '', 304
+
+    result = _pivot_cache.get(key)
+    if result is None:
+        df = get_combined_data(file_path, user_filter, filters, numeric=[field for _, field, _ in measures], calculated=True)
+        df = apply_filters(df, filters)
+        if df.empty:
+            return jsonify({'error': 'No data available after applying filters. Please relax filters or select a different dataset.'}), 400
+        result = multi_pivot(df.reset_index(drop=True), rows, columns, measures)
+        _pivot_cache.put(key, result)
+        print(f"[PIVOT] {len(result['rowKeys'])} x {len(result['colKeys'])} keys, {len(measures)} measure(s)")
+
+    response = jsonify({'success': True, **result})
+    response.set_etag(key)
+    return response
+
 @app.route('/api/pivot', methods=['POST'])
 @login_required
 def create_pivot():
-    """Create pivot table"""
+    """Create pivot table; rows/measures (or list-valued index/columns) request a multi-level pivot"""
     try:
         config = request.json
+        if ('rows' in config or 'measures' in config
+                or isinstance(config.get('index'), list) or isinstance(config.get('columns'), list)):
+            return multi_level_pivot(config)
         index_col = config.get('index')
         columns_col = config.get('columns')
         values_cols = config.get('values', [])
@@ -3891,27 +4448,12 @@ def create_pivot():
         
         # Load and filter data
         file_path = session.get('current_file')
-        df = get_combined_data(file_path, user_filter)
-        df = add_calculated_columns(df)
+        df = get_combined_data(file_path, user_filter, filters, numeric=values_cols, calculated=True)
         
         print(f"Data shape before filters: {df.shape}")
         
         # Apply filters
-        for col, values in filters.items():
-            if col in df.columns and values:
-                before_count = len(df)
-                # Convert both dataframe column and filter values to strings for comparison
-                # This ensures consistent comparison regardless of data type
-                df_col_str = df[col].astype(str)
-                values_str = [str(v) for v in values]
-                df = df[df_col_str.isin(values_str)]
-                after_count = len(df)
-                print(f"Filter '{col}': {before_count} → {after_count} rows (filtered out {before_count - after_count})")
-                # Debug: Show what we're filtering
-                if after_count == 0:
-                    print(f"  WARNING: All data filtered out for column '{col}'")
-                    print(f"  Filter values: {values_str[:10]}")
-                    print(f"  Unique values in data: {df_col_str.unique()[:10].tolist()}")
+        df = apply_filters(df, filters)
         
         print(f"Data shape after filtering: {df.shape}")
         print(f"{'='*80}\n")
@@ -3942,19 +4484,9 @@ def create_pivot():
                     
                 # Try to convert to numeric and ensure it's a Series
                 try:
-                    # Attempt robust numeric conversion: strip common currency/formatting
-                    series = df[col]
-                    # If object/string dtype, clean common characters like commas, currency symbols and words
-                    if series.dtype == object or str(series.dtype).startswith('string'):
-                        s_clean = series.astype(str)
-                        # Remove common currency symbols and abbreviations, keep digits, dot and minus
-                        s_clean = s_clean.str.replace(r'[\$,£€¥]', '', regex=True)
-                        s_clean = s_clean.str.replace(r'\bUSD\b|\bTRY\b|\bEUR\b|\bTL\b', '', regex=True, case=False)
-                        # Remove any non-numeric characters except dot and minus
-                        s_clean = s_clean.str.replace(r'[^0-9.\-]', '', regex=True)
-                        numeric_series = pd.to_numeric(s_clean, errors='coerce')
-                    else:
-                        numeric_series = pd.to_numeric(series, errors='coerce')
+                    # Database columns arrive parsed; rows from an uploaded Excel file
+                    # still need currency symbols and words stripped
+                    numeric_series = clean_numeric(df[col])
                     print(f"After cleaning + pd.to_numeric - type: {type(numeric_series)}, dtype: {numeric_series.dtype}")
                     
                     # Ensure it's 1-dimensional
@@ -4007,8 +4539,13 @@ def create_pivot():
             print(f"Creating pivot with params: {pivot_params}")
             
             # Create pivot table
-            pivot = pd.pivot_table(df, **pivot_params)
-            pivot = pivot.reset_index()
+            pivot = analytics_pivot_table(
+                df,
+                index=index_col,
+                values=pivot_params['values'],
+                columns=pivot_params.get('columns'),
+                agg=agg_func,
+            )
             
             print(f"Pivot created successfully: {pivot.shape}")
             
@@ -4019,14 +4556,15 @@ def create_pivot():
             if any(isinstance(col, tuple) for col in pivot.columns):
                 pivot.columns = [' - '.join(map(str, col)).strip(' -') if isinstance(col, tuple) else str(col) for col in pivot.columns]
             
-            return jsonify({
+            return tabular_response({
                 'success': True,
-                'data': pivot.to_dict('records'),
                 'columns': pivot.columns.tolist()
-            })
+            }, pivot)
         else:
             return jsonify({'error': 'Please select both Group By column and at least one Value column'}), 400
     
+    except (FilterError, PivotError, FormatError) as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         import traceback
         error_trace = traceback.format_exc()
@@ -4034,255 +4572,327 @@ def create_pivot():
         print(error_trace)
         return jsonify({'error': f'Error creating pivot table: {str(e)}'}), 500
 
-@app.route('/api/chart', methods=['POST'])
-@login_required
-def create_chart():
-    """Create chart from data"""
-    try:
-        config = request.json
-        chart_type = config.get('chart_type')
-        # Support both old and new parameter names
-        x_col = config.get('x_column') or config.get('x')
-        y_col = config.get('y_column') or config.get('y')
-        color_col = config.get('color_column') or config.get('color')
-        filters = config.get('filters', {})
-        
-        # Always use whole database for graphs (no user filter)
-        user_filter = None
-        
-        # Load and filter data
-        file_path = session.get('current_file')
-        df = get_combined_data(file_path, user_filter)
-        
-        if df.empty:
-            return jsonify({'error': 'No data available'}), 400
-        
-        # Apply filters BEFORE adding calculated columns for better performance
-        if filters:
-            for col, values in filters.items():
-                if col in df.columns and values:
-                    df = df[df[col].isin(values)]
-        
-        # Add calculated columns to ALL data (don't limit yet)
-        df = add_calculated_columns(df)
-        
-        # Validate columns exist
-        if x_col and x_col not in df.columns:
-            return jsonify({'error': f'Column "{x_col}" not found'}), 400
-        if y_col and y_col not in df.columns:
-            return jsonify({'error': f'Column "{y_col}" not found'}), 400
-        
-        # Clean data for plotting - handle mixed types
-        if x_col:
-            df[x_col] = df[x_col].fillna('')
-            # No limit on unique values - show all data
-        
-        if y_col:
-            # Convert y column to numeric if possible
-            df[y_col] = pd.to_numeric(df[y_col], errors='coerce').fillna(0)
-            # Remove rows with zero or negative values for pie charts
-            if chart_type == 'pie':
-                df = df[df[y_col] > 0]
-        
-        if color_col and color_col in df.columns:
-            df[color_col] = df[color_col].fillna('')
-        
-        # Remove rows with invalid data
-        df = df.dropna(subset=[col for col in [x_col, y_col] if col and col in df.columns])
-        
-        if df.empty:
-            return jsonify({'error': 'No valid data after filtering'}), 400
-        
-        # For line charts: prefer date format over week codes if both exist
-        if chart_type == 'line' and x_col and x_col in df.columns:
-            import re
-            # Check if we have date format entries (containing / and NOT matching W##)
-            df[x_col] = df[x_col].astype(str)
-            has_dates = df[x_col].str.contains('/', na=False).any()
-            has_week_codes = df[x_col].str.match(r'^W\d+$', case=False, na=False).any()
-            
-            # Only filter out week codes if we also have date format entries
-            if has_dates and has_week_codes:
-                # Keep only rows that contain "/" (date format)
-                df = df[df[x_col].str.contains('/', na=False)]
-        
-        if df.empty:
-            return jsonify({'error': 'No valid data after filtering'}), 400
-        
-        # Create chart
-        fig = None
-        color_param = color_col if color_col and color_col in df.columns else None
-        
-        # Sort data by X column if it looks like a date (for proper ordering)
-        x_sort_col = None
-        if x_col:
-            try:
-                # Create a temporary datetime column for sorting only
-                x_sort_col = f'{x_col}_sort_temp'
-                import warnings
-                with warnings.catch_warnings():
-                    warnings.filterwarnings('ignore', category=UserWarning)
-                    df[x_sort_col] = pd.to_datetime(df[x_col], errors='coerce', format='mixed')
-                if df[x_sort_col].notna().any():
-                    df = df.sort_values(x_sort_col)
-                    df = df.drop(columns=[x_sort_col])
-            except:
-                pass
+# Date formats of chart x values (create_chart's line sort order)
+_chart_dates = DateParser(['%d/%m/%Y', '%d/%b/%Y', '%d-%m-%Y', '%d-%b-%Y'], yearless=['%d/%b', '%d/%m'])
+
+def chart_columns(config):
+    """(chart_type, x_col, y_col, color_col) of a chart config; accepts the old and new parameter names"""
+    return (config.get('chart_type'),
+            config.get('x_column') or config.get('x'),
+            config.get('y_column') or config.get('y'),
+            config.get('color_column') or config.get('color'))
+
+def load_chart_rows(filters, numeric):
+    """Rows the charts plot: the whole database plus the uploaded file, calculated columns included, filtered"""
+    # Always use whole database for graphs (no user filter)
+    user_filter = None
+    
+    # Load and filter data
+    file_path = session.get('current_file')
+    df = get_combined_data(file_path, user_filter, filters, numeric=numeric, calculated=True)
+    
+    if df.empty:
+        raise ChartDataError('No data available')
+    
+    return apply_filters(df, filters)
+
+def prepare_chart_frame(config, rows=None):
+    """(chart_type, rows, x_col, y_col, color_col) of a chart request, cleaned and sorted for plotting.
+
+    rows: load_chart_rows() output shared by several charts; it is not modified.
+    """
+    chart_type, x_col, y_col, color_col = chart_columns(config)
+    
+    if rows is None:
+        df = load_chart_rows(config.get('filters', {}), [y_col])
+    else:
+        df = rows[[col for col in dict.fromkeys([x_col, y_col, color_col]) if col and col in rows.columns]].copy()
+    
+    # Validate columns exist
+    if x_col and x_col not in df.columns:
+        raise ChartDataError(f'Column "{x_col}" not found')
+    if y_col and y_col not in df.columns:
+        raise ChartDataError(f'Column "{y_col}" not found')
+    
+    # Clean data for plotting - handle mixed types
+    if x_col:
+        df[x_col] = df[x_col].fillna('')
+        # No limit on unique values - show all data
+    
+    if y_col:
+        # Convert y column to numeric if possible
+        df[y_col] = pd.to_numeric(df[y_col], errors='coerce').fillna(0)
+        # Remove rows with zero or negative values for pie charts
+        if chart_type == 'pie':
+            df = df[df[y_col] > 0]
+    
+    if color_col and color_col in df.columns:
+        df[color_col] = df[color_col].fillna('')
+    
+    # Remove rows with invalid data
+    df = df.dropna(subset=[col for col in [x_col, y_col] if col and col in df.columns])
+    
+    if df.empty:
+        raise ChartDataError('No valid data after filtering')
+    
+    # For line charts: prefer date format over week codes if both exist
+    if chart_type == 'line' and x_col and x_col in df.columns:
+        import re
+        # Check if we have date format entries (containing / and NOT matching W##)
+        df[x_col] = df[x_col].astype(str)
+        has_dates = df[x_col].str.contains('/', na=False).any()
+        has_week_codes = df[x_col].str.match(r'^W\d+$', case=False, na=False).any()
         
-        # Use simpler chart types for better performance
-        if chart_type == 'bar':
-            # Aggregate data by grouping - always use SUM for totals
-            if color_param:
-                df_agg = df.groupby([x_col, color_param], as_index=False)[y_col].sum()
-                fig = px.bar(df_agg, x=x_col, y=y_col, color=color_param)
-            else:
-                df_agg = df.groupby(x_col, as_index=False)[y_col].sum()
-                fig = px.bar(df_agg, x=x_col, y=y_col)
-        elif chart_type == 'line':
-            # Aggregate data properly by grouping X and Color columns
-            if color_param:
-                # Group by both X axis and Color, then sum the Y values
-                df_agg = df.groupby([x_col, color_param], as_index=False)[y_col].sum()
-                # Ensure data types are correct
-                df_agg[y_col] = pd.to_numeric(df_agg[y_col], errors='coerce').fillna(0)
-                
-                # Sort by date if x_col looks like dates (contains /)
-                if df_agg[x_col].astype(str).str.contains('/', na=False).any():
-                    try:
-                        # Try multiple date formats: dd/mmm, dd/mm/yyyy, etc.
-                        # Add year 2000 for dates without year (01/Jan becomes 01/Jan/2000)
-                        def parse_date(date_str):
-                            if pd.isna(date_str):
-                                return pd.NaT
-                            date_str = str(date_str).strip()
-                            # Try with year first
-                            for fmt in ['%d/%m/%Y', '%d/%b/%Y', '%d-%m-%Y', '%d-%b-%Y']:
-                                try:
-                                    return pd.to_datetime(date_str, format=fmt)
-                                except:
-                                    pass
-                            # Try without year (add 2000 as default year)
-                            for fmt in ['%d/%b', '%d/%m']:
-                                try:
-                                    parsed = pd.to_datetime(date_str + '/2000', format=fmt + '/%Y')
-                                    return parsed
-                                except:
-                                    pass
-                            return pd.NaT
-                        
-                        df_agg['_temp_date'] = df_agg[x_col].apply(parse_date)
-                        if df_agg['_temp_date'].notna().any():
-                            df_agg = df_agg.sort_values(['_temp_date', color_param])
-                            df_agg = df_agg.drop(columns=['_temp_date'])
-                        else:
-                            df_agg = df_agg.sort_values([color_param, x_col])
-                    except Exception as e:
-                        print(f"Date parsing error: {e}")
+        # Only filter out week codes if we also have date format entries
+        if has_dates and has_week_codes:
+            # Keep only rows that contain "/" (date format)
+            df = df[df[x_col].str.contains('/', na=False)]
+    
+    if df.empty:
+        raise ChartDataError('No valid data after filtering')
+    
+    color_param = color_col if color_col and color_col in df.columns else None
+    
+    # Sort data by X column if it looks like a date (for proper ordering)
+    x_sort_col = None
+    if x_col:
+        try:
+            # Create a temporary datetime column for sorting only
+            x_sort_col = f'{x_col}_sort_temp'
+            import warnings
+            with warnings.catch_warnings():
+                warnings.filterwarnings('ignore', category=UserWarning)
+                # Parse each distinct x value once
+                codes, uniques = distinct_codes(df[x_col])
+                df[x_sort_col] = broadcast(codes, pd.to_datetime(uniques, errors='coerce', format='mixed'))
+            if df[x_sort_col].notna().any():
+                df = df.sort_values(x_sort_col)
+                df = df.drop(columns=[x_sort_col])
+        except:
+            pass
+    
+    return chart_type, df, x_col, y_col, color_param
+
+def chart_figure_json(chart_type, df, x_col, y_col, color_param):
+    """Plotly figure JSON of a chart over prepare_chart_frame rows"""
+    # Create chart
+    fig = None
+    
+    # Use simpler chart types for better performance
+    if chart_type == 'bar':
+        # Aggregate data by grouping - always use SUM for totals
+        if color_param:
+            df_agg = group_aggregate(df, [x_col, color_param], y_col)
+            fig = px.bar(df_agg, x=x_col, y=y_col, color=color_param)
+        else:
+            df_agg = group_aggregate(df, x_col, y_col)
+            fig = px.bar(df_agg, x=x_col, y=y_col)
+    elif chart_type == 'line':
+        # Aggregate data properly by grouping X and Color columns
+        if color_param:
+            # Group by both X axis and Color, then sum the Y values
+            df_agg = group_aggregate(df, [x_col, color_param], y_col)
+            # Ensure data types are correct
+            df_agg[y_col] = pd.to_numeric(df_agg[y_col], errors='coerce').fillna(0)
+    
+            # Sort by date if x_col looks like dates (contains /)
+            if df_agg[x_col].astype(str).str.contains('/', na=False).any():
+                try:
+                    # dd/mm/yyyy, dd/mmm/yyyy, dd-mm-yyyy, dd-mmm-yyyy; 01/Jan without a year sorts as 2000
+                    df_agg['_temp_date'] = _chart_dates.datetimes(df_agg[x_col])
+                    if df_agg['_temp_date'].notna().any():
+                        df_agg = df_agg.sort_values(['_temp_date', color_param])
+                        df_agg = df_agg.drop(columns=['_temp_date'])
+                    else:
                         df_agg = df_agg.sort_values([color_param, x_col])
-                else:
+                except Exception as e:
+                    print(f"Date parsing error: {e}")
                     df_agg = df_agg.sort_values([color_param, x_col])
-                    
-                fig = px.line(df_agg, x=x_col, y=y_col, color=color_param, markers=True)
             else:
-                # Group by X axis only, then sum the Y values
-                df_agg = df.groupby(x_col, as_index=False)[y_col].sum()
-                # Ensure data types are correct
-                df_agg[y_col] = pd.to_numeric(df_agg[y_col], errors='coerce').fillna(0)
-                
-                # Sort by date if x_col looks like dates
-                if df_agg[x_col].astype(str).str.contains('/', na=False).any():
-                    try:
-                        # Try multiple date formats
-                        def parse_date(date_str):
-                            if pd.isna(date_str):
-                                return pd.NaT
-                            date_str = str(date_str).strip()
-                            # Try with year first
-                            for fmt in ['%d/%m/%Y', '%d/%b/%Y', '%d-%m-%Y', '%d-%b-%Y']:
-                                try:
-                                    return pd.to_datetime(date_str, format=fmt)
-                                except:
-                                    pass
-                            # Try without year (add 2000 as default)
-                            for fmt in ['%d/%b', '%d/%m']:
-                                try:
-                                    parsed = pd.to_datetime(date_str + '/2000', format=fmt + '/%Y')
-                                    return parsed
-                                except:
-                                    pass
-                            return pd.NaT
-                        
-                        df_agg['_temp_date'] = df_agg[x_col].apply(parse_date)
-                        if df_agg['_temp_date'].notna().any():
-                            df_agg = df_agg.sort_values('_temp_date')
-                            df_agg = df_agg.drop(columns=['_temp_date'])
-                        else:
-                            df_agg = df_agg.sort_values(x_col)
-                    except Exception as e:
-                        print(f"Date parsing error: {e}")
+                df_agg = df_agg.sort_values([color_param, x_col])
+    
+            fig = px.line(df_agg, x=x_col, y=y_col, color=color_param, markers=True)
+        else:
+            # Group by X axis only, then sum the Y values
+            df_agg = group_aggregate(df, x_col, y_col)
+            # Ensure data types are correct
+            df_agg[y_col] = pd.to_numeric(df_agg[y_col], errors='coerce').fillna(0)
+    
+            # Sort by date if x_col looks like dates
+            if df_agg[x_col].astype(str).str.contains('/', na=False).any():
+                try:
+                    # dd/mm/yyyy, dd/mmm/yyyy, dd-mm-yyyy, dd-mmm-yyyy; 01/Jan without a year sorts as 2000
+                    df_agg['_temp_date'] = _chart_dates.datetimes(df_agg[x_col])
+                    if df_agg['_temp_date'].notna().any():
+                        df_agg = df_agg.sort_values('_temp_date')
+                        df_agg = df_agg.drop(columns=['_temp_date'])
+                    else:
                         df_agg = df_agg.sort_values(x_col)
-                else:
+                except Exception as e:
+                    print(f"Date parsing error: {e}")
                     df_agg = df_agg.sort_values(x_col)
-                    
-                fig = px.line(df_agg, x=x_col, y=y_col, markers=True)
-        elif chart_type == 'scatter':
-            # Scatter plots show individual points, but can still aggregate
-            if color_param:
-                df_agg = df.groupby([x_col, color_param], as_index=False)[y_col].sum()
-                fig = px.scatter(df_agg, x=x_col, y=y_col, color=color_param)
             else:
-                df_agg = df.groupby(x_col, as_index=False)[y_col].sum()
-                fig = px.scatter(df_agg, x=x_col, y=y_col)
-        elif chart_type == 'pie':
-            # Aggregate for pie chart
-            df_pie = df.groupby(x_col)[y_col].sum().reset_index()
-            # Limit to top 10 slices
-            df_pie = df_pie.nlargest(10, y_col)
-            fig = px.pie(df_pie, names=x_col, values=y_col)
-        elif chart_type == 'box':
-            fig = px.box(df, x=x_col, y=y_col, color=color_param)
-        elif chart_type == 'histogram':
-            fig = px.histogram(df, x=x_col, y=y_col, color=color_param)
+                df_agg = df_agg.sort_values(x_col)
+    
+            fig = px.line(df_agg, x=x_col, y=y_col, markers=True)
+    elif chart_type == 'scatter':
+        # Scatter plots show individual points, but can still aggregate
+        if color_param:
+            df_agg = group_aggregate(df, [x_col, color_param], y_col)
+            fig = px.scatter(df_agg, x=x_col, y=y_col, color=color_param)
         else:
-            return jsonify({'error': f'Unsupported chart type: {chart_type}'}), 400
-        
-        if fig:
-            # Update layout for better appearance and performance
-            fig.update_layout(
-                template='plotly_white',
-                title=f'{chart_type.upper()} Chart',
-                xaxis_title=x_col,
-                yaxis_title=y_col,
-                height=500,
-                showlegend=True if color_param else False
-            )
-            
-            # Convert to JSON string - use Plotly's built-in method which handles numpy arrays
-            try:
-                import plotly.utils
-                chart_json = plotly.utils.PlotlyJSONEncoder().encode(fig)
-            except Exception as encode_err:
-                print(f"Plotly encoding error: {str(encode_err)}")
-                # Fallback: try to_json method
-                try:
-                    chart_json = fig.to_json()
-                except Exception as json_err:
-                    print(f"Plotly to_json error: {str(json_err)}")
-                    return jsonify({'error': f'Failed to encode chart: {str(encode_err)}'}), 500
-            
-            return jsonify({
-                'success': True,
-                'chart': chart_json
-            })
-        else:
-            return jsonify({'error': 'Failed to create chart'}), 500
+            df_agg = group_aggregate(df, x_col, y_col)
+            fig = px.scatter(df_agg, x=x_col, y=y_col)
+    elif chart_type == 'pie':
+        # Aggregate for pie chart
+        df_pie = group_aggregate(df, x_col, y_col)
+        # Limit to top 10 slices
+        df_pie = df_pie.nlargest(10, y_col)
+        fig = px.pie(df_pie, names=x_col, values=y_col)
+    elif chart_type == 'box':
+        fig = px.box(df, x=x_col, y=y_col, color=color_param)
+    elif chart_type == 'histogram':
+        fig = px.histogram(df, x=x_col, y=y_col, color=color_param)
+    else:
+        raise ChartDataError(f'Unsupported chart type: {chart_type}')
+    
+    if not fig:
+        raise RuntimeError('Failed to create chart')
+    
+    # Update layout for better appearance and performance
+    fig.update_layout(
+        template='plotly_white',
+        title=f'{chart_type.upper()} Chart',
+        xaxis_title=x_col,
+        yaxis_title=y_col,
+        height=500,
+        showlegend=True if color_param else False
+    )
     
+    # Convert to JSON string - use Plotly's built-in method which handles numpy arrays
+    try:
+        import plotly.utils
+        return plotly.utils.PlotlyJSONEncoder().encode(fig)
+    except Exception as encode_err:
+        print(f"Plotly encoding error: {str(encode_err)}")
+        # Fallback: try to_json method
+        try:
+            return fig.to_json()
+        except Exception as json_err:
+            print(f"Plotly to_json error: {str(json_err)}")
+            raise RuntimeError(f'Failed to encode chart: {str(encode_err)}')
+
+@app.route('/api/chart', methods=['POST'])
+@login_required
+def create_chart():
+    """Create chart from data"""
+    try:
+        chart_type, df, x_col, y_col, color_param = prepare_chart_frame(request.json)
+        return jsonify({
+            'success': True,
+            'chart': chart_figure_json(chart_type, df, x_col, y_col, color_param)
+        })
+    
+    except (FilterError, ChartDataError) as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Chart error: {str(e)}")
         import traceback
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/chart-data', methods=['POST'])
+@login_required
+def chart_data():
+    """Series arrays of a chart instead of a Plotly figure; takes the /api/chart body plus max_points.
+
+    Line series are downsampled to max_points with LTTB, box plots come as
+    quartile summaries and histograms as binned sums.
+    """
+    try:
+        config = request.get_json(silent=True) or {}
+        chart_type, df, x_col, y_col, color_col = prepare_chart_frame(config)
+        result = chart_series(df, chart_type, x_col, y_col, color_col, config.get('max_points', CHART_MAX_POINTS))
+        return jsonify({'success': True, **result})
+    except (FilterError, ChartDataError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Chart data error: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+_chart_figure_lock = threading.Lock()
+
+@app.route('/api/charts/batch', methods=['POST'])
+@login_required
+def charts_batch():
+    """Several charts over one data load and filter pass.
+
+    Body: {"filters": {...}, "charts": [chart configs], "output": "series" or "figure", "max_points": n}.
+    The filters apply to every chart (a config's own filters are ignored). Each
+    entry of "charts" is that config's /api/chart-data (series) or /api/chart
+    (figure) payload, or {"error": ...}. With DuckDB the charts build in parallel.
+    """
+    try:
+        body = request.get_json(silent=True) or {}
+        configs = body.get('charts')
+        filters = body.get('filters') or {}
+        output = body.get('output', 'series')
+        max_points = body.get('max_points', CHART_MAX_POINTS)
+        if not isinstance(configs, list) or not configs or not all(isinstance(c, dict) for c in configs):
+            raise ChartDataError('"charts" must be a non-empty list of chart configs')
+        if len(configs) > MAX_BATCH_CHARTS:
+            raise ChartDataError(f'At most {MAX_BATCH_CHARTS} charts per batch')
+        if output not in ('series', 'figure'):
+            raise ChartDataError('output must be "series" or "figure"')
+        
+        # Y columns load as numbers; a chart whose x or color column is another chart's y
+        # gets a load of its own so it sees the same values as a single /api/chart call
+        columns = [chart_columns(config) for config in configs]
+        numeric = list(dict.fromkeys(y_col for _, _, y_col, _ in columns if y_col))
+        loads = {}
+        chart_rows = []
+        for _, x_col, y_col, color_col in columns:
+            key = tuple(numeric)
+            if {x_col, color_col} & (set(numeric) - {y_col}):
+                key = (y_col,)
+            if key not in loads:
+                loads[key] = load_chart_rows(filters, list(key))
+            chart_rows.append(loads[key])
+        
+        def build(config, rows):
+            try:
+                chart_type, df, x_col, y_col, color_col = prepare_chart_frame(config, rows)
+                if output == 'figure':
+                    # Plotly figures share template objects and are not thread-safe
+                    with _chart_figure_lock:
+                        return {'success': True, 'chart': chart_figure_json(chart_type, df, x_col, y_col, color_col)}
+                points = config.get('max_points', max_points)
+                return {'success': True, **chart_series(df, chart_type, x_col, y_col, color_col, points)}
+            except ChartDataError as e:
+                return {'error': str(e)}
+            except Exception as e:
+                print(f"[CHARTS BATCH] Chart error: {str(e)}")
+                return {'error': str(e)}
+        
+        # DuckDB group-bys release the GIL; pandas ones gain nothing from threads
+        if active_engine() == 'duckdb' and len(configs) > 1:
+            with ThreadPoolExecutor(max_workers=min(CHART_BATCH_WORKERS, len(configs))) as pool:
+                charts = list(pool.map(build, configs, chart_rows))
+        else:
+            charts = [build(config, rows) for config, rows in zip(configs, chart_rows)]
+        
+        print(f"[CHARTS BATCH] {len(charts)} charts from {len(loads)} data load(s)")
+        return jsonify({'success': True, 'charts': charts})
+    except (FilterError, ChartDataError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"[CHARTS BATCH] Error: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/favorites', methods=['GET'])
 def get_favorites():
     """Get list of favorite reports"""
@@ -4334,15 +4944,14 @@ def export_report():
         
         # Load and filter data from database
         file_path = session.get('current_file')
-        df = get_combined_data(file_path, user_filter)
-        df = add_calculated_columns(df)
+        numeric_cols = [config.get('y_column') for config in chart_configs]
+        if pivot_config:
+            values = pivot_config.get('values') or []
+            numeric_cols += [values] if isinstance(values, str) else list(values)
+        df = get_combined_data(file_path, user_filter, filters, numeric=numeric_cols, calculated=True)
         
         # Apply filters
-        for col, values in filters.items():
-            if col in df.columns and values:
-                df_col_str = df[col].astype(str)
-                values_str = [str(v) for v in values]
-                df = df[df_col_str.isin(values_str)]
+        df = apply_filters(df, filters)
         
         if df.empty:
             return jsonify({'error': 'No data available to export'}), 400
@@ -4394,19 +5003,7 @@ def export_report():
             sample_df = df[display_cols].head(20)
             
             # Create table
-            table = doc.add_table(rows=len(sample_df) + 1, cols=len(display_cols))
-            table.style = 'Light Grid Accent 1'
-            
-            # Header row
-            for i, col in enumerate(display_cols):
-                table.rows[0].cells[i].text = str(col)
-                table.rows[0].cells[i].paragraphs[0].runs[0].font.bold = True
-            
-            # Data rows
-            for row_idx, (_, row) in enumerate(sample_df.iterrows(), start=1):
-                for col_idx, col in enumerate(display_cols):
-                    cell_value = str(row[col]) if pd.notna(row[col]) else ''
-                    table.rows[row_idx].cells[col_idx].text = cell_value
+            add_table(doc, display_cols, frame_columns(sample_df), style='Light Grid Accent 1')
             
             # Pivot table with actual data
             if pivot_config:
@@ -4433,43 +5030,21 @@ def export_report():
                             if col in df.columns:
                                 df[col] = pd.to_numeric(df[col], errors='coerce')
                         
-                        pivot_df = pd.pivot_table(
+                        pivot_df = analytics_pivot_table(
                             df,
-                            values=values_cols[0] if len(values_cols) == 1 else values_cols,
                             index=index_col,
+                            values=values_cols[0] if len(values_cols) == 1 else values_cols,
                             columns=columns_col if columns_col else None,
-                            aggfunc=agg_func,
-                            fill_value=0
+                            agg=agg_func,
                         )
                         
-                        # Reset index to make it a regular column
-                        pivot_df = pivot_df.reset_index()
-                        
-                        # Limit to first 30 rows for readability
-                        display_pivot = pivot_df.head(30)
-                        
                         # Create Word table
-                        pivot_table = doc.add_table(rows=len(display_pivot) + 1, cols=len(display_pivot.columns))
-                        pivot_table.style = 'Light Grid Accent 1'
-                        
-                        # Header row
-                        for i, col in enumerate(display_pivot.columns):
-                            cell = pivot_table.rows[0].cells[i]
-                            cell.text = str(col)
-                            cell.paragraphs[0].runs[0].font.bold = True
+                        display_pivot = pivot_df.head(WORD_TABLE_ROWS)
+                        add_table(doc, list(display_pivot.columns), frame_columns(display_pivot, number_text),
+                                  style='Light Grid Accent 1')
                         
-                        # Data rows
-                        for row_idx, (_, row) in enumerate(display_pivot.iterrows(), start=1):
-                            for col_idx, col in enumerate(display_pivot.columns):
-                                value = row[col]
-                                if isinstance(value, (int, float)):
-                                    cell_text = f'{value:,.2f}' if not pd.isna(value) else '0'
-                                else:
-                                    cell_text = str(value) if pd.notna(value) else ''
-                                pivot_table.rows[row_idx].cells[col_idx].text = cell_text
-                        
-                        if len(pivot_df) > 30:
-                            doc.add_paragraph(f'\n(Showing first 30 of {len(pivot_df)} total rows. Full table in Excel export.)')
+                        if len(pivot_df) > WORD_TABLE_ROWS:
+                            doc.add_paragraph(f'\n(Showing first {WORD_TABLE_ROWS} of {len(pivot_df)} total rows. Full table in Excel export.)')
                 except Exception as e:
                     doc.add_paragraph(f'Error creating pivot table: {str(e)}')
                     doc.add_paragraph('Full pivot table available in Excel export.')
@@ -4481,6 +5056,9 @@ def export_report():
                 doc.add_paragraph(f'Total Charts Created: {len(chart_configs)}')
                 doc.add_paragraph('')
                 
+                # Chart images, rendered in parallel by the renderer pool
+                rendered = render_export_charts(df, chart_configs)
+                
                 for i, config in enumerate(chart_configs, 1):
                     chart_type = config.get("chart_type", "Unknown").title()
                     x_col = config.get("x_column", "")
@@ -4501,6 +5079,14 @@ def export_report():
                         doc.add_paragraph(f'🎨 Color by: {color_col}')
                     doc.add_paragraph('')
                     
+                    img_bytes = rendered[i - 1][1]
+                    if img_bytes is not None:
+                        try:
+                            doc.add_picture(io.BytesIO(img_bytes), width=Inches(6))
+                            doc.add_paragraph('')
+                        except Exception as img_error:
+                            print(f"Chart image generation failed: {str(img_error)}")
+                    
                     # Generate chart data table
                     try:
                         # Prepare data for chart based on type
@@ -4513,7 +5099,7 @@ def export_report():
                                 chart_df = df[[x_col, y_col]].copy()
                                 chart_df[y_col] = pd.to_numeric(chart_df[y_col], errors='coerce')
                                 # Aggregate by X column (category)
-                                chart_data = chart_df.groupby(x_col)[y_col].sum().reset_index()
+                                chart_data = group_aggregate(chart_df, x_col, y_col)
                                 chart_data.columns = [x_col, f'Total {y_col}']
                                 chart_data = chart_data.sort_values(by=f'Total {y_col}', ascending=False).head(25)
                             
@@ -4522,7 +5108,7 @@ def export_report():
                                 chart_df = df[[x_col, y_col]].copy()
                                 chart_df[y_col] = pd.to_numeric(chart_df[y_col], errors='coerce')
                                 # Group by X column (time) and aggregate
-                                chart_data = chart_df.groupby(x_col)[y_col].sum().reset_index()
+                                chart_data = group_aggregate(chart_df, x_col, y_col)
                                 chart_data.columns = [x_col, f'Total {y_col}']
                                 # Try to sort by date if possible
                                 try:
@@ -4545,24 +5131,8 @@ def export_report():
                                 
                                 # Limit rows for display
                                 display_chart = chart_data.head(25)
-                                chart_table = doc.add_table(rows=len(display_chart) + 1, cols=len(display_chart.columns))
-                                chart_table.style = 'Light Grid Accent 1'
-                                
-                                # Header row
-                                for col_idx, col in enumerate(display_chart.columns):
-                                    cell = chart_table.rows[0].cells[col_idx]
-                                    cell.text = str(col)
-                                    cell.paragraphs[0].runs[0].font.bold = True
-                                
-                                # Data rows
-                                for row_idx, (_, row) in enumerate(display_chart.iterrows(), start=1):
-                                    for col_idx, col in enumerate(display_chart.columns):
-                                        value = row[col]
-                                        if isinstance(value, (int, float)):
-                                            cell_text = f'{value:,.2f}' if not pd.isna(value) else '0'
-                                        else:
-                                            cell_text = str(value) if pd.notna(value) else ''
-                                        chart_table.rows[row_idx].cells[col_idx].text = cell_text
+                                add_table(doc, list(display_chart.columns), frame_columns(display_chart, number_text),
+                                          style='Light Grid Accent 1')
                                 
                                 if len(chart_data) > 25:
                                     doc.add_paragraph(f'(Showing top 25 of {len(chart_data)} data points)')
@@ -4619,14 +5189,13 @@ def export_report():
                         agg_func = pivot_config.get('agg_func', 'sum')
                         
                         if index_col and values_cols:
-                            pivot_df = pd.pivot_table(
+                            pivot_df = analytics_pivot_table(
                                 df,
-                                values=values_cols[0] if len(values_cols) == 1 else values_cols,
                                 index=index_col,
+                                values=values_cols[0] if len(values_cols) == 1 else values_cols,
                                 columns=columns_col if columns_col else None,
-                                aggfunc=agg_func,
-                                fill_value=0
-                            )
+                                agg=agg_func,
+                            ).set_index(index_col)
                             pivot_df.to_excel(writer, sheet_name='Pivot Table')
                     except Exception as e:
                         print(f"Error creating pivot in Excel: {e}")
@@ -4665,6 +5234,8 @@ def export_report():
                 download_name=f'report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
             )
     
+    except FilterError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Export error: {str(e)}")
         import traceback
@@ -4692,15 +5263,10 @@ def export_pivot():
         
         # Load and filter data
         file_path = session.get('current_file')
-        df = get_combined_data(file_path, user_filter)
-        df = add_calculated_columns(df)
+        df = get_combined_data(file_path, user_filter, filters, numeric=pivot_config.get('values'), calculated=True)
         
         # Apply filters
-        for col, values in filters.items():
-            if col in df.columns and values:
-                df_col_str = df[col].astype(str)
-                values_str = [str(v) for v in values]
-                df = df[df_col_str.isin(values_str)]
+        df = apply_filters(df, filters)
         
         if df.empty:
             return jsonify({'error': 'No data available to export'}), 400
@@ -4754,8 +5320,13 @@ def export_pivot():
                 pivot_params['columns'] = columns_col
                 print(f"Added columns parameter: {columns_col}")
             
-            pivot_df = pd.pivot_table(df, **pivot_params)
-            pivot_df = pivot_df.reset_index()
+            pivot_df = analytics_pivot_table(
+                df,
+                index=index_col,
+                values=values_to_use,
+                columns=pivot_params.get('columns'),
+                agg=agg_func,
+            )
             
             # Handle multi-level columns
             if any(isinstance(col, tuple) for col in pivot_df.columns):
@@ -4794,30 +5365,14 @@ def export_pivot():
             doc.add_heading('Pivot Table', 1)
             
             # Limit to reasonable size for Word
-            display_pivot = pivot_df.head(100)
+            display_pivot = pivot_df.head(WORD_TABLE_ROWS)
             
             # Create table
-            pivot_table = doc.add_table(rows=len(display_pivot) + 1, cols=len(display_pivot.columns))
-            pivot_table.style = 'Light Grid Accent 1'
+            add_table(doc, list(display_pivot.columns), frame_columns(display_pivot, number_text),
+                      style='Light Grid Accent 1')
             
-            # Header row
-            for i, col in enumerate(display_pivot.columns):
-                cell = pivot_table.rows[0].cells[i]
-                cell.text = str(col)
-                cell.paragraphs[0].runs[0].font.bold = True
-            
-            # Data rows
-            for row_idx, (_, row) in enumerate(display_pivot.iterrows(), start=1):
-                for col_idx, col in enumerate(display_pivot.columns):
-                    value = row[col]
-                    if isinstance(value, (int, float)):
-                        cell_text = f'{value:,.2f}' if not pd.isna(value) else '0'
-                    else:
-                        cell_text = str(value) if pd.notna(value) else ''
-                    pivot_table.rows[row_idx].cells[col_idx].text = cell_text
-            
-            if len(pivot_df) > 100:
-                doc.add_paragraph(f'\n(Showing first 100 of {len(pivot_df)} total rows)')
+            if len(pivot_df) > WORD_TABLE_ROWS:
+                doc.add_paragraph(f'\n(Showing first {WORD_TABLE_ROWS} of {len(pivot_df)} total rows)')
             
             # Save Word document
             doc_io = io.BytesIO()
@@ -4864,12 +5419,82 @@ def export_pivot():
                 download_name=f'pivot_table_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
             )
     
+    except FilterError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Pivot export error: {str(e)}")
         import traceback
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+def export_chart_figure(df, config):
+    """(chart data, Plotly figure or None) of a chart config for the Word exports"""
+    chart_type = config.get("chart_type", "Unknown").title()
+    x_col = config.get("x_column", "")
+    y_col = config.get("y_column", "")
+    if x_col not in df.columns or y_col not in df.columns:
+        return None, None
+
+    # Prepare chart data
+    chart_df = df[[x_col, y_col]].copy()
+    chart_df[y_col] = pd.to_numeric(chart_df[y_col], errors='coerce')
+    chart_df = chart_df.dropna()
+
+    # Aggregate based on chart type
+    if chart_type.lower() in ['bar', 'pie']:
+        chart_data = group_aggregate(chart_df, x_col, y_col)
+        chart_data = chart_data.sort_values(by=y_col, ascending=False).head(30)
+    elif chart_type.lower() == 'line':
+        chart_data = group_aggregate(chart_df, x_col, y_col)
+        # Try to sort by date
+        try:
+            chart_data[x_col] = pd.to_datetime(chart_data[x_col], errors='coerce')
+            chart_data = chart_data.sort_values(by=x_col)
+            # Convert back to string for display
+            chart_data[x_col] = chart_data[x_col].dt.strftime('%d/%b/%Y')
+        except:
+            pass
+        chart_data = chart_data.head(50)
+    else:
+        chart_data = chart_df.head(50)
+
+    fig = None
+    try:
+        if chart_type.lower() == 'bar':
+            fig = px.bar(chart_data, x=x_col, y=y_col, title=f'{chart_type} Chart: {y_col} by {x_col}')
+        elif chart_type.lower() == 'line':
+            fig = px.line(chart_data, x=x_col, y=y_col, title=f'{chart_type} Chart: {y_col} over {x_col}')
+        elif chart_type.lower() == 'pie':
+            fig = px.pie(chart_data, names=x_col, values=y_col, title=f'{chart_type} Chart: {y_col} by {x_col}')
+        elif chart_type.lower() == 'scatter':
+            fig = px.scatter(chart_data, x=x_col, y=y_col, title=f'{chart_type} Chart: {y_col} vs {x_col}')
+
+        if fig:
+            # Update layout for better export
+            fig.update_layout(
+                width=800,
+                height=500,
+                template='plotly_white',
+                showlegend=True
+            )
+    except Exception as img_error:
+        print(f"Chart image generation failed: {str(img_error)}")
+        fig = None
+    return chart_data, fig
+
+def render_export_charts(df, chart_configs):
+    """(chart data or the error preparing it, PNG bytes or None) per chart config, rendered in parallel"""
+    prepared, figures = [], []
+    for config in chart_configs:
+        try:
+            chart_data, fig = export_chart_figure(df, config)
+        except Exception as e:
+            chart_data, fig = e, None
+        prepared.append(chart_data)
+        figures.append(fig)
+    images = _chart_renderer.render_many(figures, get_dataset_version(), width=800, height=500, scale=2)
+    return list(zip(prepared, images))
+
 @app.route('/api/export-charts', methods=['POST'])
 @login_required
 def export_charts():
@@ -4887,15 +5512,10 @@ def export_charts():
         
         # Load and filter data
         file_path = session.get('current_file')
-        df = get_combined_data(file_path, user_filter)
-        df = add_calculated_columns(df)
+        df = get_combined_data(file_path, user_filter, filters, numeric=[config.get('y_column') for config in chart_configs], calculated=True)
         
         # Apply filters
-        for col, values in filters.items():
-            if col in df.columns and values:
-                df_col_str = df[col].astype(str)
-                values_str = [str(v) for v in values]
-                df = df[df_col_str.isin(values_str)]
+        df = apply_filters(df, filters)
         
         if df.empty:
             return jsonify({'error': 'No data available to export'}), 400
@@ -4918,6 +5538,9 @@ def export_charts():
             doc.add_heading(f'Total Charts: {len(chart_configs)}', 1)
             doc.add_paragraph()
             
+            # Build every figure up front so the renderer pool draws them in parallel
+            rendered = render_export_charts(df, chart_configs)
+            
             # Process each chart
             for i, config in enumerate(chart_configs, 1):
                 chart_type = config.get("chart_type", "Unknown").title()
@@ -4946,80 +5569,30 @@ def export_charts():
                 
                 try:
                     if x_col in df.columns and y_col in df.columns:
-                        # Prepare chart data
-                        chart_df = df[[x_col, y_col]].copy()
-                        chart_df[y_col] = pd.to_numeric(chart_df[y_col], errors='coerce')
-                        chart_df = chart_df.dropna()
+                        chart_data, img_bytes = rendered[i - 1]
+                        if isinstance(chart_data, Exception):
+                            raise chart_data
                         
-                        # Aggregate based on chart type
-                        if chart_type.lower() in ['bar', 'pie']:
-                            chart_data = chart_df.groupby(x_col)[y_col].sum().reset_index()
-                            chart_data = chart_data.sort_values(by=y_col, ascending=False).head(30)
-                        elif chart_type.lower() == 'line':
-                            chart_data = chart_df.groupby(x_col)[y_col].sum().reset_index()
-                            # Try to sort by date
+                        if img_bytes is not None:
                             try:
-                                chart_data[x_col] = pd.to_datetime(chart_data[x_col], errors='coerce')
-                                chart_data = chart_data.sort_values(by=x_col)
-                                # Convert back to string for display
-                                chart_data[x_col] = chart_data[x_col].dt.strftime('%d/%b/%Y')
-                            except:
-                                pass
-                            chart_data = chart_data.head(50)
-                        else:
-                            chart_data = chart_df.head(50)
-                        
-                        # Try to create chart image
-                        try:
-                            # Create Plotly figure
-                            fig = None
-                            if chart_type.lower() == 'bar':
-                                fig = px.bar(chart_data, x=x_col, y=y_col, title=f'{chart_type} Chart: {y_col} by {x_col}')
-                            elif chart_type.lower() == 'line':
-                                fig = px.line(chart_data, x=x_col, y=y_col, title=f'{chart_type} Chart: {y_col} over {x_col}')
-                            elif chart_type.lower() == 'pie':
-                                fig = px.pie(chart_data, names=x_col, values=y_col, title=f'{chart_type} Chart: {y_col} by {x_col}')
-                            elif chart_type.lower() == 'scatter':
-                                fig = px.scatter(chart_data, x=x_col, y=y_col, title=f'{chart_type} Chart: {y_col} vs {x_col}')
-                            
-                            if fig:
-                                # Update layout for better export
-                                fig.update_layout(
-                                    width=800,
-                                    height=500,
-                                    template='plotly_white',
-                                    showlegend=True
-                                )
-                                
-                                # Export to image using kaleido
-                                img_bytes = fig.to_image(format='png', width=800, height=500, scale=2)
                                 img_stream = io.BytesIO(img_bytes)
                                 doc.add_picture(img_stream, width=Inches(6))
                                 image_added = True
                                 doc.add_paragraph()
-                        except Exception as img_error:
-                            print(f"Chart image generation failed: {str(img_error)}")
-                            # Will fall back to table below
+                            except Exception as img_error:
+                                print(f"Chart image generation failed: {str(img_error)}")
+                                # Will fall back to table below
                         
                         # If image failed, show data table as fallback
                         if not image_added and chart_data is not None and not chart_data.empty:
                             doc.add_paragraph('Chart Data Table:', style='Heading 3')
                             
-                            # Create table
-                            table = doc.add_table(rows=min(len(chart_data) + 1, 31), cols=2)
-                            table.style = 'Light Grid Accent 1'
-                            
-                            # Header
-                            table.rows[0].cells[0].text = str(x_col)
-                            table.rows[0].cells[1].text = str(y_col)
-                            for cell in table.rows[0].cells:
-                                cell.paragraphs[0].runs[0].font.bold = True
-                            
-                            # Data rows (max 30)
-                            for idx, (_, row) in enumerate(chart_data.head(30).iterrows(), start=1):
-                                table.rows[idx].cells[0].text = str(row[x_col]) if pd.notna(row[x_col]) else ''
-                                value = row[y_col]
-                                table.rows[idx].cells[1].text = f'{value:,.2f}' if pd.notna(value) else '0'
+                            # Create table (max 30 data rows)
+                            values = chart_data.head(30).values
+                            add_table(doc, [x_col, y_col], [
+                                [plain_text(value) for value in values[:, 0]],
+                                [f'{value:,.2f}' if pd.notna(value) else '0' for value in values[:, 1]],
+                            ], style='Light Grid Accent 1')
                             
                             doc.add_paragraph()
                     else:
@@ -5073,11 +5646,11 @@ def export_charts():
                             
                             # Aggregate based on type
                             if chart_type in ['bar', 'pie']:
-                                chart_data = chart_df.groupby(x_col)[y_col].sum().reset_index()
+                                chart_data = group_aggregate(chart_df, x_col, y_col)
                                 chart_data.columns = [x_col, f'Total {y_col}']
                                 chart_data = chart_data.sort_values(by=f'Total {y_col}', ascending=False)
                             elif chart_type == 'line':
-                                chart_data = chart_df.groupby(x_col)[y_col].sum().reset_index()
+                                chart_data = group_aggregate(chart_df, x_col, y_col)
                                 chart_data.columns = [x_col, f'Total {y_col}']
                             else:
                                 chart_data = chart_df.dropna().head(100)
@@ -5100,12 +5673,172 @@ def export_charts():
                 download_name=f'charts_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
             )
     
+    except FilterError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Charts export error: {str(e)}")
         import traceback
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+EXPORT_JOB_VIEWS = {'report': export_report, 'pivot': export_pivot, 'charts': export_charts}
+
+def build_export(kind, payload, identity):
+    """(file bytes, {filename, mimetype}) of an export, built by its endpoint off the request thread"""
+    with app.test_request_context(method='POST', json=payload):
+        session.update(identity)
+        response = app.make_response(EXPORT_JOB_VIEWS[kind]())
+        try:
+            if response.status_code != 200:
+                error = (response.get_json(silent=True) or {}).get('error')
+                raise ExportJobError(error or f'Export failed with status {response.status_code}')
+            data = b''.join(response.response)
+        finally:
+            response.close()
+    _, options = parse_options_header(response.headers.get('Content-Disposition', ''))
+    return data, {'filename': options.get('filename', f'{kind}_export'), 'mimetype': response.mimetype}
+
+_export_jobs = ExportJobs(build_export, ArtifactCache(app.config['EXPORT_CACHE_FOLDER']),
+                          workers=app.config['EXPORT_JOB_WORKERS'])
+
+def export_scope():
+    """Whose view of the data an export shows; jobs and cached files are shared within a scope"""
+    return (session.get('role'), session.get('name'))
+
+def export_job_status(job):
+    return {
+        'job_id': job['id'],
+        'status': job['status'],
+        'error': job['error'],
+        'cached': job['cached'],
+        'filename': download_name(job['filename']),
+        'download_url': url_for('download_export_job', job_id=job['id']) if job['status'] == 'done' else None,
+    }
+
+@app.route('/api/export/jobs', methods=['POST'])
+@login_required
+def submit_export_job():
+    """Queue a report, pivot or charts export (same body as its endpoint plus "type"); returns the job"""
+    try:
+        payload = dict(request.get_json(silent=True) or {})
+        kind = payload.pop('type', None)
+        if kind not in EXPORT_JOB_VIEWS:
+            return jsonify({'error': f'Unknown export type "{kind}"; use one of {", ".join(EXPORT_JOB_VIEWS)}'}), 400
+        
+        # Everything the export's content depends on: an identical request later is served from disk
+        file_path = session.get('current_file')
+        file_stamp = os.path.getmtime(file_path) if file_path and os.path.exists(file_path) else None
+        key = artifact_key(kind, payload, export_scope(), file_path, file_stamp, get_dataset_version())
+        
+        job = _export_jobs.submit(key, export_scope(), kind, payload, dict(session))
+        return jsonify(export_job_status(job)), 200 if job['status'] == 'done' else 202
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/export/jobs/<job_id>', methods=['GET'])
+@login_required
+def export_job(job_id):
+    """Status of an export job"""
+    job = _export_jobs.get(job_id, export_scope())
+    if job is None:
+        return jsonify({'error': 'Export job not found'}), 404
+    return jsonify(export_job_status(job))
+
+@app.route('/api/export/jobs/<job_id>/download', methods=['GET'])
+@login_required
+def download_export_job(job_id):
+    """File of a finished export job"""
+    job = _export_jobs.get(job_id, export_scope())
+    if job is None:
+        return jsonify({'error': 'Export job not found'}), 404
+    if job['status'] != 'done':
+        return jsonify({'error': f"Export is {job['status']}", 'status': job['status']}), 409
+    artifact = _export_jobs.artifact(job)
+    if artifact is None:
+        return jsonify({'error': 'Export file has expired; submit the export again'}), 410
+    path, meta = artifact
+    return send_file(path, mimetype=meta['mimetype'], as_attachment=True, download_name=download_name(meta['filename']))
+
+@app.route('/api/aggregate', methods=['POST'])
+@login_required
+def aggregate_data():
+    """Evaluate an aggregation spec (dimensions, time bucket, measures, filters) in one pass over the data"""
+    try:
+        spec = request.get_json(silent=True) or {}
+        user_filter = None if session.get('role') == 'admin' else session.get('name')
+        df = get_snapshot().view(user_filter)
+        return jsonify({'success': True, 'results': aggregate(df, spec, filter_aliases=DASHBOARD_FILTER_FIELDS)})
+    except (FilterError, AggregationError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"[AGGREGATE] Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/rollup', methods=['POST'])
+@login_required
+def rollup_query():
+    """Totals from the rollup cubes: grain dimensions, a period level, and drill-down with 'within'"""
+    try:
+        spec = request.get_json(silent=True) or {}
+        level = spec.get('level')
+        where = dict(spec.get('where') or {})
+        if session.get('role') != 'admin':
+            where['nameSurname'] = [session.get('name')]
+        rows = get_rollups().query(
+            spec.get('dimensions') or [], level, spec.get('measures'),
+            year=spec.get('year'), month=spec.get('month'), within=spec.get('within'),
+            where=where, drop_empty=bool(spec.get('dropEmpty')),
+        )
+        return jsonify({
+            'success': True,
+            'level': level,
+            'rows': rows,
+            'drillDown': drill_down(level) if level else ROLLUP_LEVELS[-1],
+            'rollUp': roll_up(level) if level else None,
+        })
+    except AggregationError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"[ROLLUP] Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/approximate-stats', methods=['GET'])
+@admin_required
+def approximate_stats():
+    """Sketch-based distinct counts and most frequent values per column; ?columns=a,b&top=10"""
+    try:
+        sketches = get_sketches()
+        columns = request.args.get('columns')
+        columns = [c.strip() for c in columns.split(',') if c.strip()] if columns else list(sketches.columns)
+        top = int(request.args.get('top', 10))
+        result = {col: {'distinct': sketches.distinct_count(col), 'top': sketches.top_values(col, top)}
+                  for col in columns if col in sketches.columns}
+        return jsonify({'success': True, 'approximate': True, 'version': sketches.version,
+                        'rows': sketches.rows, 'columns': result})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"[SKETCH] Stats error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/numeric-report', methods=['GET'])
+@admin_required
+def numeric_report():
+    """Per-column counts of parsed, blank and unparseable values; ?columns=a,b limits the columns"""
+    try:
+        columns = request.args.get('columns')
+        columns = [c.strip() for c in columns.split(',') if c.strip()] if columns else None
+        snapshot = get_snapshot()
+        return jsonify({'success': True, 'version': snapshot.version, 'columns': snapshot.numeric_report(columns)})
+    except Exception as e:
+        print(f"[NUMERIC] Report error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/api/pie-chart-data', methods=['GET'])
 @login_required
 def get_pie_chart_data():
@@ -5113,6 +5846,7 @@ def get_pie_chart_data():
     try:
         user_filter = None if session.get('role') == 'admin' else session.get('name')
         df = get_combined_data(session.get('current_file'), user_filter)
+        filters = json.loads(request.args.get('filters', '{}'))
 
         if df.empty:
             return jsonify({'apcb': 0, 'subcon': 0})
@@ -5127,13 +5861,16 @@ def get_pie_chart_data():
         if not apcb_col:
             return jsonify({'apcb': 0, 'subcon': 0})
 
-        # Calculate counts
+        # Calculate counts (exact cell values: 'AP-CB ' is neither)
+        df = apply_filters(df, filters, aliases=DASHBOARD_FILTER_FIELDS, loose=True)
         counts = df[apcb_col].value_counts()
-        apcb_count = int(counts.get('AP-CB', 0))
-        subcon_count = int(counts.get('Subcon', 0))
 
-        return jsonify({'apcb': apcb_count, 'subcon': subcon_count})
+        return jsonify({'apcb': int(counts.get('AP-CB', 0)), 'subcon': int(counts.get('Subcon', 0))})
 
+    except FilterError as e:
+        return jsonify({'error': str(e)}), 400
+    except json.JSONDecodeError as e:
+        return jsonify({'error': f'Invalid JSON in query string: {e}'}), 400
     except Exception as e:
         print(f"Pie chart data error: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -5150,72 +5887,31 @@ def get_filter_options():
         # Cache for 30 seconds if no filters applied
         cache_time = 30 if not any(current_filters.values()) else 0
         
-        records = DatabaseRecord.query.all()
-        if not records:
+        # Value-list selections are answered from the bitmap index
+        index = get_bitmap_index()
+        selection = index.selection(current_filters, aliases=DASHBOARD_FILTER_FIELDS, loose=True)
+        if selection is not None:
+            if not index.rows:
+                print("[FILTER OPTIONS] No records found")
+                return jsonify({})
+            filter_options = {}
+            for key, fields in DASHBOARD_OPTION_FIELDS.items():
+                field = index.field(fields, loose=True)
+                values = field.options(selection) if field is not None else []
+                filter_options[key] = [{'label': v, 'value': v} for v in values]
+            print(f"[FILTER OPTIONS] Returning cascading filter options (bitmap index)")
+            response = jsonify(filter_options)
+            if cache_time > 0:
+                response.headers['Cache-Control'] = f'public, max-age={cache_time}'
+            return response
+        
+        # Apply current filters in the database to get relevant records
+        filtered_data = query_records(current_filters, aliases=DASHBOARD_FILTER_FIELDS, loose=True)
+        
+        if not filtered_data and not DatabaseRecord.query.first():
             print("[FILTER OPTIONS] No records found")
             return jsonify({})
         
-        print(f"[FILTER OPTIONS] Processing {len(records)} records with filters: {current_filters}")
-        data = [json.loads(r.data) for r in records]
-        
-        # Check sample record structure
-        if data:
-            print(f"[FILTER OPTIONS] Sample record keys: {list(data[0].keys())[:10]}")
-        
-        # Helper function to get field value with fallback
-        def get_field_value(record, *possible_names):
-            for name in possible_names:
-                if name in record:
-                    return str(record.get(name, '')).strip()
-            return ''
-        
-        # Apply current filters to get relevant records
-        filtered_data = []
-        filter_mapping = {
-            'nameSurname': ['Name Surname', 'nameSurname', 'Name-Surname'],
-            'discipline': ['Discipline', 'discipline'],
-            'company': ['Company', 'company'],
-            'projectsGroup': ['Projects/Group', 'projectsGroup', 'Projects-Group'],
-            'scope': ['Scope', 'scope'],
-            'projects': ['Projects', 'projects'],
-            'nationality': ['Nationality', 'nationality'],
-            'status': ['Status', 'status'],
-            'northSouth': ['North/South', 'northSouth', 'North-South'],
-            'control1': ['Control-1', 'control1', 'Control1'],
-            'no1': ['NO-1', 'no1', 'NO1'],
-            'no2': ['NO-2', 'no2', 'NO2'],
-            'no3': ['NO-3', 'no3', 'NO3'],
-            'no10': ['NO-10', 'no10', 'NO10'],
-            'kontrol1': ['Kontrol-1', 'kontrol1', 'Kontrol1'],
-            'kontrol2': ['Kontrol-2', 'kontrol2', 'Kontrol2'],
-            'lsUnitRate': ['LS/Unit Rate', 'lsUnitRate', 'LS-Unit-Rate'],
-        }
-        
-        for record in data:
-            passes_filters = True
-            
-            # Check each currently applied filter
-            for filter_key, field_names in filter_mapping.items():
-                filter_values = current_filters.get(filter_key, [])
-                if filter_values and len(filter_values) > 0:
-                    record_value = get_field_value(record, *field_names)
-                    # Exact match comparison (case-insensitive, trimmed)
-                    if record_value:
-                        try:
-                            normalized_record_value = str(record_value).strip().upper()
-                            normalized_filter_values = [str(v).strip().upper() for v in filter_values if v]
-                            if normalized_record_value not in normalized_filter_values:
-                                passes_filters = False
-                                break
-                        except Exception as e:
-                            print(f"[FILTER OPTIONS] Error normalizing values for {filter_key}: {e}")
-                            if record_value not in filter_values:
-                                passes_filters = False
-                                break
-            
-            if passes_filters:
-                filtered_data.append(record)
-        
         print(f"[FILTER OPTIONS] After applying current filters: {len(filtered_data)} records")
         
         # Extract unique values for each filter from filtered records
@@ -5236,31 +5932,17 @@ def get_filter_options():
             print(f"[FILTER OPTIONS] {field_names[0]}: {len(result)} unique values - {result[:3] if result else 'EMPTY'}")
             return result
         
-        filter_options = {
-            'nameSurname': get_unique_options('Name Surname', 'nameSurname', 'Name-Surname'),
-            'discipline': get_unique_options('Discipline', 'discipline'),
-            'company': get_unique_options('Company', 'company'),
-            'projectsGroup': get_unique_options('Projects/Group', 'projectsGroup', 'Projects-Group'),
-            'scope': get_unique_options('Scope', 'scope'),
-            'projects': get_unique_options('Projects', 'projects'),
-            'nationality': get_unique_options('Nationality', 'nationality'),
-            'status': get_unique_options('Status', 'status'),
-            'northSouth': get_unique_options('North/\nSouth', 'northSouth', 'North-South',"North/ South"),
-            'control1': get_unique_options('Control-1', 'control1', 'Control1'),
-            'no1': get_unique_options('NO-1', 'no1', 'NO1'),
-            'no2': get_unique_options('NO-2', 'no2', 'NO2'),
-            'no3': get_unique_options('NO-3', 'no3', 'NO3'),
-            'no10': get_unique_options('NO-10', 'no10', 'NO10'),
-            'kontrol1': get_unique_options('Konrol-1', 'kontrol1', 'Kontrol1'),
-            'kontrol2': get_unique_options('Knrtol-2', 'kontrol2', 'Kontrol2'),
-            'lsUnitRate': get_unique_options('LS/Unit Rate', 'lsUnitRate', 'LS-Unit-Rate'),
-        }
+        filter_options = {key: get_unique_options(*fields) for key, fields in DASHBOARD_OPTION_FIELDS.items()}
         
         print(f"[FILTER OPTIONS] Returning cascading filter options")
         response = jsonify(filter_options)
         if cache_time > 0:
             response.headers['Cache-Control'] = f'public, max-age={cache_time}'
         return response
+    except FilterError as e:
+        return jsonify({'error': str(e)}), 400
+    except json.JSONDecodeError as e:
+        return jsonify({'error': f'Invalid JSON in query string: {e}'}), 400
     except Exception as e:
         print(f"[FILTER OPTIONS] Error: {e}")
         import traceback
@@ -5286,161 +5968,53 @@ def get_mh_table_data():
         print(f"[MH TABLE] Fetching data - Year: {year}, Month: {month}")
         print(f"[MH TABLE] Filters: {filters}")
         
-        records = DatabaseRecord.query.all()
-        if not records:
-            print("[MH TABLE] No records found in database")
-            return jsonify({'data': []})
-        
-        print(f"[MH TABLE] Found {len(records)} total records")
-        data = [json.loads(r.data) for r in records]
-        
-        # Check the structure of first record
-        if data:
-            print(f"[MH TABLE] Sample record keys: {list(data[0].keys())[:10]}")
-        
-        # Apply filters - check both camelCase and space-separated formats
-        filtered_data = []
-        for record in data:
-            passes_filters = True
-            
-            # Helper function to get field value with fallback
-            def get_field_value(record, *possible_names):
-                for name in possible_names:
-                    if name in record:
-                        return str(record.get(name, '')).strip()
-                return ''
-            
-            # Check each filter with multiple possible field names
-            filter_checks = [
-                ('nameSurname', ['Name Surname', 'nameSurname', 'Name-Surname']),
-                ('discipline', ['Discipline', 'discipline']),
-                ('company', ['Company', 'company']),
-                ('projectsGroup', ['Projects/Group', 'projectsGroup', 'Projects-Group']),
-                ('scope', ['Scope', 'scope']),
-                ('projects', ['Projects', 'projects']),
-                ('nationality', ['Nationality', 'nationality']),
-                ('status', ['Status', 'status']),
-                ('northSouth', ['North/South', 'northSouth', 'North-South']),
-                ('control1', ['Control-1', 'control1', 'Control1']),
-                ('no1', ['NO-1', 'no1', 'NO1']),
-                ('no2', ['NO-2', 'no2', 'NO2']),
-                ('no3', ['NO-3', 'no3', 'NO3']),
-                ('no10', ['NO-10', 'no10', 'NO10']),
-                ('kontrol1', ['Kontrol-1', 'kontrol1', 'Kontrol1']),
-                ('kontrol2', ['Kontrol-2', 'kontrol2', 'Kontrol2']),
-                ('lsUnitRate', ['LS/Unit Rate', 'lsUnitRate', 'LS-Unit-Rate']),
-            ]
-            
-            for filter_key, field_names in filter_checks:
-                filter_values = filters.get(filter_key, [])
-                if filter_values and len(filter_values) > 0:
-                    record_value = get_field_value(record, *field_names)
-                    # Exact match comparison (case-insensitive, trimmed)
-                    if record_value:
-                        try:
-                            # Normalize both sides for comparison
-                            normalized_record_value = str(record_value).strip().upper()
-                            normalized_filter_values = [str(v).strip().upper() for v in filter_values if v]
-                            if normalized_record_value not in normalized_filter_values:
-                                passes_filters = False
-                                break
-                        except Exception as e:
-                            print(f"[MH TABLE] Error normalizing values for {filter_key}: {e}")
-                            # Fall back to simple string comparison
-                            if record_value not in filter_values:
-                                passes_filters = False
-                                break
-            
-            if passes_filters:
-                filtered_data.append(record)
-        
-        print(f"[MH TABLE] After filtering: {len(filtered_data)} records")
-        
-        # Extract month/year from date field
-        def extract_month_year(date_str):
-            """Extract month and year from various date formats"""
-            if not date_str or str(date_str).strip() in ('', 'nan', 'None', 'NaT'):
-                return None, None
-            
-            try:
-                # Try different date formats
-                for fmt in ("%Y-%m-%d", "%d.%m.%Y", "%Y/%m/%d", "%d/%m/%Y", "%Y-%m-%d %H:%M:%S", "%d-%m-%Y"):
-                    try:
-                        dt = datetime.strptime(str(date_str)[:19], fmt)
-                        return dt.month, dt.year
-                    except:
-                        continue
-                
-                # Try pandas to_datetime as fallback
-                try:
-                    dt = pd.to_datetime(date_str)
-                    if pd.notna(dt):
-                        return dt.month, dt.year
-                except:
-                    pass
-            except Exception as e:
-                print(f"[MH TABLE] Date parse error for '{date_str}': {e}")
-            
-            return None, None
+        # Aggregate by person: attributes and all-time MH, plus MH per month within the year/month window
+        person = {'field': 'nameSurname', 'default': 'Unknown'}
+        monthly = {'dimensions': [person], 'bucket': 'month', 'year': year, 'month': month,
+                   'measures': {'mh': {'field': 'totalMH', 'agg': 'sum'}}}
+        queries = {'people': {'dimensions': [person], 'measures': {
+            'discipline': {'field': 'discipline', 'agg': 'first'},
+            'company': {'field': 'company', 'agg': 'first'},
+            'projectsGroup': {'field': 'projectsGroup', 'agg': 'first'},
+            'totalMH': {'field': 'totalMH', 'agg': 'sum'},
+        }}}
+        if filters:
+            queries['monthly'] = monthly
+        result = aggregate(get_snapshot().frame, {'filters': filters, 'queries': queries},
+                           filter_aliases=DASHBOARD_FILTER_FIELDS)
+        if not filters:
+            # Unfiltered monthly MH comes from the rollup cubes
+            result['monthly'] = get_rollups().query(
+                [person], 'month', monthly['measures'], year=year, month=month)
         
-        # Process records - aggregate by person and handle both week/month records and already-aggregated records
         person_data = {}
-        
-        for record in filtered_data:
-            # Get name with fallback
-            name = (record.get('Name Surname') or record.get('nameSurname') or 
-                   record.get('Name-Surname') or 'Unknown')
-            
-            # Get TOTAL MH - try different field names
-            total_mh = safe_float(record.get('TOTAL MH') or record.get('totalMH') or 
-                                 record.get('Total MH') or 0)
-            
-            # Get date field
-            date_str = (record.get('(Week / Month)') or record.get('Week / Month') or 
-                       record.get('Tarih') or record.get('Date') or record.get('date'))
-            
-            rec_month, rec_year = extract_month_year(date_str)
-            
-            # Initialize person entry if not exists
-            if name not in person_data:
-                person_data[name] = {
-                    'nameSurname': name,
-                    'discipline': record.get('Discipline') or record.get('discipline') or '',
-                    'company': record.get('Company') or record.get('company') or '',
-                    'projectsGroup': record.get('Projects/Group') or record.get('projectsGroup') or '',
-                    'monthlyMH': {},
-                    'totalMH': 0
-                }
-            
-            # Add to monthly totals if we have valid month/year
-            if rec_month and rec_year:
-                # If year filter is set, only include data from that year
-                if not year or str(rec_year) == year:
-                    month_key = str(rec_month).zfill(2)
-                    # Apply month filter if specified
-                    if not month or month_key == month:
-                        # When no specific year is selected (All Years), use year-month key
-                        # When specific year is selected, use just month key
-                        if not year:
-                            # All Years - use format like "2023-01", "2024-02"
-                            full_month_key = f"{rec_year}-{month_key}"
-                        else:
-                            # Specific year - use format like "01", "02"
-                            full_month_key = month_key
-                        
-                        person_data[name]['monthlyMH'][full_month_key] = \
-                            person_data[name]['monthlyMH'].get(full_month_key, 0) + total_mh
-                        person_data[name]['totalMH'] += total_mh
-            else:
-                # If no date info, just add to total (for year agnostic data)
-                if not year and not month:  # Only if no filters are set
-                    person_data[name]['totalMH'] += total_mh
+        for row in result['people']:
+            person_data[row['nameSurname']] = {
+                'nameSurname': row['nameSurname'],
+                'discipline': row['discipline'] or '',
+                'company': row['company'] or '',
+                'projectsGroup': row['projectsGroup'] or '',
+                'monthlyMH': {},
+                # Records without a date only count while no year/month is selected
+                'totalMH': row['totalMH'] if not year and not month else 0
+            }
+        for row in result['monthly']:
+            # All Years - use format like "2023-01"; specific year - use format like "01"
+            month_key = row['period'] if not year else row['period'][5:7]
+            entry = person_data[row['nameSurname']]
+            entry['monthlyMH'][month_key] = row['mh']
+            if year or month:
+                entry['totalMH'] += row['mh']
         
         # Convert to list
         result = list(person_data.values())
         print(f"[MH TABLE] Returning {len(result)} aggregated person records")
         
         return jsonify({'data': result})
+    except (FilterError, AggregationError) as e:
+        return jsonify({'error': str(e)}), 400
+    except json.JSONDecodeError as e:
+        return jsonify({'error': f'Invalid JSON in query string: {e}'}), 400
     except Exception as e:
         print(f"[MH TABLE] Error: {e}")
         import traceback
@@ -5455,168 +6029,43 @@ def get_kar_zarar_trends():
         dimension = request.args.get('dimension', 'nameSurname')  # nameSurname, discipline, projectsGroup, scope, projects
         year = request.args.get('year', '')
         metric = request.args.get('metric', 'karZarar')  # karZarar or totalMH
+        filters = json.loads(request.args.get('filters', '{}'))
         
-        records = DatabaseRecord.query.all()
-        if not records:
-            return jsonify({'data': []})
-        
-        data = [json.loads(r.data) for r in records]
-        
-        print(f"[KAR-ZARAR TRENDS] Processing {len(data)} records for dimension: {dimension}, metric: {metric}")
-        
-        # Helper function to get field value
-        def get_field_value(record, *possible_names):
-            for name in possible_names:
-                if name in record:
-                    val = record.get(name)
-                    if val and str(val).strip() not in ('', 'nan', 'None', 'NaT'):
-                        return str(val).strip()
-            return None
+        if dimension not in ('nameSurname', 'discipline', 'projectsGroup', 'scope', 'projects',
+                             'company', 'northSouth', 'lsUnitRate'):
+            dimension = 'nameSurname'
         
-        # Helper to get numeric value
-        def get_numeric_value(record, *possible_names):
-            for name in possible_names:
-                if name in record:
-                    try:
-                        val = record[name]
-                        if val and str(val).strip() not in ('', 'nan', 'None', 'NaT'):
-                            return float(val)
-                    except (ValueError, TypeError):
-                        pass
-            return None
-        
-        # Map dimension to field names
-        field_mapping = {
-            'nameSurname': ['Name Surname', 'nameSurname', 'Name-Surname'],
-            'discipline': ['Discipline', 'discipline'],
-            'projectsGroup': ['Projects/Group', 'projectsGroup', 'Projects-Group'],
-            'scope': ['Scope', 'scope'],
-            'projects': ['Projects', 'projects'],
-            'company': ['Company', 'company', 'Firma', 'Şirket'],
-            'northSouth': ['North/South', 'North/ South', 'North/\nSouth', 'northSouth', 'Kuzey/Güney'],
-            'lsUnitRate': ['LS/Unit Rate', 'lsUnitRate', 'LS-Unit-Rate', 'LS / Unit Rate'],
-        }
+        if metric == 'totalMH':
+            # Only positive TOTAL MH values count
+            measure = {'field': 'totalMH', 'agg': 'sum', 'positive': True}
+        else:
+            # KAR-ZARAR (Profit/Loss), same calculation as StatisticsChart:
+            # İşveren- Hakediş (USD) - General Total Cost (USD); records with neither are skipped
+            measure = {'field': 'karZarar', 'agg': 'sum'}
         
-        field_names = field_mapping.get(dimension, field_mapping['nameSurname'])
+        if not filters and dimension in ROLLUP_GRAIN:
+            trend = get_rollups().query([dimension], 'month', {'value': measure}, year=year, drop_empty=True)
+        else:
+            trend = aggregate(get_snapshot().frame, {'filters': filters, 'year': year, 'queries': {'trend': {
+                'dimensions': [dimension], 'bucket': 'month', 'measures': {'value': measure}, 'dropEmpty': True,
+            }}}, filter_aliases=DASHBOARD_FILTER_FIELDS)['trend']
         
-        # Aggregate data by dimension and month
+        # Convert to chart format (rows come sorted by dimension value, then month)
         dimension_data = {}
-        records_processed = 0
-        
-        for record in data:
-            # Get dimension value
-            dim_value = get_field_value(record, *field_names)
-            if not dim_value:
-                continue
-            
-            # Calculate metric value based on selected metric
-            if metric == 'totalMH':
-                # Get TOTAL MH value
-                value = get_numeric_value(record, 'TOTAL MH', 'TOTAL\n MH', 'Total MH')
-                if value is None or value <= 0:
-                    continue
-            else:
-                # Calculate KAR-ZARAR (Profit/Loss) from available fields
-                # Same calculation as StatisticsChart: İşveren- Hakediş (USD) - General Total Cost (USD)
-                actual_value = get_numeric_value(record, 'İşveren- Hakediş (USD)', 'İşveren- Hakediş')
-                cost = get_numeric_value(record, 'General Total Cost (USD)')
-                
-                # If both are None, skip the record
-                if actual_value is None and cost is None:
-                    continue
-                
-                # Treat None as 0 for the calculation
-                value = (actual_value if actual_value is not None else 0) - (cost if cost is not None else 0) 
-            
-            # Get date
-            date_value = get_field_value(record, '(Week / Month)', 'Date', 'date', 'Tarih', 'tarih')
-            
-            if not date_value:
-                continue
-            
-            # Parse date to get year and month
-            try:
-                import re
-                from datetime import datetime
-                date_str = str(date_value).strip()
-                
-                rec_year = None
-                rec_month = None
-                
-                # Try to parse date with various formats
-                # Format: "01/Sep/2023", "2025-11", "2025-W46", etc.
-                try:
-                    # Try parsing with datetime
-                    for fmt in ['%d/%b/%Y', '%d/%B/%Y', '%Y-%m-%d', '%Y/%m/%d', '%m/%d/%Y']:
-                        try:
-                            dt = datetime.strptime(date_str, fmt)
-                            rec_year = dt.year
-                            rec_month = dt.month
-                            break
-                        except ValueError:
-                            continue
-                except:
-                    pass
-                
-                # If datetime parsing failed, try regex
-                if not rec_year:
-                    year_match = re.search(r'(\d{4})', date_str)
-                    if year_match:
-                        rec_year = int(year_match.group(1))
-                        
-                        # Try to find month number
-                        month_match = re.search(r'[-/\s](\d{1,2})[-/\s]', date_str)
-                        if month_match:
-                            rec_month = int(month_match.group(1))
-                        else:
-                            # Try week format (W##) - convert to approximate month
-                            week_match = re.search(r'[Ww](\d{1,2})', date_str)
-                            if week_match:
-                                week_num = int(week_match.group(1))
-                                rec_month = min(12, max(1, (week_num * 12) // 52))
-                
-                if not rec_year or not rec_month or rec_month < 1 or rec_month > 12:
-                    continue
-                
-                # Apply year filter
-                if year and str(rec_year) != year:
-                    continue
-                
-                # Initialize dimension entry
-                if dim_value not in dimension_data:
-                    dimension_data[dim_value] = {}
-                
-                # Add to monthly totals
-                month_key = f"{rec_year}-{str(rec_month).zfill(2)}"
-                if month_key not in dimension_data[dim_value]:
-                    dimension_data[dim_value][month_key] = 0
-                
-                dimension_data[dim_value][month_key] += value
-                records_processed += 1
-                
-            except Exception as e:
-                print(f"[KAR-ZARAR TRENDS] Error parsing record: {e}")
-                continue
-        
-        print(f"[KAR-ZARAR TRENDS] Processed {records_processed} records with valid KAR-ZARAR data")
-        
-        # Convert to chart format
-        result = []
-        for dim_value, monthly_data in dimension_data.items():
-            if not monthly_data:
-                continue
-            sorted_months = sorted(monthly_data.keys())
-            result.append({
-                'name': dim_value,
-                'data': [{'month': month, 'value': monthly_data[month]} for month in sorted_months]
-            })
+        for row in trend:
+            dimension_data.setdefault(row[dimension], []).append({'month': row['period'], 'value': row['value']})
+        result = [{'name': name, 'data': monthly} for name, monthly in dimension_data.items()]
         
         # Sort by total KAR-ZARAR descending
         result.sort(key=lambda x: sum(d['value'] for d in x['data']), reverse=True)
         
-        print(f"[KAR-ZARAR TRENDS] Returning {len(result)} series for dimension: {dimension}")
+        print(f"[KAR-ZARAR TRENDS] Returning {len(result)} series for dimension: {dimension}, metric: {metric}")
         return jsonify({'data': result})
         
+    except (FilterError, AggregationError) as e:
+        return jsonify({'error': str(e)}), 400
+    except json.JSONDecodeError as e:
+        return jsonify({'error': f'Invalid JSON in query string: {e}'}), 400
     except Exception as e:
         print(f"[KAR-ZARAR TRENDS] Error: {e}")
         import traceback
@@ -5630,94 +6079,55 @@ def get_total_mh_pie():
     try:
         dimension = request.args.get('dimension', 'projects')
         year = request.args.get('year', '')
-        
-        records = DatabaseRecord.query.all()
-        if not records:
-            return jsonify({'data': []})
-        
-        data = [json.loads(r.data) for r in records]
-        
-        print(f"[TOTAL MH PIE] Processing {len(data)} records for dimension: {dimension}")
-        
-        # Helper function to get field value
-        def get_field_value(record, *possible_names):
-            for name in possible_names:
-                if name in record:
-                    val = record.get(name)
-                    if val and str(val).strip() not in ('', 'nan', 'None', 'NaT'):
-                        return str(val).strip()
-            return None
-        
-        # Helper to get numeric value
-        def get_numeric_value(record, *possible_names):
-            for name in possible_names:
-                if name in record:
-                    try:
-                        val = record[name]
-                        if val and str(val).strip() not in ('', 'nan', 'None', 'NaT'):
-                            return float(val)
-                    except (ValueError, TypeError):
-                        pass
-            return None
-        
-        # Map dimension to field names
-        field_mapping = {
-            'projects': ['Projects/Group'],
-            'company': ['Company', 'company', 'Firma', 'Şirket'],
-            'discipline': ['Discipline', 'discipline'],
-            'northSouth': ['North/South', 'North/ South', 'North/\nSouth', 'northSouth', 'Kuzey/Güney'],
-            'lsUnitRate': ['LS/Unit Rate', 'lsUnitRate', 'LS-Unit-Rate', 'LS / Unit Rate'],
-            'apcbSubcon': ['AP-CB / \nSubcon', 'AP-CB/Subcon', 'AP-CB / Subcon', 'AP-CB/\nSubcon', 'APCB/Subcon'],
-        }
-        
-        field_names = field_mapping.get(dimension, field_mapping['projects'])
-        
-        # Aggregate TOTAL MH by dimension
-        dimension_totals = {}
-        
-        for record in data:
-            # Get dimension value
-            dim_value = get_field_value(record, *field_names)
-            if not dim_value:
-                continue
-            
-            # Get TOTAL MH value
-            total_mh = get_numeric_value(record, 'TOTAL MH', 'TOTAL\n MH', 'Total MH')
-            if total_mh is None or total_mh <= 0:
-                continue
-            
-            # Apply year filter if specified
-            if year:
-                date_value = get_field_value(record, '(Week / Month)', 'Date', 'date', 'Tarih', 'tarih')
-                if date_value:
-                    import re
-                    year_match = re.search(r'(\d{4})', str(date_value))
-                    if year_match and year_match.group(1) != year:
-                        continue
-            
-            # Add to totals
-            if dim_value not in dimension_totals:
-                dimension_totals[dim_value] = 0
-            dimension_totals[dim_value] += total_mh
+        filters = json.loads(request.args.get('filters', '{}'))
+        
+        # The pie's "projects" slices are Projects/Group
+        dimension = {'projects': 'projectsGroup'}.get(dimension, dimension)
+        if dimension not in ('projectsGroup', 'company', 'discipline', 'northSouth', 'lsUnitRate', 'apcbSubcon'):
+            dimension = 'projectsGroup'
+
+        if approximate_requested() and not filters and not year:
+            # Top slices straight from the weighted sketch, with its error bound
+            sketch = get_sketches().top_weighted(dimension, limit=int(request.args.get('limit', 20)))
+            total = sketch['total']
+            data = [{
+                'name': item['value'],
+                'value': item['estimate'],
+                'low': item['low'],
+                'percentage': (item['estimate'] / total * 100) if total > 0 else 0,
+            } for item in sketch['items']]
+            return jsonify({'data': data, 'approximate': True, 'total': total,
+                            'errorBound': sketch['errorBound'], 'confidence': sketch['confidence']})
+        
+        # Aggregate positive TOTAL MH by dimension; with a year, records without a date still count
+        result = aggregate(get_snapshot().frame, {'filters': filters, 'year': year, 'queries': {'pie': {
+            'dimensions': [dimension], 'dropEmpty': True, 'keepUndated': True,
+            'measures': {'value': {'field': 'totalMH', 'agg': 'sum', 'positive': True}},
+        }}}, filter_aliases=DASHBOARD_FILTER_FIELDS)
         
         # Convert to list and calculate percentages
-        total_mh_sum = sum(dimension_totals.values())
+        rows = result['pie']
+        total_mh_sum = sum(row['value'] for row in rows)
         result = []
-        
-        for dim_value, mh_value in dimension_totals.items():
-            percentage = (mh_value / total_mh_sum * 100) if total_mh_sum > 0 else 0
+
+        for row in rows:
+            percentage = (row['value'] / total_mh_sum * 100) if total_mh_sum > 0 else 0
             result.append({
-                'name': dim_value,
-                'value': mh_value,
+                'name': row[dimension],
+                'value': row['value'],
                 'percentage': percentage
             })
-        
+
         # Sort by value descending
         result.sort(key=lambda x: x['value'], reverse=True)
-        
+
         print(f"[TOTAL MH PIE] Returning {len(result)} items for dimension: {dimension}")
         return jsonify({'data': result})
         
+    except (FilterError, AggregationError) as e:
+        return jsonify({'error': str(e)}), 400
+    except json.JSONDecodeError as e:
+        return jsonify({'error': f'Invalid JSON in query string: {e}'}), 400
     except Exception as e:
         print(f"[TOTAL MH PIE] Error: {e}")
         import traceback
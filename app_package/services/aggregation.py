@@ -0,0 +1,340 @@
+"""Dashboard aggregations: group-by dimensions, time buckets and measures in one pass.
+
+An aggregation spec names one or more queries that share the same filtered
+rows::
+
+    {"filters": {"company": ["AP-CB"]},                 # dashboard filter spec
+     "year": 2025,                                      # optional period window
+     "queries": {
+         "trend": {"dimensions": ["discipline"], "bucket": "month",
+                   "measures": {"mh": {"field": "totalMH", "agg": "sum"}}},
+         "share": {"dimensions": ["company"],
+                   "measures": {"mh": {"field": "totalMH", "agg": "sum", "positive": true},
+                                "rows": {"field": "records", "agg": "count"}}}}}
+
+Dimension aliases, numeric coercion and date parsing are resolved once per
+request over distinct values, so every query is a group-by over small integer
+codes. ``aggregate`` returns ``{query name: [row dicts]}`` with one key per
+dimension, ``period`` for the bucket and one key per measure.
+
+Record dates are read by one parser for every endpoint (DATE_PARSER: the
+day-first and ISO formats the dashboards used, plus week and month strings).
+A year/month window drops rows without a date unless the query sets
+``keepUndated``.
+"""
+import re
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from app_package.services.dates import DateParser, broadcast
+from app_package.services.filters import apply_filters, value_text
+
+
+class AggregationError(ValueError):
+    """Raised for an invalid aggregation spec"""
+
+
+# Dashboard dimension keys and the record columns each may be stored under (first non-blank wins)
+DIMENSIONS = {
+    'nameSurname': ['Name Surname', 'nameSurname', 'Name-Surname'],
+    'discipline': ['Discipline', 'discipline'],
+    'company': ['Company', 'company', 'Firma', 'Şirket'],
+    'projectsGroup': ['Projects/Group', 'projectsGroup', 'Projects-Group'],
+    'scope': ['Scope', 'scope'],
+    'projects': ['Projects', 'projects'],
+    'nationality': ['Nationality', 'nationality'],
+    'status': ['Status', 'status'],
+    'northSouth': ['North/South', 'North/ South', 'North/\nSouth', 'northSouth', 'Kuzey/Güney'],
+    'lsUnitRate': ['LS/Unit Rate', 'lsUnitRate', 'LS-Unit-Rate', 'LS / Unit Rate'],
+    'apcbSubcon': ['AP-CB / \nSubcon', 'AP-CB/Subcon', 'AP-CB / Subcon', 'AP-CB/\nSubcon', 'APCB/Subcon'],
+}
+
+# Numeric measure fields. Also available: karZarar (hakedis - cost, missing when both are)
+# and records (1 per row, for counts)
+MEASURE_FIELDS = {
+    'totalMH': ['TOTAL MH', 'TOTAL\n MH', 'Total MH', 'totalMH'],
+    'cost': ['General Total Cost (USD)'],
+    'hakedis': ['İşveren- Hakediş (USD)', 'İşveren- Hakediş'],
+    'recordedKarZarar': ['KAR-ZARAR'],
+}
+
+DATE_FIELDS = ['(Week / Month)', 'Week / Month', 'Tarih', 'Date', 'date', 'tarih']
+
+BUCKETS = ('week', 'month', 'quarter', 'year')
+_PANDAS_AGGREGATES = {'sum': 'sum', 'count': 'count', 'avg': 'mean', 'min': 'min', 'max': 'max', 'first': 'first'}
+AGGREGATES = tuple(_PANDAS_AGGREGATES)
+
+_DATE_FORMATS = ('%Y-%m-%d', '%d.%m.%Y', '%Y/%m/%d', '%d/%m/%Y', '%d/%b/%Y', '%d/%B/%Y',
+                 '%m/%d/%Y', '%d-%m-%Y', '%Y-%m-%d %H:%M:%S')
+
+
+def _parse_partial_date(text):
+    """Week and month strings without a day (2025-W36, 2025-09, 09/2025 ...); None if unparseable"""
+    year_match = re.search(r'(\d{4})', text)
+    if year_match:
+        year = int(year_match.group(1))
+        week_match = re.search(r'[Ww](\d{1,2})', text)
+        if week_match and 1 <= int(week_match.group(1)) <= 53:
+            try:
+                return datetime.fromisocalendar(year, int(week_match.group(1)), 1)
+            except ValueError:
+                pass
+        month_match = re.search(r'(?:^|[-/\s])(\d{1,2})(?:[-/\s]|$)', text.replace(year_match.group(1), ' '))
+        if month_match and 1 <= int(month_match.group(1)) <= 12:
+            return datetime(year, int(month_match.group(1)), 1)
+    try:
+        parsed = pd.to_datetime(text)
+        return None if pd.isna(parsed) else parsed.to_pydatetime()
+    except (ValueError, TypeError, OverflowError):
+        return None
+
+
+# Each format on the whole text, then on its first 19 and 10 characters, then the partial forms
+DATE_PARSER = DateParser(_DATE_FORMATS, lengths=(None, 19, 10), fallback=_parse_partial_date, strptime=True)
+
+
+def parse_date(text):
+    """Parse one dashboard date string (01/Sep/2025, 2025-09-01, 2025-W36, 2025-09 ...); None if unparseable"""
+    return DATE_PARSER.parse(text)
+
+
+def bucket_label(date, bucket):
+    """Period label of a date: 2025-W09, 2025-03, 2025-Q1 or 2025"""
+    if bucket == 'week':
+        year, week, _ = date.isocalendar()
+        return f'{year}-W{week:02d}'
+    if bucket == 'month':
+        return f'{date.year}-{date.month:02d}'
+    if bucket == 'quarter':
+        return f'{date.year}-Q{(date.month - 1) // 3 + 1}'
+    return str(date.year)
+
+
+def _blank(value):
+    return value is None or (isinstance(value, float) and np.isnan(value)) or str(value).strip() in ('', 'nan', 'None', 'NaT')
+
+
+def _coalesce_text(df, columns):
+    """Trimmed text of the first alias column holding a non-blank value; None where all are blank"""
+    result = None
+    for col in columns:
+        if col not in df.columns:
+            continue
+        codes, uniques = pd.factorize(df[col], use_na_sentinel=True)
+        values = np.append(np.asarray(uniques, dtype=object), None)
+        texts = np.array([None if _blank(v) else value_text(v).strip() for v in values], dtype=object)
+        column = texts[codes]
+        result = column if result is None else np.where(pd.isna(result), column, result)
+    return result
+
+
+class _Prepared:
+    """Per-request cache of resolved dimensions, measure values and parsed dates"""
+
+    def __init__(self, df):
+        self.df = df
+        self._dimensions = {}
+        self._numbers = {}
+        self._dates = None
+
+    def dimension(self, name):
+        """(codes, labels) of a dimension key or raw column name; code -1 marks blank rows"""
+        if name not in self._dimensions:
+            text = _coalesce_text(self.df, DIMENSIONS.get(name, [name]))
+            if text is None:
+                codes, labels = np.full(len(self.df), -1), np.array([], dtype=object)
+            else:
+                codes, labels = pd.factorize(pd.Series(text, dtype=object), use_na_sentinel=True)
+            self._dimensions[name] = (codes, np.asarray(labels, dtype=object))
+        return self._dimensions[name]
+
+    def numbers(self, field):
+        """Float values of a measure field (NaN where missing or not numeric)"""
+        if field not in self._numbers:
+            if field == 'records':
+                values = np.ones(len(self.df))
+            elif field == 'karZarar':
+                hakedis, cost = self.numbers('hakedis'), self.numbers('cost')
+                values = np.nan_to_num(hakedis) - np.nan_to_num(cost)
+                values[np.isnan(hakedis) & np.isnan(cost)] = np.nan
+            else:
+                values = np.full(len(self.df), np.nan)
+                for col in MEASURE_FIELDS.get(field, [field]):
+                    if col in self.df.columns:
+                        column = pd.to_numeric(self.df[col], errors='coerce').to_numpy(dtype=float)
+                        values = np.where(np.isnan(values), column, values)
+            self._numbers[field] = values
+        return self._numbers[field]
+
+    def dates(self):
+        """(codes, distinct datetimes) of the record date; code -1 marks rows without a date"""
+        if self._dates is None:
+            text = _coalesce_text(self.df, DATE_FIELDS)
+            if text is None:
+                self._dates = (np.full(len(self.df), -1), [])
+            else:
+                codes, uniques = pd.factorize(pd.Series(text, dtype=object), use_na_sentinel=True)
+                parsed = DATE_PARSER.parse_many(uniques)
+                valid = np.array([d is not None for d in parsed] + [False])
+                self._dates = (np.where(valid[codes], codes, -1), parsed)
+        return self._dates
+
+    def period_mask(self, year=None, month=None, keep_undated=False):
+        """Rows whose date falls in the given year and/or month (1-12); with keep_undated also rows without a date"""
+        codes, dates = self.dates()
+        keep = np.array([d is not None and (year is None or d.year == year) and (month is None or d.month == month)
+                         for d in dates] + [keep_undated], dtype=bool)
+        return keep[codes]
+
+    def bucket(self, bucket):
+        """(codes, labels) of the time bucket of every row"""
+        key = ('bucket', bucket)
+        if key not in self._dimensions:
+            codes, dates = self.dates()
+            labels = [bucket_label(d, bucket) if d is not None else None for d in dates]
+            label_codes, uniques = pd.factorize(pd.Series(labels + [None], dtype=object), use_na_sentinel=True)
+            self._dimensions[key] = (label_codes[codes], np.asarray(uniques, dtype=object))
+        return self._dimensions[key]
+
+
+def parse_period(value, name, low, high):
+    """Integer year/month from a request value; None when empty"""
+    if value in (None, ''):
+        return None
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise AggregationError(f'"{name}" must be an integer')
+    if not low <= number <= high:
+        raise AggregationError(f'"{name}" must be between {low} and {high}')
+    return number
+
+
+def _parse_dimension(spec):
+    if isinstance(spec, str):
+        return spec, spec, None
+    if isinstance(spec, dict) and spec.get('field'):
+        return spec.get('as', spec['field']), spec['field'], spec.get('default')
+    raise AggregationError(f'Invalid dimension: {spec!r}')
+
+
+def _parse_measure(name, spec):
+    if not isinstance(spec, dict) or not spec.get('field'):
+        raise AggregationError(f'Measure "{name}" needs a field')
+    agg = spec.get('agg', 'sum')
+    if agg not in AGGREGATES:
+        raise AggregationError(f'Measure "{name}": unknown aggregation "{agg}"')
+    return spec['field'], agg, bool(spec.get('positive'))
+
+
+def _run_query(prepared, query, defaults, filter_aliases):
+    """Evaluate one query over the prepared rows"""
+    if not isinstance(query, dict):
+        raise AggregationError('Each query must be an object')
+    dimensions = [_parse_dimension(d) for d in query.get('dimensions', [])]
+    measures = {name: _parse_measure(name, spec) for name, spec in (query.get('measures') or {}).items()}
+    if not measures:
+        raise AggregationError('Each query needs at least one measure')
+    bucket = query.get('bucket')
+    if bucket is not None and bucket not in BUCKETS:
+        raise AggregationError(f'Unknown bucket "{bucket}"; use one of {", ".join(BUCKETS)}')
+
+    keep = np.ones(len(prepared.df), dtype=bool)
+    if query.get('filters'):
+        # prepared.df has a RangeIndex, so the index of the filtered rows is their position
+        filtered = apply_filters(prepared.df, query['filters'], aliases=filter_aliases, loose=True)
+        keep[:] = False
+        keep[filtered.index.to_numpy()] = True
+    year = parse_period(query.get('year', defaults['year']), 'year', 1900, 2999)
+    month = parse_period(query.get('month', defaults['month']), 'month', 1, 12)
+    if year is not None or month is not None:
+        keep &= prepared.period_mask(year, month, keep_undated=bool(query.get('keepUndated')))
+
+    keys, labels = {}, {}
+    for out_name, field, default in dimensions:
+        codes, values = prepared.dimension(field)
+        if default is not None:
+            values = np.append(values, default)
+            codes = np.where(codes < 0, len(values) - 1, codes)
+        keys[out_name], labels[out_name] = codes, values
+    if bucket:
+        keys['period'], labels['period'] = prepared.bucket(bucket)
+    for codes in keys.values():
+        keep &= codes >= 0
+
+    positions = np.flatnonzero(keep)
+    frame = pd.DataFrame({name: codes[positions] for name, codes in keys.items()})
+    for name, (field, agg, positive) in measures.items():
+        if agg == 'first':
+            codes, values = prepared.dimension(field)
+            frame[name] = pd.Series(np.append(values, None)[codes[positions]], dtype=object)
+        else:
+            values = prepared.numbers(field)[positions]
+            if positive:
+                values = np.where(values > 0, values, np.nan)
+            frame[name] = values
+
+    # Totals without dimensions are a single group
+    group_keys = list(keys) or ['_all']
+    if not keys:
+        frame['_all'] = 0
+    grouped = frame.groupby(group_keys, sort=False)
+    result = grouped.agg({name: _PANDAS_AGGREGATES[agg] for name, (_, agg, _) in measures.items()}).reset_index()
+    counts = grouped[list(measures)].count().to_numpy()
+    if not keys and result.empty:
+        result = pd.DataFrame([{name: 0 if agg in ('sum', 'count') else None
+                                for name, (_, agg, _) in measures.items()}])
+        counts = np.zeros((1, len(measures)))
+    if query.get('dropEmpty'):
+        # Groups where no measure had a usable value
+        result = result[(counts > 0).any(axis=1)]
+
+    rows_out = []
+    for record in result.to_dict('records'):
+        row = {}
+        for name in keys:
+            row[name] = labels[name][int(record[name])]
+        for name, (_, agg, _) in measures.items():
+            value = record[name]
+            if agg == 'count':
+                value = int(value)
+            elif agg != 'first':
+                value = None if pd.isna(value) else float(value)
+            row[name] = value
+        rows_out.append(row)
+    rows_out.sort(key=lambda r: tuple(str(r[name]) for name in keys))
+    return rows_out
+
+
+def dimension_values(df, name):
+    """Per-row label of a dimension key or raw column (None where blank); None if no alias column exists"""
+    return _coalesce_text(df, DIMENSIONS.get(name, [name]))
+
+
+def measure_values(df, field):
+    """Per-row float values of a measure field (NaN where missing)"""
+    return _Prepared(df).numbers(field)
+
+
+def date_values(df):
+    """Per-row record date as datetime64 (NaT where missing or unparseable)"""
+    codes, dates = _Prepared(df).dates()
+    return broadcast(codes, dates)
+
+
+def aggregate(df, spec, filter_aliases=None):
+    """Evaluate every query of an aggregation spec over df; returns {query name: [rows]}"""
+    if not isinstance(spec, dict):
+        raise AggregationError('Aggregation spec must be an object')
+    queries = spec.get('queries')
+    if not isinstance(queries, dict) or not queries:
+        raise AggregationError('"queries" must map names to query objects')
+
+    df = df.reset_index(drop=True)
+    if spec.get('filters'):
+        df = apply_filters(df, spec['filters'], aliases=filter_aliases, loose=True).reset_index(drop=True)
+    prepared = _Prepared(df)
+    defaults = {'year': spec.get('year'), 'month': spec.get('month')}
+    return {name: _run_query(prepared, query, defaults, filter_aliases) for name, query in queries.items()}
@@ -0,0 +1,178 @@
+"""Group-by and pivot queries, run on DuckDB when it is installed and on pandas otherwise.
+
+DuckDB scans the (already filtered) DataFrame in place, vectorized and on all
+cores, so the pivot and chart configs are translated into GROUP BY queries and
+only the small aggregated result comes back to pandas. Any query DuckDB
+rejects (mixed-type object columns, unsupported aggregations) is re-run with
+pandas, which stays the reference implementation.
+"""
+import os
+import threading
+
+import pandas as pd
+
+from app_package.services.numeric import parse_series
+
+try:
+    import duckdb
+except ImportError:  # optional dependency
+    duckdb = None
+
+
+# Pivot/chart aggregation names mapped to DuckDB aggregate functions
+_SQL_AGGREGATES = {
+    'sum': 'SUM({})',
+    'mean': 'AVG({})',
+    'avg': 'AVG({})',
+    'count': 'COUNT({})',
+    'min': 'MIN({})',
+    'max': 'MAX({})',
+    'median': 'MEDIAN({})',
+    'std': 'STDDEV_SAMP({})',
+    'var': 'VAR_SAMP({})',
+    'nunique': 'COUNT(DISTINCT {})',
+}
+
+_PANDAS_AGGREGATES = {'avg': 'mean'}
+
+_settings = {'engine': os.environ.get('ANALYTICS_ENGINE', 'auto')}
+_local = threading.local()
+_connection = None
+_connection_lock = threading.Lock()
+
+
+def configure_engine(engine):
+    """Select 'auto' (DuckDB if installed), 'duckdb' or 'pandas'"""
+    if engine not in ('auto', 'duckdb', 'pandas'):
+        raise ValueError(f'Unknown analytics engine "{engine}"')
+    _settings['engine'] = engine
+
+
+def active_engine():
+    if _settings['engine'] == 'pandas' or duckdb is None:
+        return 'pandas'
+    return 'duckdb'
+
+
+def _cursor():
+    """Per-thread DuckDB cursor sharing one in-process database"""
+    global _connection
+    cursor = getattr(_local, 'cursor', None)
+    if cursor is None:
+        with _connection_lock:
+            if _connection is None:
+                _connection = duckdb.connect(database=':memory:')
+        cursor = _connection.cursor()
+        _local.cursor = cursor
+    return cursor
+
+
+def _quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _numeric_sql(df, col, clean):
+    """SQL expression turning a column into DOUBLE; clean strips currency symbols like create_pivot does"""
+    if pd.api.types.is_numeric_dtype(df[col]) and not pd.api.types.is_bool_dtype(df[col]):
+        return f"CAST({_quote(col)} AS DOUBLE)"
+    text = f"CAST({_quote(col)} AS VARCHAR)"
+    if clean:
+        text = (f"regexp_replace(regexp_replace(regexp_replace({text}, '[$,£€¥]', '', 'g'), "
+                f"'\\b(USD|TRY|EUR|TL)\\b', '', 'gi'), '[^0-9.\\-]', '', 'g')")
+    return f"TRY_CAST({text} AS DOUBLE)"
+
+
+def _query(df, sql):
+    cursor = _cursor()
+    cursor.register('snapshot', df)
+    try:
+        return cursor.execute(sql).df()
+    finally:
+        cursor.unregister('snapshot')
+
+
+def _group_sql(df, by, values, agg, clean, dropna=True):
+    aggregate = _SQL_AGGREGATES[agg]
+    keys = ', '.join(_quote(col) for col in by)
+    measures = ', '.join(f"{aggregate.format(_numeric_sql(df, col, clean))} AS {_quote(col)}" for col in values)
+    where = ' AND '.join(f"{_quote(col)} IS NOT NULL" for col in by) if dropna else ''
+    return (f"SELECT {keys}, {measures} FROM snapshot"
+            f"{' WHERE ' + where if where else ''} GROUP BY {keys} ORDER BY {keys}")
+
+
+def _pandas_numeric(df, values, clean):
+    df = df.copy()
+    for col in values:
+        series = df[col]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            series = series.astype(object)
+        if clean:
+            df[col] = parse_series(series)[0]
+        else:
+            df[col] = pd.to_numeric(series, errors='coerce')
+    return df
+
+
+def _aggregate_sql(df, by, values, agg, clean):
+    frame = df[by + [c for c in values if c not in by]]
+    result = _query(frame, _group_sql(frame, by, values, agg, clean))
+    if agg in ('sum', 'count', 'nunique'):
+        # pandas sums of all-NaN groups are 0, SQL gives NULL
+        result[values] = result[values].fillna(0)
+    return result
+
+
+def group_aggregate(df, by, values, agg='sum', clean=False):
+    """Aggregate value columns grouped by key columns, like df.groupby(by, as_index=False)[values].agg(agg).
+
+    Value columns are coerced to numbers first (clean=True also strips currency
+    symbols and words). Returns a DataFrame sorted by the group keys.
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    values = [values] if isinstance(values, str) else list(values)
+    if active_engine() == 'duckdb' and agg in _SQL_AGGREGATES:
+        try:
+            return _aggregate_sql(df, by, values, agg, clean)
+        except Exception as e:
+            print(f"[ANALYTICS] DuckDB group-by failed, falling back to pandas: {e}")
+    numeric = _pandas_numeric(df[by + [c for c in values if c not in by]], values, clean)
+    return numeric.groupby(by, as_index=False, observed=True)[values].agg(_PANDAS_AGGREGATES.get(agg, agg))
+
+
+def pivot_table(df, index, values, columns=None, agg='sum', clean=False, fill_value=0):
+    """Equivalent of pd.pivot_table(...).reset_index() with numeric coercion of the value columns.
+
+    values may be a column name (columns are the pivoted values) or a list
+    (columns are (value, pivoted value) pairs), mirroring pandas.
+    """
+    value_list = [values] if isinstance(values, str) else list(values)
+    index_list = [index] if isinstance(index, str) else list(index)
+    by = index_list + ([columns] if columns else [])
+    if active_engine() == 'duckdb' and agg in _SQL_AGGREGATES:
+        try:
+            long = _aggregate_sql(df, by, value_list, agg, clean)
+            if columns:
+                wide = long.pivot(index=index_list, columns=columns, values=values)
+            else:
+                wide = long.set_index(index_list)[values]
+                if isinstance(wide, pd.Series):
+                    wide = wide.to_frame()
+            if not isinstance(values, str):
+                # pivot_table orders the value columns by name
+                wide = wide.sort_index(axis=1)
+            # pivot_table drops rows and columns with no data at all
+            wide = wide.dropna(how='all').dropna(axis=1, how='all')
+            return wide.fillna(fill_value).sort_index().reset_index()
+        except Exception as e:
+            print(f"[ANALYTICS] DuckDB pivot failed, falling back to pandas: {e}")
+    numeric = _pandas_numeric(df, value_list, clean)
+    pivot = pd.pivot_table(
+        numeric,
+        values=values,
+        index=index,
+        columns=columns if columns else None,
+        aggfunc=_PANDAS_AGGREGATES.get(agg, agg),
+        fill_value=fill_value,
+        observed=True,
+    )
+    return pivot.reset_index()
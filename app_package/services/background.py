@@ -0,0 +1,112 @@
+"""Background work off the request thread."""
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class RefreshWorker:
+    """Runs job() on a background thread.
+
+    Calls to schedule() while the job is running coalesce into a single
+    follow-up run, so a burst of writes costs at most one extra refresh.
+    """
+
+    def __init__(self, job, name='refresh'):
+        self._job = job
+        self._name = name
+        self._lock = threading.Lock()
+        self._running = False
+        self._pending = False
+
+    def schedule(self):
+        with self._lock:
+            if self._running:
+                self._pending = True
+                return
+            self._running = True
+        threading.Thread(target=self._run, name=self._name, daemon=True).start()
+
+    def _run(self):
+        while True:
+            try:
+                self._job()
+            except Exception as e:
+                print(f"[{self._name.upper()}] Background job failed: {e}")
+            with self._lock:
+                if not self._pending:
+                    self._running = False
+                    return
+                self._pending = False
+
+
+class ProgressJobs:
+    """Worker pool for long jobs that report their progress.
+
+    submit() returns a queued job at once. work(progress, *args) runs on a
+    pool thread, may call progress(done, total) as it goes, and returns a dict
+    merged into the finished job; an exception fails the job with its message
+    (and its total, if never reported, set to what it got done).
+    Jobs are visible only within the scope that submitted them and are
+    dropped ttl seconds after they finish.
+    """
+
+    def __init__(self, work, workers=1, ttl=3600, name='job'):
+        self._work = work
+        self._name = name
+        self.ttl = ttl
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job['finished'] is not None and job['finished'] < cutoff]:
+            del self._jobs[job_id]
+
+    def submit(self, scope, *args):
+        with self._lock:
+            self._expire()
+            job = {
+                'id': uuid.uuid4().hex,
+                'scope': scope,
+                'status': 'queued',
+                'error': None,
+                'done': 0,
+                'total': None,
+                'result': None,
+                'created': time.time(),
+                'finished': None,
+            }
+            self._jobs[job['id']] = job
+        self._pool.submit(self._run, job['id'], args)
+        return dict(job)
+
+    def _update(self, job_id, **changes):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(changes)
+
+    def _run(self, job_id, args):
+        self._update(job_id, status='running')
+        try:
+            result = self._work(lambda done, total=None: self._update(job_id, done=done, total=total), *args)
+            self._update(job_id, status='done', result=result, finished=time.time())
+        except Exception as e:
+            print(f"[{self._name.upper()}] Job {job_id} failed: {e}")
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is not None:
+                    # A job that failed before it knew its size reports what it got through
+                    job.update(status='failed', error=str(e), finished=time.time(),
+                               total=job['total'] if job['total'] is not None else job['done'])
+
+    def get(self, job_id, scope):
+        """The job, or None when unknown, expired or submitted in another scope"""
+        with self._lock:
+            self._expire()
+            job = self._jobs.get(job_id)
+            if job is None or job['scope'] != scope:
+                return None
+            return dict(job)
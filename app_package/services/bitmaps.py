@@ -0,0 +1,148 @@
+"""Bitmap inverted indexes over the dataset snapshot for cascading filter options.
+
+For each indexed field the index keeps the field's distinct values, as the
+option lists show them, and per value a bitmap of the rows holding it, packed
+eight rows to a byte. A selection ORs the bitmaps of the values chosen for a
+field and ANDs the fields; the options still available for a field are the
+values whose bitmap intersects the selection. Both are bitwise passes over
+rows / 8 bytes per value instead of string work over every row.
+
+Fields are indexed on first use and kept with the index, which belongs to one
+dataset version. Fields with more than ``MAX_VALUES`` distinct values keep
+only per-row value codes, which answer the same questions with a scan.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+from app_package.services.filters import value_text
+
+
+# Distinct values above which a field keeps codes instead of one bitmap per value
+MAX_VALUES = 512
+
+# Cell texts the loose (dashboard) filters treat as "no value"
+_BLANK_STRINGS = ('', 'nan', 'None', 'NaT')
+
+
+class FieldIndex:
+    """Sorted labels of one field plus a bitmap (or a code) per row"""
+
+    def __init__(self, labels, codes, rows):
+        self.labels = labels
+        self.codes = codes
+        self.rows = rows
+        self._position = {label: i for i, label in enumerate(labels)}
+        self.bitmaps = None
+        if len(labels) <= MAX_VALUES:
+            self.bitmaps = np.array([np.packbits(codes == i) for i in range(len(labels))], dtype=np.uint8)
+            # Explicit width: a field without labels has no bitmaps to infer it from
+            self.bitmaps = self.bitmaps.reshape(len(labels), (rows + 7) // 8)
+        # Rows without a value
+        self.blank = np.packbits(codes < 0)
+
+    def select(self, positions):
+        """Bitmap of the rows holding any of the labels at positions"""
+        positions = list(positions)
+        if self.bitmaps is not None:
+            if not positions:
+                return np.zeros(self.bitmaps.shape[1], dtype=np.uint8)
+            return np.bitwise_or.reduce(self.bitmaps[positions], axis=0)
+        return np.packbits(np.isin(self.codes, positions))
+
+    def positions(self, labels):
+        return [self._position[label] for label in labels if label in self._position]
+
+    def options(self, selection):
+        """Labels held by at least one selected row, sorted"""
+        if self.bitmaps is not None:
+            hit = (self.bitmaps & selection).any(axis=1)
+            return [label for label, keep in zip(self.labels, hit) if keep]
+        rows = np.unpackbits(selection, count=self.rows).astype(bool)
+        present = np.unique(self.codes[rows])
+        return [self.labels[i] for i in present[present >= 0]]
+
+
+def _field_series(frame, columns):
+    """Values of the first column present, missing values filled from the later ones"""
+    present = [col for col in columns if col in frame.columns]
+    if not present:
+        return None
+    series = frame[present[0]]
+    if len(present) > 1:
+        series = series.astype(object)
+        for col in present[1:]:
+            series = series.where(series.notna(), frame[col])
+    return series
+
+
+class BitmapIndex:
+    """Bitmap indexes of one dataset version's frame, one per field, built on first use"""
+
+    def __init__(self, frame, version):
+        self.frame = frame
+        self.version = version
+        self.rows = len(frame)
+        self._fields = {}
+        self._lock = threading.Lock()
+
+    def field(self, columns, loose=False):
+        """FieldIndex over the first of columns present (None if none is).
+
+        Labels are the cell texts; loose labels are trimmed and treat the
+        dashboards' blank strings as missing.
+        """
+        key = (tuple(columns), loose)
+        if key not in self._fields:
+            with self._lock:
+                if key not in self._fields:
+                    self._fields[key] = self._build(columns, loose)
+        return self._fields[key]
+
+    def _build(self, columns, loose):
+        series = _field_series(self.frame, columns)
+        if series is None:
+            return None
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        texts = [value_text(value) for value in uniques]
+        if loose:
+            texts = [None if text.strip() in _BLANK_STRINGS else text.strip() for text in texts]
+        labels = sorted({text for text in texts if text is not None})
+        position = {label: i for i, label in enumerate(labels)}
+        # Distinct values that render alike share a label; -1 for missing values
+        remap = np.array([position[text] if text is not None else -1 for text in texts] + [-1], dtype=np.int32)
+        return FieldIndex(labels, remap[codes], self.rows)
+
+    def pack(self, mask):
+        return np.packbits(np.asarray(mask, dtype=bool))
+
+    def everything(self):
+        return np.packbits(np.ones(self.rows, dtype=bool))
+
+    def selection(self, spec, aliases=None, loose=False):
+        """Bitmap of the rows a filter spec selects, or None if the spec is more than value lists.
+
+        Matches apply_filters(frame, spec, aliases, loose) for specs that map
+        keys to lists (or single values); loose selections also keep the rows
+        without a value, like the dashboard filters.
+        """
+        selection = self.everything()
+        for key, values in (spec or {}).items():
+            if values in (None, '', [], {}):
+                continue
+            if isinstance(values, dict):
+                return None
+            if not isinstance(values, (list, tuple)):
+                values = [values]
+            field = self.field((aliases or {}).get(key) or [key], loose)
+            if field is None:
+                # Like the predicates, a filter on a field the data lacks keeps every row
+                continue
+            if loose:
+                wanted = {value_text(v).strip().upper() for v in values if v not in (None, '')}
+                positions = [i for i, label in enumerate(field.labels) if label.upper() in wanted]
+                selection &= field.select(positions) | field.blank
+            else:
+                selection &= field.select(field.positions(value_text(v) for v in values))
+        return selection
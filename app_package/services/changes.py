@@ -0,0 +1,59 @@
+"""Delta sync over the record change log.
+
+Every insert, update and delete of a record appends a change with the next
+version number, and clearing the table appends a single reset. A client that
+holds the records as of version v asks for the changes after v: each record
+changed since then is sent once, as its latest row or as a deletion, so the
+payload grows with the number of records touched rather than with the
+table. Clients that are too far behind (from before a reset or the oldest
+retained change, or with more changed records than a delta is worth) get
+the full set of records instead.
+
+Versions are assigned when a change is flushed but become visible when it
+commits, so writers hold LOCK_KEY from then until their commit: versions
+commit in order, and the highest visible version has no earlier one still
+in flight. (SQLite serializes write transactions by itself.)
+"""
+
+
+class ChangeLogError(ValueError):
+    """Raised for an invalid since parameter"""
+
+
+INSERT = 'insert'
+UPDATE = 'update'
+DELETE = 'delete'
+RESET = 'reset'
+
+# Changed records above which a full reload is sent instead of a delta
+MAX_DELTA_RECORDS = 5000
+
+# PostgreSQL advisory lock serializing change log writers up to their commit
+LOCK_KEY = 0x6368616E67656C6F
+
+
+def parse_since(value):
+    """Version a client has synced to; 0 (or missing) means it holds nothing"""
+    if value is None or value == '':
+        return 0
+    try:
+        since = int(value)
+    except (TypeError, ValueError):
+        raise ChangeLogError(f'Invalid since version "{value}"; expected a non-negative integer')
+    if since < 0:
+        raise ChangeLogError(f'Invalid since version "{value}"; expected a non-negative integer')
+    return since
+
+
+def collapse(changes):
+    """(changed record ids, deleted record ids) of [(record_id, operation)] in version order.
+
+    Only each record's last operation counts: a record inserted then deleted
+    is a deletion, one deleted and re-inserted with the same id a change.
+    """
+    last = {}
+    for record_id, operation in changes:
+        last[record_id] = operation
+    changed = sorted(record_id for record_id, operation in last.items() if operation != DELETE)
+    deleted = sorted(record_id for record_id, operation in last.items() if operation == DELETE)
+    return changed, deleted
@@ -0,0 +1,214 @@
+"""Aggregated chart series for the frontend chart libraries.
+
+/api/chart returns a complete Plotly figure, template and layout included,
+and box and histogram charts carry every raw point. /api/chart-data returns
+only the series arrays (``{name, x, y}`` per color value), aggregated the way
+the Plotly charts aggregate them, so payloads stay small whatever the row
+count:
+
+* line series longer than ``max_points`` are downsampled with
+  Largest-Triangle-Three-Buckets (Steinarsson, 2013), which keeps the points
+  that give the line its shape;
+* box plots come as quartiles, whiskers (most extreme values within 1.5 IQR)
+  and a capped sample of outliers per box;
+* numeric histograms come binned, categorical ones summed per value.
+"""
+import numpy as np
+import pandas as pd
+
+from app_package.services.aggregation import DATE_PARSER
+from app_package.services.analytics import group_aggregate
+from app_package.services.filters import value_text
+
+
+class ChartDataError(ValueError):
+    """Raised for a chart request that cannot be answered"""
+
+
+CHART_TYPES = ('bar', 'line', 'scatter', 'pie', 'box', 'histogram')
+
+# Default and largest number of points per line series
+MAX_POINTS = 1000
+MAX_POINTS_LIMIT = 20000
+
+# Outlier values sent per box (the farthest from the median)
+MAX_OUTLIERS = 50
+
+# Charts per /api/charts/batch request, and threads building them
+MAX_BATCH_CHARTS = 50
+BATCH_WORKERS = 4
+
+HISTOGRAM_BINS = 30
+PIE_SLICES = 10
+
+
+def lttb(x, y, threshold):
+    """Indices of the threshold points Largest-Triangle-Three-Buckets keeps (all when fewer)"""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    every = (n - 2) / (threshold - 2)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        # Average of the next bucket (the last point after the final bucket)
+        next_end = min(int((i + 2) * every) + 1, n)
+        if end < next_end:
+            avg_x, avg_y = x[end:next_end].mean(), y[end:next_end].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+        # Point of this bucket forming the largest triangle with the last kept point and that average
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def _values(series):
+    """JSON-ready list of x or label values"""
+    values = series.to_numpy()
+    if values.dtype.kind == 'f':
+        return [None if np.isnan(v) else float(v) for v in values]
+    return values.tolist()
+
+
+def _groups(df, color_col):
+    """(series name, rows) per color value, or one unnamed series"""
+    if not color_col:
+        return [(None, df)]
+    return [(value_text(key), rows) for key, rows in df.groupby(color_col, sort=True, observed=True)]
+
+
+def _aggregated(df, x_col, y_col, color_col):
+    by = [x_col, color_col] if color_col else [x_col]
+    return group_aggregate(df, by, y_col)
+
+
+def _dates(values):
+    """Parsed date per x value (NaT where unparseable), or None when no value is a date"""
+    dates = DATE_PARSER.datetimes(values)
+    if pd.isna(dates).all():
+        return None
+    return pd.Series(dates, index=values.index)
+
+
+def _line_series(agg, x_col, y_col, color_col, max_points):
+    series = []
+    for name, rows in _groups(agg, color_col):
+        dates = _dates(rows[x_col])
+        if dates is not None:
+            # Dates in date order, anything unparseable after them
+            rows = rows.assign(_date=dates).sort_values(['_date', x_col], na_position='last')
+        else:
+            rows = rows.sort_values(x_col)
+        y = rows[y_col].to_numpy(dtype=float)
+        # Points are spaced by time when every x is a date, else by position
+        if dates is not None and rows['_date'].notna().all():
+            x_numbers = pd.DatetimeIndex(rows['_date']).asi8.astype(float)
+        else:
+            x_numbers = np.arange(len(rows), dtype=float)
+        keep = lttb(x_numbers, y, max_points)
+        series.append({
+            'name': name,
+            'x': _values(rows[x_col].iloc[keep]),
+            'y': y[keep].tolist(),
+            'points': len(rows),
+            'downsampled': len(keep) < len(rows),
+        })
+    return series
+
+
+def _box_series(df, x_col, y_col, color_col):
+    series = []
+    for name, rows in _groups(df, color_col):
+        boxes = []
+        groups = rows.groupby(x_col, sort=True, observed=True)[y_col] if x_col else [(None, rows[y_col])]
+        for key, values in groups:
+            values = np.sort(values.to_numpy(dtype=float))
+            values = values[~np.isnan(values)]
+            if not len(values):
+                continue
+            q1, median, q3 = np.quantile(values, [0.25, 0.5, 0.75])
+            low, high = q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1)
+            inside = values[(values >= low) & (values <= high)]
+            outliers = values[(values < low) | (values > high)]
+            if len(outliers) > MAX_OUTLIERS:
+                outliers = np.sort(outliers[np.argsort(-np.abs(outliers - median), kind='stable')[:MAX_OUTLIERS]])
+            boxes.append({
+                'x': None if key is None else value_text(key),
+                'count': int(len(values)),
+                'min': float(values[0]),
+                'q1': float(q1),
+                'median': float(median),
+                'q3': float(q3),
+                'max': float(values[-1]),
+                'mean': float(values.mean()),
+                'lowerWhisker': float(inside[0]),
+                'upperWhisker': float(inside[-1]),
+                'outlierCount': int(((values < low) | (values > high)).sum()),
+                'outliers': outliers.tolist(),
+            })
+        series.append({'name': name, 'boxes': boxes})
+    return series
+
+
+def _histogram_series(df, x_col, y_col, color_col):
+    x_numbers = pd.to_numeric(df[x_col], errors='coerce')
+    weights = df[y_col].to_numpy(dtype=float) if y_col else np.ones(len(df))
+    series = []
+    if len(df) and x_numbers.notna().all():
+        # Numeric x: shared bins, summing y (counting rows without y) like px.histogram
+        edges = np.histogram_bin_edges(x_numbers.to_numpy(dtype=float), bins=HISTOGRAM_BINS)
+        centers = ((edges[:-1] + edges[1:]) / 2).tolist()
+        for name, rows in _groups(df.assign(_x=x_numbers, _w=weights), color_col):
+            sums, _ = np.histogram(rows['_x'].to_numpy(dtype=float), bins=edges, weights=rows['_w'].to_numpy())
+            series.append({'name': name, 'x': centers, 'y': sums.tolist(), 'binEdges': edges.tolist()})
+        return series
+    by = [x_col, color_col] if color_col else [x_col]
+    sums = df.assign(_w=weights).groupby(by, sort=True, observed=True)['_w'].sum().reset_index()
+    for name, rows in _groups(sums, color_col):
+        series.append({'name': name, 'x': _values(rows[x_col]), 'y': rows['_w'].astype(float).tolist()})
+    return series
+
+
+def chart_series(df, chart_type, x_col, y_col=None, color_col=None, max_points=MAX_POINTS):
+    """Series arrays of a chart over prepared rows (y numeric, x and color without NaN)"""
+    if chart_type not in CHART_TYPES:
+        raise ChartDataError(f'Unsupported chart type: {chart_type}')
+    if not x_col and chart_type != 'box':
+        raise ChartDataError('Select an X column')
+    if not y_col and chart_type != 'histogram':
+        raise ChartDataError('Select a Y column')
+    try:
+        max_points = int(max_points)
+    except (TypeError, ValueError):
+        raise ChartDataError('max_points must be a number')
+    if not 3 <= max_points <= MAX_POINTS_LIMIT:
+        raise ChartDataError(f'max_points must be between 3 and {MAX_POINTS_LIMIT}')
+
+    if chart_type == 'line':
+        series = _line_series(_aggregated(df, x_col, y_col, color_col), x_col, y_col, color_col, max_points)
+    elif chart_type == 'box':
+        series = _box_series(df, x_col, y_col, color_col)
+    elif chart_type == 'histogram':
+        series = _histogram_series(df, x_col, y_col, color_col)
+    elif chart_type == 'pie':
+        slices = group_aggregate(df, x_col, y_col).nlargest(PIE_SLICES, y_col)
+        series = [{'name': None, 'x': _values(slices[x_col]), 'y': slices[y_col].astype(float).tolist()}]
+    else:
+        agg = _aggregated(df, x_col, y_col, color_col)
+        series = [{'name': name, 'x': _values(rows[x_col]), 'y': rows[y_col].astype(float).tolist()}
+                  for name, rows in _groups(agg, color_col)]
+    return {
+        'chartType': chart_type,
+        'x': x_col,
+        'y': y_col,
+        'color': color_col,
+        'rows': int(len(df)),
+        'series': series,
+    }
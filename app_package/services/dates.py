@@ -0,0 +1,130 @@
+"""Date parsing over distinct values.
+
+Date columns hold a few dozen distinct strings (weeks, months) repeated over
+thousands of rows, so parsing row by row repeats the same work, and trying
+formats one exception at a time makes each attempt expensive. A DateParser
+parses distinct strings only: each format is one vectorized pd.to_datetime
+pass over the strings no earlier format matched, and results go to a
+process-wide memo (string -> date) that later calls read instead of parsing.
+Per-row results are broadcast back through the factorized codes.
+"""
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+
+# Cell texts that never hold a date
+BLANK_DATES = ('', 'nan', 'None', 'NaT')
+
+# Memo entries per parser; the memo is cleared when it grows past this
+MEMO_SIZE = 100000
+
+_MISSING = object()
+
+
+def distinct_codes(values):
+    """(codes, distinct values) of a column; code -1 marks missing values"""
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object), use_na_sentinel=True)
+    return codes, np.asarray(uniques, dtype=object)
+
+
+def broadcast(codes, parsed):
+    """datetime64 value per row from one parsed value per distinct code (NaT for -1)"""
+    # strptime dates outside pandas' 1677-2262 range (a number like 905101 read as %Y%m) become NaT
+    stamps = pd.to_datetime(pd.Series(list(parsed) + [None], dtype=object), errors='coerce').to_numpy()
+    return stamps[codes]
+
+
+class DateParser:
+    """Memoized multi-format date parser.
+
+    formats are tried in order; with lengths, each format is tried on the
+    whole string, then on its first n characters for each n (like
+    strptime(text[:n], fmt)). yearless formats, tried next, parse dates
+    without a year as dates in default_year. fallback(text) handles
+    whatever no format matched, one string at a time.
+
+    Formats follow pd.to_datetime, which has no dates outside 1677-2262;
+    with strptime=True the strings the vectorized passes miss are retried
+    with datetime.strptime, so results match a strptime loop exactly.
+    """
+
+    def __init__(self, formats, lengths=(None,), yearless=(), default_year=2000, fallback=None, strptime=False):
+        self.formats = tuple(formats)
+        self.lengths = tuple(lengths)
+        self.yearless = tuple(yearless)
+        self.default_year = default_year
+        self.fallback = fallback
+        self.strptime = strptime
+        self._memo = {}
+        self._lock = threading.Lock()
+
+    def _parse_new(self, texts):
+        """{text: datetime or None} of stripped, non-blank texts"""
+        result = {}
+        remaining = pd.Series(texts, dtype=object)
+        passes = [(fmt, length, '') for length in self.lengths for fmt in self.formats]
+        passes += [(fmt + '/%Y', None, f'/{self.default_year}') for fmt in self.yearless]
+        for fmt, length, suffix in passes:
+            if remaining.empty:
+                break
+            candidates = remaining
+            if length is not None:
+                # Shorter strings were already tried whole
+                candidates = remaining[remaining.str.len() > length].str[:length]
+                if candidates.empty:
+                    continue
+            parsed = pd.to_datetime(candidates + suffix, format=fmt, errors='coerce')
+            hit = candidates.index[~pd.isna(parsed)]
+            for text, stamp in zip(remaining.loc[hit], parsed[~pd.isna(parsed)]):
+                result[text] = stamp.to_pydatetime()
+            remaining = remaining.drop(hit)
+        for text in remaining:
+            date = self._strptime(text) if self.strptime else None
+            if date is None and self.fallback:
+                date = self.fallback(text)
+            result[text] = date
+        return result
+
+    def _strptime(self, text):
+        for length in self.lengths:
+            candidate = text if length is None else text[:length]
+            for fmt in self.formats:
+                try:
+                    return datetime.strptime(candidate, fmt)
+                except ValueError:
+                    continue
+        return None
+
+    def parse_many(self, values):
+        """Parsed datetime (or None) per value"""
+        texts = [str(value).strip() for value in values]
+        found = {text: None for text in BLANK_DATES}
+        missing = []
+        for text in set(texts):
+            if text in found:
+                continue
+            date = self._memo.get(text, _MISSING)
+            if date is _MISSING:
+                missing.append(text)
+            else:
+                found[text] = date
+        if missing:
+            parsed = self._parse_new(sorted(missing))
+            with self._lock:
+                if len(self._memo) + len(parsed) > MEMO_SIZE:
+                    self._memo.clear()
+                self._memo.update(parsed)
+            found.update(parsed)
+        return [found[text] for text in texts]
+
+    def parse(self, value):
+        """Parsed datetime of one value, None if unparseable"""
+        return self.parse_many([value])[0]
+
+    def datetimes(self, values):
+        """datetime64 per row of a column (NaT where missing or unparseable), parsing distinct values only"""
+        codes, uniques = distinct_codes(values)
+        return broadcast(codes, self.parse_many(uniques))
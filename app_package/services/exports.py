@@ -0,0 +1,188 @@
+"""Export jobs with cached artifacts.
+
+Word and Excel exports fill python-docx tables and render chart images inside
+the request, so a large report holds a server thread until the client times
+out. An ExportJobs pool builds them off the request thread instead: submit()
+returns a job at once, the client polls its status and downloads the artifact
+when it is done.
+
+Finished artifacts are kept on disk by a hash of everything that determines
+their content (export type, config, filters, data scope and dataset version),
+so an identical export is served from disk without building anything; a new
+dataset version simply misses. Jobs already queued for the same key are
+shared rather than built twice. The timestamp in an artifact's filename is
+set when it is downloaded, not when it was built.
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+
+# Seconds a finished job stays listed; its artifact may stay cached longer
+JOB_TTL = 3600
+
+# Artifacts kept on disk; the least recently used go first
+CACHE_ENTRIES = 100
+
+# The _YYYYmmdd_HHMMSS stamp the export endpoints put before the extension
+_FILENAME_STAMP = re.compile(r'_\d{8}_\d{6}(?=\.[^.]+$)')
+
+
+class ExportJobError(ValueError):
+    """Raised when an export job's build fails"""
+
+
+def artifact_key(*parts):
+    """Stable cache key of an export"""
+    text = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def download_name(filename):
+    """filename with its timestamp set to now, so a cached artifact is not named after its build time"""
+    if not filename:
+        return filename
+    return _FILENAME_STAMP.sub(datetime.now().strftime('_%Y%m%d_%H%M%S'), filename)
+
+
+class ArtifactCache:
+    """Export files on disk by key, with their filename and mimetype"""
+
+    def __init__(self, folder, max_entries=CACHE_ENTRIES):
+        # Absolute, as send_file resolves relative paths against the app root rather than the working directory
+        self.folder = os.path.abspath(folder)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        os.makedirs(self.folder, exist_ok=True)
+
+    def _paths(self, key):
+        base = os.path.join(self.folder, key)
+        return base + '.bin', base + '.json'
+
+    def get(self, key):
+        """(path, meta) of a cached artifact, or None"""
+        data_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            os.utime(data_path)
+        except (OSError, ValueError):
+            return None
+        return data_path, meta
+
+    def put(self, key, data, meta):
+        """Store an artifact; written to a temporary file and renamed so readers never see half a file"""
+        data_path, meta_path = self._paths(key)
+        for path, content in ((data_path, data), (meta_path, json.dumps(meta).encode('utf-8'))):
+            fd, tmp_path = tempfile.mkstemp(dir=self.folder, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(content)
+                os.replace(tmp_path, path)
+            except Exception:
+                os.remove(tmp_path)
+                raise
+        self._prune()
+        return data_path
+
+    def _prune(self):
+        with self._lock:
+            entries = [os.path.join(self.folder, name) for name in os.listdir(self.folder) if name.endswith('.bin')]
+            if len(entries) <= self.max_entries:
+                return
+            entries.sort(key=lambda path: os.path.getmtime(path) if os.path.exists(path) else 0)
+            for data_path in entries[:len(entries) - self.max_entries]:
+                for path in (data_path, data_path[:-len('.bin')] + '.json'):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+
+    def clear(self):
+        with self._lock:
+            for name in os.listdir(self.folder):
+                try:
+                    os.remove(os.path.join(self.folder, name))
+                except OSError:
+                    pass
+
+
+class ExportJobs:
+    """Worker pool building exports with build(*args) -> (bytes, {filename, mimetype})"""
+
+    def __init__(self, build, cache, workers=2, ttl=JOB_TTL):
+        self._build = build
+        self.cache = cache
+        self.ttl = ttl
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='export')
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job['finished'] is not None and job['finished'] < cutoff]:
+            del self._jobs[job_id]
+
+    def submit(self, key, scope, *args):
+        """Job for an export: done at once when cached, shared when the same export is in flight"""
+        with self._lock:
+            self._expire()
+            for job in self._jobs.values():
+                if job['key'] == key and job['scope'] == scope and job['status'] in ('queued', 'running'):
+                    return dict(job)
+            now = time.time()
+            job = {
+                'id': uuid.uuid4().hex,
+                'key': key,
+                'scope': scope,
+                'status': 'queued',
+                'error': None,
+                'cached': False,
+                'filename': None,
+                'mimetype': None,
+                'created': now,
+                'finished': None,
+            }
+            cached = self.cache.get(key)
+            if cached is not None:
+                job.update(status='done', cached=True, finished=now, **cached[1])
+            self._jobs[job['id']] = job
+            if cached is None:
+                self._pool.submit(self._run, job['id'], key, args)
+            return dict(job)
+
+    def _update(self, job_id, **changes):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(changes)
+
+    def _run(self, job_id, key, args):
+        self._update(job_id, status='running')
+        try:
+            data, meta = self._build(*args)
+            self.cache.put(key, data, meta)
+            self._update(job_id, status='done', finished=time.time(), **meta)
+        except Exception as e:
+            print(f"[EXPORT] Export job {job_id} failed: {e}")
+            self._update(job_id, status='failed', error=str(e), finished=time.time())
+
+    def get(self, job_id, scope):
+        """The job, or None when unknown, expired or outside the caller's data scope"""
+        with self._lock:
+            self._expire()
+            job = self._jobs.get(job_id)
+            if job is None or job['scope'] != scope:
+                return None
+            return dict(job)
+
+    def artifact(self, job):
+        """(path, meta) of a finished job's artifact, or None when it has left the cache"""
+        return self.cache.get(job['key'])
@@ -0,0 +1,110 @@
+"""Per-session state for cascading filter evaluation.
+
+The filter panel posts its whole selection on every click, and a click
+usually narrows the previous selection: a value is unticked, or another
+column gets a constraint. FilterStateCache remembers, per session, the frame
+the filters ran on and the row mask of the last selection. When the new spec
+only narrows the last one, only the added constraints are evaluated, and only
+over the rows that are still selected. Any other change (a value ticked back
+on, a constraint cleared, a range widened) recomputes the mask from the frame.
+"""
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+from app_package.services.filters import And, parse_filters, value_text
+
+
+# key identifies the frame (dataset version, user, uploaded file); spec and mask are the last selection
+FilterState = namedtuple('FilterState', ['key', 'frame', 'spec', 'mask'])
+
+
+def _active(spec):
+    return {key: value for key, value in (spec or {}).items() if value not in (None, '', [], {})}
+
+
+def refinement(old, new):
+    """Spec of the constraints new adds to old, or None if new does not narrow old.
+
+    new narrows old when it keeps every constraint of old, either unchanged or,
+    for value lists, as a subset of the old values. Equal specs give {}.
+    """
+    old, new = _active(old), _active(new)
+    if any(key not in new for key in old):
+        return None
+    added = {}
+    for key, spec in new.items():
+        previous = old.get(key)
+        if previous is None:
+            added[key] = spec
+        elif spec == previous:
+            continue
+        elif (isinstance(spec, list) and isinstance(previous, list)
+              and {value_text(v) for v in spec} <= {value_text(v) for v in previous}):
+            added[key] = spec
+        else:
+            return None
+    return added
+
+
+def _mask(frame, spec, rows=None):
+    """Boolean mask of the spec over frame (or over the frame positions in rows)"""
+    size = len(frame) if rows is None else len(rows)
+    predicate = parse_filters(spec)
+    if predicate is None:
+        return np.ones(size, dtype=bool)
+    if not isinstance(predicate, And):
+        predicate = And([predicate])
+    mask = predicate.mask(frame, rows)
+    # None: no filtered column exists in the frame
+    return np.ones(size, dtype=bool) if mask is None else mask
+
+
+class FilterStateCache:
+    """LRU of the last filter selection per session"""
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _frame(self, key):
+        """A frame another session already loaded for the same key"""
+        for state in self._states.values():
+            if state.key == key:
+                return state.frame
+        return None
+
+    def select(self, session_key, key, load_frame, spec):
+        """(rows of the frame selected by spec, how) where how is computed, refined or reused.
+
+        load_frame() is called only when no session has a frame for key yet.
+        """
+        with self._lock:
+            state = self._states.get(session_key)
+            frame = state.frame if state is not None and state.key == key else self._frame(key)
+        if frame is None:
+            frame = load_frame()
+
+        added = refinement(state.spec, spec) if state is not None and state.key == key else None
+        if added is None:
+            mask, how = _mask(frame, spec), 'computed'
+        elif not added:
+            mask, how = state.mask, 'reused'
+        else:
+            rows = np.flatnonzero(state.mask)
+            mask = state.mask.copy()
+            mask[rows] = _mask(frame, added, rows)
+            how = 'refined'
+
+        with self._lock:
+            self._states[session_key] = FilterState(key, frame, _active(spec), mask)
+            self._states.move_to_end(session_key)
+            while len(self._states) > self.maxsize:
+                self._states.popitem(last=False)
+        return frame[mask], how
+
+    def invalidate(self):
+        with self._lock:
+            self._states.clear()
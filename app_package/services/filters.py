@@ -0,0 +1,601 @@
+"""Filter expression model shared by the data endpoints.
+
+A filter spec is the JSON dict the frontend already sends, ``{column: [values]}``.
+Instead of a list, a column may also map to an operator dict::
+
+    {"Company": ["AP-CB", "Subcon"],                           # equality set
+     "TOTAL MH": {"gte": 10, "lt": 100},                        # numeric range
+     "(Week / Month)": {"from": "2025-01-01", "to": "2025-03-31"},  # date window
+     "Projects": {"prefix": "USTLUGA"},                         # starts with
+     "Scope": {"contains": "lumpsum"},                          # substring
+     "Status": {"not": ["Cancelled"]}}                          # negation of any spec
+
+Several operators in one dict are AND-ed. ``parse_filters`` turns a spec into a
+predicate tree that can be evaluated over a DataFrame (``predicate.mask(df)``) or
+compiled into a WHERE clause over the JSON ``data`` column of the records table
+(``compile_sql``). Conjunctions evaluate their most selective predicates first.
+
+Both backends must select the same rows. Predicates SQL would answer differently
+stay with the DataFrame: case-insensitive matching on SQLite (its UPPER only
+folds ASCII, so "gökhan" would miss "GÖKHAN") and values that could be JSON
+numbers, booleans or nulls (SQL reads 10.0 as "10.0" where ``value_text`` gives "10").
+"""
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+
+class FilterError(ValueError):
+    """Raised when a filter spec cannot be parsed"""
+
+
+# Values the dashboards treat as "no value" when matching loosely
+_BLANK_STRINGS = ('', 'nan', 'None', 'NaT')
+
+# Rough fraction of rows kept by each predicate kind when no statistics are known
+_DEFAULT_SELECTIVITY = {
+    'eq': 0.05,
+    'range': 0.3,
+    'half_range': 0.5,
+    'date_range': 0.3,
+    'prefix': 0.15,
+    'contains': 0.3,
+}
+
+
+def _on_distinct(series, fn):
+    """Evaluate fn over the distinct values of series and broadcast the result to every row.
+
+    fn receives an object ndarray of distinct values (NaN included as the last
+    element) and returns an array of the same length.
+    """
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    values = np.append(np.asarray(uniques, dtype=object), np.nan)
+    result = np.asarray(fn(values))
+    # Code -1 (missing) indexes the trailing NaN entry
+    return result[codes]
+
+
+def value_text(value):
+    """Text of a cell value; whole floats render without ".0" so float64 columns match their JSON integers"""
+    if isinstance(value, (float, np.floating)) and np.isfinite(value) and float(value).is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _text(values):
+    """Render distinct values the way astype(str) does for a single column"""
+    return np.array([value_text(v) for v in values], dtype=object)
+
+
+def _scalar_like(text):
+    """Whether text could be how a JSON number, boolean or null renders (SQL and value_text render those differently)"""
+    if text.strip().upper() in ('TRUE', 'FALSE', 'NONE'):
+        return True
+    try:
+        float(text)
+    except ValueError:
+        return False
+    return True
+
+
+def _is_blank(values):
+    return np.array([v is None or v is pd.NA or (isinstance(v, float) and np.isnan(v)) or str(v).strip() in _BLANK_STRINGS
+                     for v in values], dtype=bool)
+
+
+def _to_number(values):
+    return pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').to_numpy(dtype=float)
+
+
+def _to_datetime(values):
+    parsed = pd.to_datetime(pd.Series(values, dtype=object).astype(str), errors='coerce', format='mixed', dayfirst=True)
+    return parsed.to_numpy()
+
+
+class Field:
+    """A column reference, optionally resolved through a list of alias column names"""
+
+    def __init__(self, name, columns=None):
+        self.name = name
+        self.columns = list(columns) if columns else [name]
+
+    def series(self, df):
+        """Return the column values, coalescing aliases in order; None if no alias exists in df"""
+        present = [c for c in self.columns if c in df.columns]
+        if not present:
+            return None
+        series = df[present[0]]
+        if len(present) > 1 and isinstance(series.dtype, pd.CategoricalDtype):
+            # Alias values are not in this column's dictionary
+            series = series.astype(object)
+        for col in present[1:]:
+            series = series.where(series.notna(), df[col])
+        return series
+
+    def sql(self, ctx):
+        exprs = [ctx.json_text(col) for col in self.columns]
+        return exprs[0] if len(exprs) == 1 else f"COALESCE({', '.join(exprs)})"
+
+    def __repr__(self):
+        return self.name
+
+
+class Predicate:
+    """Base class for filter predicates"""
+
+    def mask(self, df, rows=None):
+        """Boolean ndarray for df (or for the df positions in rows); None when the field is absent"""
+        series = self.field.series(df)
+        if series is None:
+            return None
+        if rows is not None:
+            series = series.iloc[rows]
+        return self.test(series)
+
+    def test(self, series):
+        raise NotImplementedError
+
+    def selectivity(self, stats=None):
+        return 1.0
+
+    def sql(self, ctx):
+        """Return a SQL boolean expression, or None if the predicate cannot be pushed down"""
+        return None
+
+    def columns(self):
+        return list(self.field.columns)
+
+
+class In(Predicate):
+    """Equality against a set of values, compared as strings like the legacy filters"""
+
+    def __init__(self, field, values, ignore_case=False, match_missing=False):
+        self.field = field
+        self.ignore_case = ignore_case
+        self.match_missing = match_missing
+        self.values = [self._norm(v) for v in values if not (ignore_case and v in (None, ''))]
+
+    def _norm(self, value):
+        text = value_text(value)
+        return text.strip().upper() if self.ignore_case else text
+
+    def test(self, series):
+        wanted = set(self.values)
+
+        def check(values):
+            texts = _text(values)
+            if self.ignore_case:
+                texts = np.array([t.strip().upper() for t in texts], dtype=object)
+            hit = np.array([t in wanted for t in texts], dtype=bool)
+            if self.match_missing:
+                hit |= _is_blank(values)
+            return hit
+
+        return _on_distinct(series, check)
+
+    def selectivity(self, stats=None):
+        counts = (stats or {}).get(self.field.columns[0])
+        if counts is not None and not self.ignore_case:
+            estimate = sum(counts.get(v, 0.0) for v in self.values)
+        else:
+            estimate = _DEFAULT_SELECTIVITY['eq'] * len(self.values)
+        if self.match_missing:
+            estimate += _DEFAULT_SELECTIVITY['eq']
+        return min(1.0, estimate)
+
+    def sql(self, ctx):
+        if any(_scalar_like(v) for v in self.values):
+            return None
+        expr = self.field.sql(ctx)
+        if self.ignore_case:
+            expr = ctx.upper(f"TRIM({expr})")
+            if expr is None:
+                return None
+        if self.values:
+            names = [ctx.param(v) for v in self.values]
+            clause = f"{expr} IN ({', '.join(names)})"
+        else:
+            clause = "1=0"
+        if self.match_missing:
+            raw = self.field.sql(ctx)
+            clause = f"{raw} IS NULL OR TRIM({raw}) IN ({', '.join(ctx.param(b) for b in _BLANK_STRINGS)}) OR {clause}"
+        return clause
+
+    def __repr__(self):
+        return f"{self.field} in {self.values}"
+
+
+class Range(Predicate):
+    """Numeric range; either bound may be omitted"""
+
+    def __init__(self, field, low=None, high=None, low_inclusive=True, high_inclusive=True):
+        self.field = field
+        self.low, self.high = low, high
+        self.low_inclusive, self.high_inclusive = low_inclusive, high_inclusive
+
+    def _compare(self, numbers):
+        keep = ~np.isnan(numbers)
+        if self.low is not None:
+            keep &= numbers >= self.low if self.low_inclusive else numbers > self.low
+        if self.high is not None:
+            keep &= numbers <= self.high if self.high_inclusive else numbers < self.high
+        return keep
+
+    def test(self, series):
+        if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            return self._compare(series.to_numpy(dtype=float, na_value=np.nan))
+        return _on_distinct(series, lambda values: self._compare(_to_number(values)))
+
+    def selectivity(self, stats=None):
+        if self.low is not None and self.high is not None:
+            return _DEFAULT_SELECTIVITY['range']
+        return _DEFAULT_SELECTIVITY['half_range']
+
+    def sql(self, ctx):
+        number = ctx.json_number(self.field.sql(ctx))
+        parts = []
+        if self.low is not None:
+            parts.append(f"{number} {'>=' if self.low_inclusive else '>'} {ctx.param(float(self.low))}")
+        if self.high is not None:
+            parts.append(f"{number} {'<=' if self.high_inclusive else '<'} {ctx.param(float(self.high))}")
+        return ' AND '.join(parts) or f"{number} IS NOT NULL"
+
+    def __repr__(self):
+        return f"{self.low} <= {self.field} <= {self.high}"
+
+
+class DateRange(Predicate):
+    """Inclusive date window over text dates such as 01/Sep/2025"""
+
+    def __init__(self, field, start=None, end=None):
+        self.field = field
+        self.start, self.end = start, end
+
+    def test(self, series):
+        def check(values):
+            dates = _to_datetime(values)
+            keep = ~pd.isna(dates)
+            if self.start is not None:
+                keep &= dates >= np.datetime64(self.start)
+            if self.end is not None:
+                keep &= dates <= np.datetime64(self.end)
+            return keep
+
+        return _on_distinct(series, check)
+
+    def selectivity(self, stats=None):
+        return _DEFAULT_SELECTIVITY['date_range']
+
+    def __repr__(self):
+        return f"{self.start} <= {self.field} <= {self.end}"
+
+
+# Characters of the text SQL gives a JSON number
+_NUMBER_CHARS = set('0123456789.+-E')
+
+
+class Prefix(Predicate):
+    """Case-insensitive starts-with match"""
+
+    kind = 'prefix'
+
+    def __init__(self, field, value):
+        self.field = field
+        self.value = str(value).upper()
+
+    def _match(self, text):
+        return text.startswith(self.value)
+
+    def test(self, series):
+        return _on_distinct(series, lambda values: np.array(
+            [not _is_blank([v])[0] and self._match(value_text(v).upper()) for v in values], dtype=bool))
+
+    def selectivity(self, stats=None):
+        return _DEFAULT_SELECTIVITY[self.kind]
+
+    def _pattern(self):
+        escaped = self.value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        return escaped + '%'
+
+    def sql(self, ctx):
+        upper = ctx.upper(self.field.sql(ctx))
+        if upper is None or set(self.value) <= _NUMBER_CHARS:
+            # A pattern of digits could match the SQL text of a JSON number ("10.0") but not value_text ("10")
+            return None
+        raw = self.field.sql(ctx)
+        blanks = ', '.join(ctx.param(b) for b in _BLANK_STRINGS)
+        return f"TRIM({raw}) NOT IN ({blanks}) AND {upper} LIKE {ctx.param(self._pattern())} ESCAPE '\\'"
+
+    def __repr__(self):
+        return f"{self.field} {self.kind} {self.value!r}"
+
+
+class Contains(Prefix):
+    """Case-insensitive substring match"""
+
+    kind = 'contains'
+
+    def _match(self, text):
+        return self.value in text
+
+    def _pattern(self):
+        return '%' + super()._pattern()
+
+
+class Not(Predicate):
+    """Negation of another predicate"""
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    def mask(self, df, rows=None):
+        inner = self.inner.mask(df, rows)
+        return None if inner is None else ~inner
+
+    def selectivity(self, stats=None):
+        return 1.0 - self.inner.selectivity(stats)
+
+    def sql(self, ctx):
+        inner = self.inner.sql(ctx)
+        # COALESCE keeps rows where the inner test is NULL, matching the DataFrame semantics
+        return None if inner is None else f"NOT COALESCE(({inner}), 1=0)"
+
+    def columns(self):
+        return self.inner.columns()
+
+    def __repr__(self):
+        return f"not ({self.inner!r})"
+
+
+class And(Predicate):
+    """Conjunction, evaluated most selective predicate first"""
+
+    def __init__(self, predicates):
+        self.predicates = list(predicates)
+
+    def ordered(self, stats=None):
+        return sorted(self.predicates, key=lambda p: p.selectivity(stats))
+
+    def mask(self, df, rows=None, stats=None):
+        """Evaluate each predicate only on the rows that survived the previous ones"""
+        total = len(df) if rows is None else len(rows)
+        keep = np.ones(total, dtype=bool)
+        applied = False
+        for predicate in self.ordered(stats):
+            alive = np.flatnonzero(keep)
+            if len(alive) == 0:
+                break
+            subset = alive if rows is None else rows[alive]
+            if len(alive) == len(df) and rows is None:
+                subset = None
+            if isinstance(predicate, And):
+                result = predicate.mask(df, subset, stats)
+            else:
+                result = predicate.mask(df, subset)
+            if result is not None:
+                keep[alive] = result
+                applied = True
+        return keep if applied or rows is None else None
+
+    def selectivity(self, stats=None):
+        estimate = 1.0
+        for predicate in self.predicates:
+            estimate *= predicate.selectivity(stats)
+        return estimate
+
+    def sql(self, ctx):
+        parts = [p.sql(ctx) for p in self.ordered()]
+        if any(part is None for part in parts):
+            return None
+        return ' AND '.join(f"COALESCE(({part}), 1=0)" for part in parts) or '1=1'
+
+    def columns(self):
+        return [col for p in self.predicates for col in p.columns()]
+
+    def __repr__(self):
+        return ' and '.join(repr(p) for p in self.predicates)
+
+
+# ============================================================================
+# PARSING
+# ============================================================================
+
+_RANGE_OPS = {'gt', 'gte', 'lt', 'lte', 'min', 'max'}
+_DATE_OPS = {'from', 'to', 'after', 'before'}
+
+
+def _number(value, op, name):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise FilterError(f'Filter "{name}": "{op}" expects a number, got {value!r}')
+
+
+def _date(value, op, name):
+    try:
+        return pd.Timestamp(str(value)).to_datetime64()
+    except (TypeError, ValueError):
+        raise FilterError(f'Filter "{name}": "{op}" expects a date, got {value!r}')
+
+
+def _parse_field_spec(field, spec, loose):
+    """Parse the spec for a single column into a predicate (None if the spec selects nothing)"""
+    name = field.name
+    if isinstance(spec, (list, tuple, set)):
+        values = list(spec)
+        if not values:
+            return None
+        return In(field, values, ignore_case=loose, match_missing=loose)
+    if not isinstance(spec, dict):
+        # A bare scalar is an equality test
+        return In(field, [spec], ignore_case=loose, match_missing=loose)
+
+    ignore_case = bool(spec.get('ignore_case', loose))
+    predicates = []
+    for op, value in spec.items():
+        if op == 'ignore_case':
+            continue
+        if op in ('in', 'eq'):
+            values = value if isinstance(value, (list, tuple)) else [value]
+            if values:
+                predicates.append(In(field, values, ignore_case=ignore_case, match_missing=loose))
+        elif op in ('not_in', 'ne'):
+            values = value if isinstance(value, (list, tuple)) else [value]
+            if values:
+                predicates.append(Not(In(field, values, ignore_case=ignore_case)))
+        elif op == 'not':
+            inner = _parse_field_spec(field, value, False)
+            if inner is not None:
+                predicates.append(Not(inner))
+        elif op == 'prefix':
+            predicates.append(Prefix(field, value))
+        elif op == 'contains':
+            predicates.append(Contains(field, value))
+        elif op in _RANGE_OPS or op in _DATE_OPS:
+            continue
+        else:
+            raise FilterError(f'Filter "{name}": unknown operator "{op}"')
+
+    range_ops = {op: spec[op] for op in _RANGE_OPS if op in spec and spec[op] not in (None, '')}
+    if range_ops:
+        low = high = None
+        low_inclusive = high_inclusive = True
+        for op, value in range_ops.items():
+            number = _number(value, op, name)
+            if op in ('gt', 'gte', 'min'):
+                low, low_inclusive = number, op != 'gt'
+            else:
+                high, high_inclusive = number, op != 'lt'
+        predicates.append(Range(field, low, high, low_inclusive, high_inclusive))
+
+    date_ops = {op: spec[op] for op in _DATE_OPS if op in spec and spec[op] not in (None, '')}
+    if date_ops:
+        start = end = None
+        for op, value in date_ops.items():
+            if op in ('from', 'after'):
+                start = _date(value, op, name)
+            else:
+                end = _date(value, op, name)
+        predicates.append(DateRange(field, start, end))
+
+    if not predicates:
+        return None
+    return predicates[0] if len(predicates) == 1 else And(predicates)
+
+
+def parse_filters(spec, aliases=None, loose=False):
+    """Parse a filter spec into a predicate, or None when it selects everything.
+
+    aliases maps a filter key to the column names it may be stored under (the
+    dashboards send camelCase keys such as "nameSurname"). With loose=True,
+    equality sets compare trimmed and case-insensitively and let rows without a
+    value through, which is how the dashboard filters have always behaved.
+    """
+    if spec in (None, '', {}):
+        return None
+    if isinstance(spec, Predicate):
+        return spec
+    if not isinstance(spec, dict):
+        raise FilterError('Filters must be an object mapping column names to values or operators')
+
+    aliases = aliases or {}
+    predicates = []
+    for key, field_spec in spec.items():
+        if field_spec in (None, '', [], {}):
+            continue
+        field = Field(key, aliases.get(key))
+        predicate = _parse_field_spec(field, field_spec, loose)
+        if predicate is not None:
+            predicates.append(predicate)
+
+    if not predicates:
+        return None
+    return And(predicates)
+
+
+def apply_filters(df, spec, aliases=None, loose=False, stats=None):
+    """Return the rows of df selected by a filter spec"""
+    predicate = parse_filters(spec, aliases=aliases, loose=loose)
+    if predicate is None or df.empty:
+        return df
+    if not isinstance(predicate, And):
+        predicate = And([predicate])
+    return df[predicate.mask(df, stats=stats)]
+
+
+# ============================================================================
+# SQL COMPILATION
+# ============================================================================
+
+CompiledFilter = namedtuple('CompiledFilter', ['clause', 'params', 'residual'])
+
+
+class _SqlContext:
+    """Collects bind parameters and renders dialect-specific JSON access"""
+
+    def __init__(self, dialect, column):
+        self.dialect = dialect
+        self.column = column
+        self.params = {}
+
+    def param(self, value):
+        name = f'f{len(self.params)}'
+        self.params[name] = value
+        return f':{name}'
+
+    def json_text(self, key):
+        if self.dialect == 'postgresql':
+            return f"(CAST({self.column} AS json) ->> {self.param(key)})"
+        path = '$."' + str(key).replace('"', '\\"') + '"'
+        return f"CAST(json_extract({self.column}, {self.param(path)}) AS TEXT)"
+
+    def upper(self, expr):
+        """Unicode upper case of a text expression; None on SQLite, whose UPPER only folds ASCII"""
+        if self.dialect == 'postgresql':
+            return f"UPPER({expr})"
+        return None
+
+    def json_number(self, expr):
+        if self.dialect == 'postgresql':
+            return (f"(CASE WHEN TRIM({expr}) ~ '^-?[0-9]+(\\.[0-9]*)?([eE][-+]?[0-9]+)?$' "
+                    f"THEN CAST(TRIM({expr}) AS double precision) END)")
+        return (f"(CASE WHEN TRIM({expr}) GLOB '*[0-9]*' AND TRIM({expr}) NOT GLOB '*[^0-9.eE+-]*' "
+                f"THEN CAST(TRIM({expr}) AS REAL) END)")
+
+
+def compile_sql(predicate, dialect, column='data'):
+    """Compile a predicate into a WHERE clause over the JSON records column.
+
+    Returns CompiledFilter(clause, params, residual). Parts that cannot be
+    expressed in SQL (date windows over text dates, case-insensitive matching
+    on SQLite, number-like values) are returned as the residual predicate, to
+    be applied with filter_records() after loading.
+    """
+    if predicate is None:
+        return CompiledFilter(None, {}, None)
+    ctx = _SqlContext(dialect, column)
+    parts = predicate.predicates if isinstance(predicate, And) else [predicate]
+    pushed, residual = [], []
+    for part in sorted(parts, key=lambda p: p.selectivity()):
+        clause = part.sql(ctx)
+        if clause is None:
+            residual.append(part)
+        else:
+            pushed.append(f"COALESCE(({clause}), 1=0)")
+    return CompiledFilter(
+        ' AND '.join(pushed) or None,
+        ctx.params,
+        And(residual) if residual else None,
+    )
+
+
+def filter_records(records, predicate):
+    """Apply a predicate to a list of record dicts"""
+    if predicate is None or not records:
+        return records
+    if not isinstance(predicate, And):
+        predicate = And([predicate])
+    keep = predicate.mask(pd.DataFrame(records, dtype=object))
+    return [record for record, kept in zip(records, keep) if kept]
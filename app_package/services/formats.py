@@ -0,0 +1,97 @@
+"""Response encodings for the tabular endpoints.
+
+Row-oriented JSON (``[{column: value}, ...]``) repeats every column name in
+every row. The other encodings send each column once:
+
+* ``columnar``: ``{"columns": [...], "data": {column: [values]}}``, built from
+  the column arrays instead of one dict per row;
+* ``arrow``: an Arrow IPC stream, which AG Grid and the pivot components can
+  read without parsing JSON. The endpoint's other response keys (shape,
+  paging, ...) travel as JSON in the schema metadata under ``response``.
+  Needs pyarrow.
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+from app_package.services.filters import value_text
+
+try:
+    import pyarrow as pa
+except ImportError:  # optional dependency
+    pa = None
+
+
+FORMATS = ('rows', 'columnar', 'arrow')
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+
+# Rows per Arrow record batch
+ARROW_BATCH_ROWS = 65536
+
+
+class FormatError(ValueError):
+    """Raised for an unknown or unavailable response format"""
+
+
+def parse_format(value):
+    """'rows', 'columnar' or 'arrow' from a format= parameter (rows when absent)"""
+    if value in (None, ''):
+        return 'rows'
+    value = str(value).lower()
+    if value not in FORMATS:
+        raise FormatError(f'Unknown format "{value}"; use one of {", ".join(FORMATS)}')
+    if value == 'arrow' and pa is None:
+        raise FormatError('format=arrow needs pyarrow, which is not installed')
+    return value
+
+
+def _column_values(series):
+    """JSON-ready list of a column's values (NaN as null, datetimes as Timestamps)"""
+    values = series.to_numpy()
+    if values.dtype.kind in 'mM':
+        values = series.astype(object).to_numpy()
+    elif values.dtype.kind in 'fO':
+        missing = np.isnan(values) if values.dtype.kind == 'f' else pd.isna(values)
+        if missing.any():
+            values = values.astype(object)
+            values[missing] = None
+    return values.tolist()
+
+
+def columnar(df):
+    """{columns, data: {column: values}} of a DataFrame"""
+    columns = df.columns.tolist()
+    return {
+        'columns': columns,
+        'data': {col: _column_values(df.iloc[:, i]) for i, col in enumerate(columns)},
+    }
+
+
+def records_columnar(records):
+    """{columns, data} of record dicts; columns in first-seen order, null where a record lacks one"""
+    columns = list(dict.fromkeys(key for record in records for key in record))
+    return {
+        'columns': columns,
+        'data': {col: [record.get(col) for record in records] for col in columns},
+    }
+
+
+def _arrow_array(series):
+    try:
+        return pa.array(series, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        # Object columns mixing numbers and text travel as text
+        return pa.array([None if pd.isna(v) else value_text(v) for v in series], type=pa.string())
+
+
+def arrow_stream(df, metadata=None):
+    """Arrow IPC stream bytes of a DataFrame, with metadata as JSON in the schema metadata"""
+    arrays = [_arrow_array(df.iloc[:, i]) for i in range(df.shape[1])]
+    table = pa.Table.from_arrays(arrays, names=[str(col) for col in df.columns])
+    if metadata:
+        table = table.replace_schema_metadata({'response': json.dumps(metadata, default=str)})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table, max_chunksize=ARROW_BATCH_ROWS)
+    return sink.getvalue().to_pybytes()
@@ -0,0 +1,79 @@
+"""XLOOKUP over the reference sheets through hash indexes.
+
+fill_empty_cells_with_formulas looks values up in the Info, Hourly Rates and
+Summary sheets a dozen times per row, and xlookup compares the lookup value
+with the whole key column every time (normalizing every string of the column
+again when there is no exact match). A ReferenceLookup indexes each key column
+once, on first use, so a lookup is a dict hit. Results are xlookup's: the
+first exact match, else for a string the first match ignoring case and
+surrounding or repeated whitespace, and if_not_found when nothing matches or
+the matched value is missing.
+"""
+import pandas as pd
+
+
+def _normalize(value):
+    return ' '.join(str(value).strip().upper().split())
+
+
+class ReferenceLookup:
+    """XLOOKUP on the columns (by position) of one reference sheet"""
+
+    def __init__(self, df):
+        self.df = df
+        self._columns = {}
+        self._exact = {}
+        self._normalized = {}
+
+    def _column(self, col):
+        values = self._columns.get(col)
+        if values is None:
+            # Raises IndexError for a column the sheet does not have, as df.iloc[:, col] does
+            values = self._columns[col] = self.df.iloc[:, col].tolist()
+        return values
+
+    def _index(self, col):
+        index = self._exact.get(col)
+        if index is None:
+            index = {}
+            for position, value in enumerate(self._column(col)):
+                # Missing values never equal a lookup value
+                if value is None or (isinstance(value, float) and value != value):
+                    continue
+                try:
+                    index.setdefault(value, position)
+                except TypeError:
+                    pass
+            self._exact[col] = index
+        return index
+
+    def _normalized_index(self, col):
+        index = self._normalized.get(col)
+        if index is None:
+            index = {}
+            for position, value in enumerate(self._column(col)):
+                index.setdefault(_normalize(value), position)
+            self._normalized[col] = index
+        return index
+
+    def xlookup(self, lookup_value, lookup_col, return_col, if_not_found=0):
+        """xlookup(lookup_value, df.iloc[:, lookup_col], df.iloc[:, return_col], if_not_found)"""
+        returns = self._column(return_col)
+        if pd.isna(lookup_value):
+            return if_not_found
+        try:
+            position = self._index(lookup_col).get(lookup_value)
+        except TypeError:
+            return if_not_found
+        if position is None and isinstance(lookup_value, str):
+            position = self._normalized_index(lookup_col).get(_normalize(lookup_value))
+        if position is None:
+            return if_not_found
+        result = returns[position]
+        return result if pd.notna(result) else if_not_found
+
+
+def reference_lookups(info_df, rates_df, summary_df):
+    """(info, rates, summary) ReferenceLookups of the reference sheets; summary is None without a Summary sheet"""
+    return (ReferenceLookup(info_df), ReferenceLookup(rates_df),
+            ReferenceLookup(summary_df) if summary_df is not None else None)
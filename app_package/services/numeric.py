@@ -0,0 +1,73 @@
+"""Numeric parsing of record values.
+
+Value columns arrive as JSON numbers, numeric strings or currency-formatted
+text ("$1,250", "300 USD"). ``parse_series`` cleans and parses each distinct
+value once and broadcasts the result, and reports how many rows parsed,
+were blank or failed. The snapshot keeps the parsed columns per dataset
+version, so pivots and charts get float64 columns without re-cleaning text
+on every request.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+_CURRENCY_SYMBOLS = re.compile(r'[\$,£€¥]')
+_CURRENCY_WORDS = re.compile(r'\bUSD\b|\bTRY\b|\bEUR\b|\bTL\b', re.IGNORECASE)
+_NON_NUMERIC = re.compile(r'[^0-9.\-]')
+
+_BLANK_STRINGS = ('', 'nan', 'None', 'NaT')
+
+# Failing values kept per column in the parse report
+MAX_EXAMPLES = 5
+
+
+def parse_number(value):
+    """Float for one cell, stripping currency symbols and words; None for blanks, NaN when unparseable"""
+    if value is None or value is pd.NA:
+        return None
+    if isinstance(value, (bool, np.bool_)):
+        return np.nan
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return None if np.isnan(value) else float(value)
+    text = str(value).strip()
+    if text in _BLANK_STRINGS:
+        return None
+    try:
+        number = float(text)
+        if np.isfinite(number):
+            return number
+    except ValueError:
+        pass
+    text = _NON_NUMERIC.sub('', _CURRENCY_WORDS.sub('', _CURRENCY_SYMBOLS.sub('', text)))
+    try:
+        return float(text)
+    except ValueError:
+        return np.nan
+
+
+def parse_series(series):
+    """(float64 ndarray, report) for a column; report counts parsed, blank and failed rows"""
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        values = series.to_numpy(dtype=float, na_value=np.nan)
+        blank = int(np.isnan(values).sum())
+        return values, {'parsed': len(values) - blank, 'blank': blank, 'failed': 0, 'examples': []}
+
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    parsed = [parse_number(v) for v in uniques]
+    numbers = np.array([np.nan if p is None else p for p in parsed] + [np.nan], dtype=float)
+    failed_codes = np.array([p is not None and np.isnan(p) for p in parsed] + [False], dtype=bool)
+    values = numbers[codes]
+    failed = failed_codes[codes]
+    report = {
+        'parsed': int((~np.isnan(values)).sum()),
+        'blank': int((np.isnan(values) & ~failed).sum()),
+        'failed': int(failed.sum()),
+        'examples': [str(v) for v, bad in zip(uniques, failed_codes) if bad][:MAX_EXAMPLES],
+    }
+    return values, report
+
+
+def to_numeric(series):
+    """Cleaned float64 Series with the index of series"""
+    return pd.Series(parse_series(series)[0], index=series.index, name=series.name)
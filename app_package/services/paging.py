@@ -0,0 +1,128 @@
+"""Server-side sorting, column projection and pagination over DataFrames"""
+import base64
+import json
+
+import numpy as np
+import pandas as pd
+
+
+class PagingError(ValueError):
+    """Raised for invalid page, sort or cursor parameters"""
+
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 5000
+
+
+def parse_sort(sort):
+    """Normalize sort keys to [(column, ascending)].
+
+    Accepts "col", "-col", {"column": "col", "direction": "desc"} or a list of those.
+    """
+    if not sort:
+        return []
+    if not isinstance(sort, list):
+        sort = [sort]
+    keys = []
+    for item in sort:
+        if isinstance(item, str):
+            keys.append((item[1:], False) if item.startswith('-') else (item, True))
+        elif isinstance(item, dict) and item.get('column'):
+            direction = str(item.get('direction', 'asc')).lower()
+            if direction not in ('asc', 'desc'):
+                raise PagingError(f'Invalid sort direction "{direction}"')
+            keys.append((item['column'], direction == 'asc'))
+        else:
+            raise PagingError(f'Invalid sort key: {item!r}')
+    return keys
+
+
+def _sort_key(series):
+    """Sort numerically when most values are numbers, otherwise as text"""
+    if pd.api.types.is_numeric_dtype(series):
+        return series
+    numbers = pd.to_numeric(series, errors='coerce')
+    if numbers.notna().sum() >= 0.5 * series.notna().sum() and numbers.notna().any():
+        return numbers
+    return series.astype(str).where(series.notna(), None)
+
+
+def sort_frame(df, sort_keys):
+    """Stable sort of df by [(column, ascending)]; unknown columns are rejected"""
+    if not sort_keys:
+        return df
+    missing = [col for col, _ in sort_keys if col not in df.columns]
+    if missing:
+        raise PagingError(f'Unknown sort column(s): {", ".join(map(str, missing))}')
+    keys = pd.DataFrame({i: _sort_key(df[col]).to_numpy() for i, (col, _) in enumerate(sort_keys)})
+    order = keys.sort_values(
+        by=list(keys.columns),
+        ascending=[asc for _, asc in sort_keys],
+        kind='mergesort',
+        na_position='last',
+    ).index.to_numpy()
+    return df.iloc[order]
+
+
+def project(df, columns):
+    """Restrict df to the requested columns, keeping the requested order"""
+    if not columns:
+        return df
+    missing = [col for col in columns if col not in df.columns]
+    if missing:
+        raise PagingError(f'Unknown column(s): {", ".join(map(str, missing))}')
+    return df[list(columns)]
+
+
+def encode_cursor(offset, page_size, version):
+    payload = json.dumps({'o': int(offset), 'n': int(page_size), 'v': str(version)})
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+        return int(payload['o']), int(payload['n']), payload['v']
+    except (ValueError, KeyError, TypeError, UnicodeError):
+        raise PagingError('Invalid cursor')
+
+
+def page_bounds(total, page=None, page_size=None, cursor=None, version=None):
+    """Resolve page/page_size or a cursor into (offset, page_size, page)"""
+    if cursor:
+        offset, page_size, cursor_version = decode_cursor(cursor)
+        if version is not None and cursor_version != str(version):
+            raise PagingError('Dataset changed since the cursor was issued; restart from the first page')
+    else:
+        try:
+            page_size = DEFAULT_PAGE_SIZE if page_size is None else int(page_size)
+            page = 1 if page is None else int(page)
+        except (TypeError, ValueError):
+            raise PagingError('page and page_size must be integers')
+        if page < 1:
+            raise PagingError('page must be >= 1')
+        offset = (page - 1) * page_size
+    if page_size < 1 or page_size > MAX_PAGE_SIZE:
+        raise PagingError(f'page_size must be between 1 and {MAX_PAGE_SIZE}')
+    return offset, page_size, offset // page_size + 1
+
+
+def paginate(df, page=None, page_size=None, cursor=None, sort=None, columns=None, version=None):
+    """Sort, project and slice df; returns (window_df, paging_info)"""
+    total = len(df)
+    offset, page_size, page = page_bounds(total, page, page_size, cursor, version)
+    sort_keys = parse_sort(sort)
+    # Validate projection before the (comparatively expensive) sort
+    project(df.iloc[:0], columns)
+    if sort_keys:
+        df = sort_frame(df, sort_keys)
+    window = project(df.iloc[offset:offset + page_size], columns)
+    next_offset = offset + page_size
+    info = {
+        'total': total,
+        'page': page,
+        'page_size': page_size,
+        'pages': int(np.ceil(total / page_size)) if total else 0,
+        'next_cursor': encode_cursor(next_offset, page_size, version) if next_offset < total else None,
+    }
+    return window, info
@@ -0,0 +1,247 @@
+"""Multi-level pivots with subtotals and grand totals.
+
+A pivot spec names row dimensions, column dimensions and measures::
+
+    {"rows": ["Company", "Projects"], "columns": ["Status"],
+     "measures": [{"field": "TOTAL MH", "agg": "sum"},
+                  {"field": "General Total Cost (USD)", "agg": "mean", "as": "avg cost"}]}
+
+The rows are grouped once at the finest grain (every row and column
+dimension). Subtotals and grand totals for each prefix of the row and column
+dimensions are then re-aggregated from those cells, which only works for
+aggregations that compose (sum, count, mean, min, max). Median, std, var and
+nunique are computed from the rows for each prefix instead.
+
+The result is compact: row and column keys as label lists in pre-order (the
+grand total ``[]`` first, each subtotal before its children) and, per
+measure, one matrix of cells indexed by row key and column key.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from app_package.services.filters import value_text
+from app_package.services.numeric import parse_series
+
+
+class PivotError(ValueError):
+    """Raised for an invalid pivot spec"""
+
+
+# Aggregations whose subtotals can be re-aggregated from finer cells: parts kept per cell
+_COMPOSABLE = {
+    'sum': ('sum',),
+    'count': ('count',),
+    'mean': ('sum', 'count'),
+    'min': ('min',),
+    'max': ('max',),
+}
+_RAW = ('median', 'std', 'var', 'nunique')
+AGGREGATES = tuple(_COMPOSABLE) + _RAW
+_ALIASES = {'avg': 'mean', 'average': 'mean'}
+
+# How parts of finer cells combine into coarser ones
+_COMBINE = {'sum': 'sum', 'count': 'sum', 'min': 'min', 'max': 'max'}
+
+MAX_DIMENSIONS = 6
+# Row keys x column keys x measures above which a pivot is refused
+MAX_CELLS = 500_000
+
+
+def _as_list(value):
+    if value in (None, ''):
+        return []
+    return [value] if isinstance(value, str) else list(value)
+
+
+def parse_pivot_spec(config):
+    """(rows, columns, measures) from a pivot request; measures are (name, field, agg) tuples.
+
+    Accepts the multi-level keys (rows, columns, measures) and the single-level
+    ones create_pivot always took (index, values, agg_func).
+    """
+    rows = _as_list(config.get('rows', config.get('index')))
+    columns = _as_list(config.get('columns'))
+    measures = config.get('measures')
+    if measures is None:
+        default_agg = config.get('agg_func', 'sum')
+        measures = [{'field': field, 'agg': default_agg} for field in _as_list(config.get('values'))]
+    if not rows and not columns:
+        raise PivotError('Select at least one row or column dimension')
+    if len(rows) + len(columns) > MAX_DIMENSIONS:
+        raise PivotError(f'A pivot takes at most {MAX_DIMENSIONS} dimensions')
+    if not isinstance(measures, list) or not measures:
+        raise PivotError('Select at least one measure')
+
+    parsed, names = [], set()
+    for spec in measures:
+        if isinstance(spec, str):
+            spec = {'field': spec}
+        if not isinstance(spec, dict) or not spec.get('field'):
+            raise PivotError(f'Invalid measure: {spec!r}')
+        agg = _ALIASES.get(spec.get('agg', 'sum'), spec.get('agg', 'sum'))
+        if agg not in AGGREGATES:
+            raise PivotError(f'Unknown aggregation "{agg}"; use one of {", ".join(AGGREGATES)}')
+        name = spec.get('as') or f"{spec['field']} ({agg})"
+        if name in names:
+            raise PivotError(f'Duplicate measure "{name}"')
+        names.add(name)
+        parsed.append((name, spec['field'], agg))
+    return rows, columns, parsed
+
+
+def _dimension_codes(series):
+    """(codes, sorted labels) of a dimension column; code -1 for missing values"""
+    codes, labels = pd.factorize(series, sort=True, use_na_sentinel=True)
+    return codes, [value_text(label) for label in labels]
+
+
+def _json_number(value):
+    if value is None or pd.isna(value):
+        return None
+    return float(value)
+
+
+def multi_pivot(df, rows, columns, measures):
+    """Pivot df by row and column dimensions with subtotals for every dimension prefix.
+
+    Returns {rows, columns, measures, rowKeys, colKeys, cells} where cells maps
+    each measure name to a len(rowKeys) x len(colKeys) matrix (None = no rows).
+    """
+    missing = [col for col in rows + columns + [field for _, field, _ in measures] if col not in df.columns]
+    if missing:
+        raise PivotError(f'Column(s) not found in data: {", ".join(map(str, missing))}')
+
+    frame = pd.DataFrame(index=np.arange(len(df)))
+    keep = np.ones(len(df), dtype=bool)
+    labels = {}
+    for prefix, dims in (('r', rows), ('c', columns)):
+        for i, col in enumerate(dims):
+            codes, labels[f'{prefix}{i}'] = _dimension_codes(df[col])
+            frame[f'{prefix}{i}'] = codes
+            # Like pivot_table, rows with a missing dimension value are left out
+            keep &= codes >= 0
+
+    # Measure inputs: parsed numbers, or the raw values for count/nunique
+    inputs = {}
+    for name, field, agg in measures:
+        if agg in ('count', 'nunique'):
+            series = df[field]
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                series = series.astype(object)
+            inputs[name] = series.to_numpy()
+        else:
+            inputs[name] = parse_series(df[field])[0]
+        frame[name] = inputs[name]
+    frame = frame[keep]
+    dim_keys = [f'r{i}' for i in range(len(rows))] + [f'c{i}' for i in range(len(columns))]
+
+    # One grouped pass at the finest grain for the composable parts
+    part_columns = {}
+    for name, _, agg in measures:
+        for part in _COMPOSABLE.get(agg, ()):
+            part_columns[f'{name}\x00{part}'] = (name, part)
+    if part_columns:
+        grouped = frame.groupby(dim_keys, sort=False)
+        finest = pd.DataFrame({key: grouped[name].agg(part) for key, (name, part) in part_columns.items()})
+        finest = finest.reset_index()
+    else:
+        finest = frame[dim_keys].drop_duplicates()
+
+    grouped = {}
+    for r in range(len(rows) + 1):
+        for c in range(len(columns) + 1):
+            keys = [f'r{i}' for i in range(r)] + [f'c{i}' for i in range(c)]
+            grouped[(r, c)] = _grouping_set(frame, finest, keys, measures, part_columns)
+    row_keys = sorted({key[:r] for (r, c), (keys, _) in grouped.items() for key in keys})
+    col_keys = sorted({key[r:] for (r, c), (keys, _) in grouped.items() for key in keys})
+    if len(row_keys) * len(col_keys) * len(measures) > MAX_CELLS:
+        raise PivotError(f'Pivot too large ({len(row_keys)} x {len(col_keys)} cells); add filters or fewer dimensions')
+    row_index = {key: i for i, key in enumerate(row_keys)}
+    col_index = {key: i for i, key in enumerate(col_keys)}
+
+    cells = {name: [[None] * len(col_keys) for _ in row_keys] for name, _, _ in measures}
+    for (r, c), (keys, values) in grouped.items():
+        for key, row in zip(keys, values):
+            i, j = row_index[key[:r]], col_index[key[r:]]
+            for (name, _, _), value in zip(measures, row):
+                cells[name][i][j] = _json_number(value)
+
+    def decode(key, prefix):
+        return [labels[f'{prefix}{level}'][code] for level, code in enumerate(key)]
+
+    return {
+        'rows': rows,
+        'columns': columns,
+        'measures': [{'name': name, 'field': field, 'agg': agg} for name, field, agg in measures],
+        'rowKeys': [decode(key, 'r') for key in row_keys],
+        'colKeys': [decode(key, 'c') for key in col_keys],
+        'cells': cells,
+    }
+
+
+def _grouping_set(frame, finest, keys, measures, part_columns):
+    """(group keys as code tuples, rows of measure values) for one prefix of the dimensions"""
+    if frame.empty:
+        return [], []
+    if not keys:
+        # Grand total: a single group
+        finest = finest.assign(_all=0)
+        frame = frame.assign(_all=0)
+        keys = ['_all']
+        total = True
+    else:
+        total = False
+    if part_columns:
+        grouped = finest.groupby(keys, sort=False)
+        combined = pd.DataFrame({key: grouped[key].agg(_COMBINE[part]) for key, (_, part) in part_columns.items()})
+    else:
+        combined = finest.groupby(keys, sort=False).size().to_frame('_size')
+
+    values = pd.DataFrame(index=combined.index)
+    for name, _, agg in measures:
+        if agg == 'mean':
+            count = combined[f'{name}\x00count']
+            values[name] = combined[f'{name}\x00sum'] / count.where(count > 0)
+        elif agg in _COMPOSABLE:
+            values[name] = combined[f'{name}\x00{_COMPOSABLE[agg][0]}']
+        else:
+            values[name] = frame.groupby(keys, sort=False)[name].agg(agg).reindex(combined.index)
+    if total:
+        group_keys = [()]
+    else:
+        group_keys = [key if isinstance(key, tuple) else (key,) for key in combined.index]
+    return group_keys, values.itertuples(index=False, name=None)
+
+
+def spec_key(*parts):
+    """Stable cache key / ETag for a pivot request"""
+    text = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class PivotCache:
+    """Small LRU of computed pivots keyed by spec_key"""
+
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
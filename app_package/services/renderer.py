@@ -0,0 +1,171 @@
+"""Chart images for the Word exports.
+
+fig.to_image() renders through Kaleido, which starts a headless browser in
+the calling process on first use and then renders one figure at a time. The
+ChartRenderer keeps a few worker processes alive instead, each with its own
+warm Kaleido, and renders a report's figures on them in parallel. At most
+``max_pending`` figures wait for a worker; a figure that cannot get a slot in
+time is not rendered and the export shows its data table, as it does when
+rendering fails.
+
+Workers run the entry points in the top-level render_worker module. Spawned
+processes re-run the parent's main script before their task, which would be
+all of app.py, so workers are started with the main module hidden.
+
+PNGs are cached by a hash of the figure spec, the image size and the dataset
+version, so exporting the same charts again costs no rendering.
+"""
+import hashlib
+import importlib.util
+import multiprocessing
+import sys
+import threading
+import types
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import plotly.io as pio
+
+import render_worker
+
+
+# Kaleido is only needed inside the workers; without it no pool is started
+KALEIDO = importlib.util.find_spec('kaleido') is not None
+
+# Seconds a figure waits for a queue slot, and for its image
+QUEUE_TIMEOUT = 10
+RENDER_TIMEOUT = 60
+
+
+# Held while the main module is swapped out (see _submit_without_main)
+_main_lock = threading.Lock()
+
+
+def _submit_without_main(pool, *args):
+    """pool.submit(*args), with any worker process it spawns told there is no main module to re-run"""
+    with _main_lock:
+        main = sys.modules['__main__']
+        # Without a __file__ or __spec__, spawn leaves the child's main module alone
+        sys.modules['__main__'] = types.ModuleType('__main__')
+        try:
+            return pool.submit(*args)
+        finally:
+            sys.modules['__main__'] = main
+
+
+def figure_key(spec, version, width, height, scale):
+    digest = hashlib.sha1(spec.encode('utf-8'))
+    digest.update(f'|{version}|{width}x{height}@{scale}'.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class ChartRenderer:
+    """Pool of long-lived renderer processes plus an LRU of rendered PNGs"""
+
+    def __init__(self, workers=2, max_pending=16, cache_size=256):
+        self.workers = workers
+        self.cache_size = cache_size
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pool = None
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                # spawn: forking a threaded server process is unsafe
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'),
+                                                 initializer=render_worker.warm_up)
+            return self._pool
+
+    def _reset(self, pool):
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, spec, width, height, scale):
+        """Future of the PNG, or None when the queue stays full"""
+        if not self._slots.acquire(timeout=QUEUE_TIMEOUT):
+            print("[RENDER] Renderer queue full; chart left as a data table")
+            return None
+        pool = self._executor()
+        try:
+            future = _submit_without_main(pool, render_worker.render, spec, width, height, scale)
+        except (BrokenProcessPool, RuntimeError):
+            # A worker died; start a fresh pool
+            self._reset(pool)
+            try:
+                future = _submit_without_main(self._executor(), render_worker.render, spec, width, height, scale)
+            except Exception:
+                self._slots.release()
+                raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _cached(self, key):
+        with self._lock:
+            png = self._cache.get(key)
+            if png is not None:
+                self._cache.move_to_end(key)
+            return png
+
+    def _store(self, key, png):
+        with self._lock:
+            self._cache[key] = png
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def render_many(self, figures, version=None, width=800, height=500, scale=2):
+        """PNG bytes per figure, in order; None for a None figure or one that failed to render"""
+        images = [None] * len(figures)
+        if not KALEIDO:
+            if any(fig is not None for fig in figures):
+                print("Chart image generation failed: kaleido is not installed")
+            return images
+        pending = {}
+        for i, fig in enumerate(figures):
+            if fig is None:
+                continue
+            spec = fig if isinstance(fig, str) else pio.to_json(fig)
+            key = figure_key(spec, version, width, height, scale)
+            png = self._cached(key)
+            if png is not None:
+                images[i] = png
+            elif key in pending:
+                pending[key][1].append(i)
+            else:
+                try:
+                    future = self._submit(spec, width, height, scale)
+                except Exception as e:
+                    print(f"Chart image generation failed: {str(e)}")
+                    continue
+                if future is not None:
+                    pending[key] = (future, [i])
+
+        for key, (future, positions) in pending.items():
+            try:
+                png = future.result(timeout=RENDER_TIMEOUT)
+            except Exception as e:
+                print(f"Chart image generation failed: {str(e)}")
+                continue
+            self._store(key, png)
+            for i in positions:
+                images[i] = png
+        return images
+
+    def render(self, fig, version=None, width=800, height=500, scale=2):
+        return self.render_many([fig], version, width, height, scale)[0]
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,297 @@
+"""Pre-aggregated MH and KAR/ZARAR rollup cubes with drill-down by period.
+
+The base cube holds additive totals per person x project x scope x company x
+record date (the week the record was booked for). Week, month, quarter and
+year cubes are derived from it on first use, so monthly dashboards, trend
+lines and drill-down queries group a few thousand cube cells instead of
+re-reading and re-parsing the raw records.
+
+Every measure field is kept as four additive parts: sum and count of the
+values present, and sum and count of the positive values. That is enough for
+sum, count and avg (optionally over positive values only), the aggregations
+``aggregation.aggregate`` answers for the dashboards, and it makes record
+writes cheap to fold in: the changed records are turned into cube cells and
+added, or subtracted for removals.
+"""
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+from app_package.services.aggregation import (
+    AggregationError, date_values, dimension_values, measure_values, parse_period,
+)
+from app_package.services.snapshot import build_frame
+
+
+class RollupError(AggregationError):
+    """Raised for a rollup query the cubes cannot answer"""
+
+
+# Dimensions of the base cube (dashboard dimension keys)
+GRAIN = ('nameSurname', 'projects', 'scope', 'company')
+
+# Measure fields kept in the cubes (see aggregation.MEASURE_FIELDS)
+FIELDS = ('records', 'totalMH', 'cost', 'hakedis', 'recordedKarZarar', 'karZarar')
+
+AGGREGATES = ('sum', 'count', 'avg')
+
+# Period levels, finest first; drilling down moves one step left
+LEVELS = ('week', 'month', 'quarter', 'year')
+
+_PARTS = ('sum', 'count', 'psum', 'pcount')
+_MEASURE_COLUMNS = [f'{field}.{part}' for field in FIELDS for part in _PARTS]
+_BASE_KEYS = list(GRAIN) + ['date']
+
+_PERIOD_PATTERNS = (
+    ('year', re.compile(r'^(\d{4})$')),
+    ('quarter', re.compile(r'^(\d{4})-Q([1-4])$')),
+    ('month', re.compile(r'^(\d{4})-(\d{2})$')),
+    ('week', re.compile(r'^(\d{4})-W(\d{2})$')),
+)
+
+
+def drill_down(level):
+    """Next finer period level, or None below week"""
+    index = LEVELS.index(level)
+    return LEVELS[index - 1] if index else None
+
+
+def roll_up(level):
+    """Next coarser period level, or None above year"""
+    index = LEVELS.index(level)
+    return LEVELS[index + 1] if index + 1 < len(LEVELS) else None
+
+
+def _cells(df):
+    """One row per record: grain labels, record date and the additive measure parts"""
+    columns = {}
+    for dim in GRAIN:
+        labels = dimension_values(df, dim)
+        columns[dim] = labels if labels is not None else np.full(len(df), None, dtype=object)
+    columns['date'] = date_values(df)
+    for field in FIELDS:
+        values = measure_values(df, field)
+        present, positive = ~np.isnan(values), values > 0
+        columns[f'{field}.sum'] = np.where(present, values, 0.0)
+        columns[f'{field}.count'] = present.astype(float)
+        columns[f'{field}.psum'] = np.where(positive, values, 0.0)
+        columns[f'{field}.pcount'] = positive.astype(float)
+    return pd.DataFrame(columns, columns=_BASE_KEYS + _MEASURE_COLUMNS)
+
+
+def _collapse(cells, keys):
+    return cells.groupby(keys, dropna=False, sort=False)[_MEASURE_COLUMNS].sum().reset_index()
+
+
+def _period_labels(dates, level):
+    """Period label per date (None for NaT)"""
+    stamps = pd.DatetimeIndex(dates)
+    labels = np.full(len(stamps), None, dtype=object)
+    valid = ~stamps.isna()
+    if level == 'week':
+        iso = stamps[valid].isocalendar()
+        labels[valid] = [f'{y}-W{w:02d}' for y, w in zip(iso['year'], iso['week'])]
+    elif level == 'month':
+        labels[valid] = stamps[valid].strftime('%Y-%m')
+    elif level == 'quarter':
+        labels[valid] = [f'{y}-Q{q}' for y, q in zip(stamps[valid].year, stamps[valid].quarter)]
+    else:
+        labels[valid] = stamps[valid].year.astype(str)
+    return labels
+
+
+def _coarser_label(month_label, level):
+    """Quarter or year label of a month label (2025-07 -> 2025-Q3 or 2025)"""
+    if month_label is None:
+        return None
+    if level == 'quarter':
+        return f'{month_label[:4]}-Q{(int(month_label[5:7]) - 1) // 3 + 1}'
+    return month_label[:4]
+
+
+def _parse_dimension(spec):
+    if isinstance(spec, str):
+        name, field, default = spec, spec, None
+    elif isinstance(spec, dict) and spec.get('field'):
+        name, field, default = spec.get('as', spec['field']), spec['field'], spec.get('default')
+    else:
+        raise RollupError(f'Invalid dimension: {spec!r}')
+    if field not in GRAIN:
+        raise RollupError(f'Dimension "{field}" is not in the rollup grain ({", ".join(GRAIN)})')
+    return name, field, default
+
+
+def _parse_measure(name, spec):
+    if not isinstance(spec, dict) or spec.get('field') not in FIELDS:
+        raise RollupError(f'Measure "{name}" needs a field from {", ".join(FIELDS)}')
+    agg = spec.get('agg', 'sum')
+    if agg not in AGGREGATES:
+        raise RollupError(f'Measure "{name}": rollups support {", ".join(AGGREGATES)}, not "{agg}"')
+    return spec['field'], agg, bool(spec.get('positive'))
+
+
+def _parse_within(label):
+    """(level, year, months) of a period label such as 2025, 2025-Q3, 2025-07 or 2025-W28"""
+    for level, pattern in _PERIOD_PATTERNS:
+        match = pattern.match(str(label))
+        if match:
+            year = int(match.group(1))
+            if level == 'year':
+                return level, year, None
+            number = int(match.group(2))
+            if level == 'quarter':
+                return level, year, list(range(3 * number - 2, 3 * number + 1))
+            if level == 'month':
+                if not 1 <= number <= 12:
+                    break
+                return level, year, [number]
+            return level, year, None
+    raise RollupError(f'Invalid period "{label}"; use 2025, 2025-Q3, 2025-07 or 2025-W28')
+
+
+class RollupCube:
+    """Rollup cubes of one dataset version"""
+
+    stale = False
+
+    def __init__(self, version, base):
+        self.version = version
+        self.base = base
+        self._levels = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, snapshot):
+        return cls(snapshot.version, _collapse(_cells(snapshot.frame), _BASE_KEYS))
+
+    def apply(self, version, added=(), removed=()):
+        """Fold record dicts written since self.version into the base cube"""
+        parts = [self.base]
+        if added:
+            parts.append(_cells(build_frame(list(added))))
+        if removed:
+            cells = _cells(build_frame(list(removed)))
+            cells[_MEASURE_COLUMNS] *= -1
+            parts.append(cells)
+        base = _collapse(pd.concat(parts, ignore_index=True), _BASE_KEYS)
+        # Cells whose records were all removed
+        base = base[base['records.count'] > 0.5].reset_index(drop=True)
+        with self._lock:
+            self.base, self._levels, self.version = base, {}, version
+
+    def level(self, level):
+        """Cube at a period level: grain, period label, calendar year and month (month for week/month only)"""
+        cube = self._levels.get(level)
+        if cube is None:
+            with self._lock:
+                cube = self._levels.get(level)
+                if cube is None:
+                    cube = self._derive(level)
+                    self._levels[level] = cube
+        return cube
+
+    def _derive(self, level):
+        base = self.base
+        dates = pd.DatetimeIndex(base['date'])
+        cells = base[list(GRAIN) + _MEASURE_COLUMNS].copy()
+        cells['period'] = _period_labels(dates, level)
+        cells['year'] = dates.year
+        keys = list(GRAIN) + ['period', 'year']
+        if level in ('week', 'month'):
+            cells['month'] = dates.month
+            keys.append('month')
+        return _collapse(cells, keys)
+
+    def query(self, dimensions=(), level=None, measures=None, year=None, month=None, within=None,
+              where=None, drop_empty=False):
+        """Rows like aggregation.aggregate: one key per dimension, 'period' for the level, one per measure.
+
+        year/month restrict to records dated in that calendar year/month, within
+        to one period (drill-down: the quarters within '2025', the weeks within
+        '2025-07'), and where maps grain dimensions to the labels to keep.
+        """
+        year = parse_period(year, 'year', 1900, 2999)
+        month = parse_period(month, 'month', 1, 12)
+        if level is not None and level not in LEVELS:
+            raise RollupError(f'Unknown level "{level}"; use one of {", ".join(LEVELS)}')
+        dimensions = [_parse_dimension(d) for d in dimensions]
+        measures = {name: _parse_measure(name, spec) for name, spec in (measures or {}).items()}
+        if not measures:
+            raise RollupError('A rollup query needs at least one measure')
+
+        months, period = None, None
+        if within is not None:
+            within_level, within_year, months = _parse_within(within)
+            if level is not None and LEVELS.index(within_level) < LEVELS.index(level):
+                raise RollupError(f'Cannot show {level}s within the {within_level} {within}')
+            if year is not None and year != within_year:
+                raise RollupError(f'Period {within} is outside year {year}')
+            year = within_year
+            if within_level == 'week':
+                period = within
+        if month is not None:
+            months = [month] if months is None or month in months else []
+
+        # Quarter, year and overall totals restricted to months come from the month cube
+        if months is not None and level not in ('week', 'month'):
+            cube = self.level('month')
+            relabel = level
+        else:
+            cube = self.level(level or 'year')
+            relabel = None
+
+        keep = np.ones(len(cube), dtype=bool)
+        if year is not None:
+            keep &= (cube['year'] == year).to_numpy()
+        if months is not None:
+            keep &= cube['month'].isin(months).to_numpy()
+        if period is not None:
+            keep &= (cube['period'] == period).to_numpy()
+        if level is not None:
+            keep &= cube['period'].notna().to_numpy()
+        for dim, labels in (where or {}).items():
+            if dim not in GRAIN:
+                raise RollupError(f'Cannot filter on "{dim}"; rollups filter on {", ".join(GRAIN)}')
+            labels = [labels] if isinstance(labels, str) else list(labels)
+            keep &= cube[dim].isin(labels).to_numpy()
+        cells = cube[keep]
+
+        frame = pd.DataFrame(index=cells.index)
+        for name, field, default in dimensions:
+            values = cells[field]
+            frame[name] = values.fillna(default) if default is not None else values
+        keys = [name for name, _, _ in dimensions]
+        if level is not None:
+            periods = cells['period']
+            if relabel is not None:
+                periods = periods.map(lambda label: _coarser_label(label, relabel))
+            frame['period'] = periods
+            keys.append('period')
+        frame = frame.join(cells[_MEASURE_COLUMNS])
+        if keys:
+            frame = frame.dropna(subset=keys)
+            totals = frame.groupby(keys, sort=False)[_MEASURE_COLUMNS].sum().reset_index()
+        else:
+            totals = frame[_MEASURE_COLUMNS].sum().to_frame().T
+
+        rows = []
+        for cell in totals.to_dict('records'):
+            row = {name: cell[name] for name in keys}
+            counts = []
+            for name, (field, agg, positive) in measures.items():
+                total = cell[f'{field}.psum' if positive else f'{field}.sum']
+                count = int(round(cell[f'{field}.pcount' if positive else f'{field}.count']))
+                counts.append(count)
+                if agg == 'sum':
+                    row[name] = float(total)
+                elif agg == 'count':
+                    row[name] = count
+                else:
+                    row[name] = float(total) / count if count else None
+            if drop_empty and not any(counts):
+                continue
+            rows.append(row)
+        rows.sort(key=lambda r: tuple(str(r[name]) for name in keys))
+        return rows
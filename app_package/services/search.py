@@ -0,0 +1,242 @@
+"""Ranked multi-field record search for the records table.
+
+A query is split into terms; every term has to match one of the searchable
+fields (name, Company, Projects, Scope, ID or the record id), either as a
+substring or fuzzily by trigram overlap. Rows are ranked by their mean term
+score, then newest first, and paged with a keyset cursor on (score, id).
+
+On PostgreSQL the search runs against a generated ``search_text`` column with
+a pg_trgm GIN index (``ensure_search_index``, ``compile_search``). Elsewhere
+``NgramIndex`` builds the same kind of trigram index in memory over the
+distinct field values of a dataset snapshot.
+"""
+import base64
+import json
+import threading
+
+import numpy as np
+import pandas as pd
+
+from app_package.services.filters import value_text
+
+
+class SearchError(ValueError):
+    """Raised for an invalid search cursor"""
+
+
+# Record fields matched by the search box, besides personel and the record id
+SEARCH_FIELDS = ('Name Surname', 'Company', 'Projects', 'Scope', 'ID')
+
+# Minimum fuzzy score for a term to count as matched (pg_trgm's word_similarity_threshold)
+MATCH_THRESHOLD = 0.6
+
+# Terms shorter than this only match as substrings
+MIN_FUZZY_LENGTH = 3
+
+MAX_TERMS = 8
+
+
+def normalize(value):
+    """Lower-cased text with collapsed whitespace; None/NaN become ''"""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return ''
+    return ' '.join(value_text(value).lower().split())
+
+
+def parse_query(search):
+    """Distinct normalized terms of a search string"""
+    terms = []
+    for term in normalize(search).split(' '):
+        if term and term not in terms:
+            terms.append(term)
+    return terms[:MAX_TERMS]
+
+
+def trigrams(text):
+    """pg_trgm style trigrams: each word padded with two leading and one trailing blank"""
+    grams = set()
+    for word in text.split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def encode_cursor(score, record_id):
+    payload = json.dumps({'s': round(float(score), 4), 'i': int(record_id)})
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+        return float(payload['s']), int(payload['i'])
+    except (ValueError, KeyError, TypeError, UnicodeError):
+        raise SearchError('Invalid search cursor')
+
+
+_NO_POSTINGS = np.zeros(0, dtype=np.int64)
+
+
+class _FieldIndex:
+    """Trigram postings over the distinct normalized values of one column"""
+
+    def __init__(self, series):
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        normalized = [normalize(v) for v in uniques]
+        norm_codes, self.values = pd.factorize(pd.Series(normalized, dtype=object))
+        self.codes = np.where(codes >= 0, norm_codes[np.maximum(codes, 0)], -1)
+        postings = {}
+        for code, text in enumerate(self.values):
+            for gram in trigrams(text):
+                postings.setdefault(gram, []).append(code)
+        self.postings = {gram: np.asarray(members, dtype=np.int64) for gram, members in postings.items()}
+
+    def scores(self, term):
+        """Score of term for every row: 1.0 for substrings, else the share of its trigrams found"""
+        value_scores = np.zeros(len(self.values) + 1)
+        if len(term) >= MIN_FUZZY_LENGTH:
+            grams = trigrams(term)
+            for gram in grams:
+                value_scores[self.postings.get(gram, _NO_POSTINGS)] += 1
+            value_scores /= len(grams)
+        for code, text in enumerate(self.values):
+            if term in text:
+                value_scores[code] = 1.0
+        # Code -1 (missing) indexes the trailing zero
+        return value_scores[self.codes]
+
+
+class NgramIndex:
+    """In-memory trigram index over the searchable fields of one snapshot"""
+
+    def __init__(self, snapshot):
+        self.version = snapshot.version
+        self.record_ids = snapshot.record_ids
+        frame = snapshot.frame
+        columns = [frame[col] for col in SEARCH_FIELDS if col in frame.columns]
+        columns.append(pd.Series(snapshot.personel, dtype=object))
+        self.fields = [_FieldIndex(series) for series in columns]
+        self._id_text = None
+
+    def _id_scores(self, term):
+        if not term.isdigit():
+            return np.zeros(len(self.record_ids))
+        if self._id_text is None:
+            self._id_text = self.record_ids.astype(str).astype(object)
+        return np.fromiter((term in text for text in self._id_text), dtype=float, count=len(self._id_text))
+
+    def search(self, terms, rows=None):
+        """(positions, scores) of matching rows, best first; rows optionally restricts to a boolean mask"""
+        total = np.zeros(len(self.record_ids))
+        matched = np.ones(len(self.record_ids), dtype=bool) if rows is None else np.asarray(rows, dtype=bool).copy()
+        for term in terms:
+            best = self._id_scores(term)
+            for field in self.fields:
+                best = np.maximum(best, field.scores(term))
+            matched &= best >= MATCH_THRESHOLD
+            total += best
+        positions = np.flatnonzero(matched)
+        scores = np.round(total[positions] / max(len(terms), 1), 4)
+        order = np.lexsort((-self.record_ids[positions], -scores))
+        return positions[order], scores[order]
+
+    def page(self, terms, limit, offset=0, after=None, rows=None):
+        """One page of (record_ids, scores) plus the total match count"""
+        positions, scores = self.search(terms, rows)
+        ids = self.record_ids[positions]
+        total = len(ids)
+        if after is not None:
+            after_score, after_id = after
+            keep = (scores < after_score) | ((scores == after_score) & (ids < after_id))
+            ids, scores = ids[keep], scores[keep]
+        return ids[offset:offset + limit].tolist(), scores[offset:offset + limit].tolist(), total
+
+
+class NgramIndexCache:
+    """Keeps the index of the latest snapshot; rebuilt once per dataset version"""
+
+    def __init__(self):
+        self._index = None
+        self._lock = threading.Lock()
+
+    def get(self, snapshot):
+        index = self._index
+        if index is not None and index.version == snapshot.version:
+            return index
+        with self._lock:
+            index = self._index
+            if index is None or index.version != snapshot.version:
+                index = NgramIndex(snapshot)
+                self._index = index
+            return index
+
+
+# --- PostgreSQL (pg_trgm) ---
+
+def _search_text_sql():
+    parts = ["coalesce(personel, '')"]
+    parts += [f"coalesce((data::json) ->> '{field}', '')" for field in SEARCH_FIELDS]
+    parts.append('id::text')
+    return 'lower(' + " || ' ' || ".join(parts) + ')'
+
+
+def search_index_ddl(table='database_record'):
+    """Statements creating the generated search column and its trigram index"""
+    return [
+        'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+        f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_text text '
+        f'GENERATED ALWAYS AS ({_search_text_sql()}) STORED',
+        f'CREATE INDEX IF NOT EXISTS ix_{table}_search_trgm ON {table} USING gin (search_text gin_trgm_ops)',
+    ]
+
+
+def ensure_search_index(connection, table='database_record'):
+    """Create the trigram search index on PostgreSQL; returns False where it is unavailable"""
+    from sqlalchemy import text
+
+    if connection.dialect.name != 'postgresql':
+        return False
+    try:
+        for statement in search_index_ddl(table):
+            connection.execute(text(statement))
+        return True
+    except Exception as e:
+        print(f"[SEARCH] Trigram index unavailable, using in-memory search: {e}")
+        return False
+
+
+def _like_pattern(term):
+    escaped = term.replace('!', '!!').replace('%', '!%').replace('_', '!_')
+    return f'%{escaped}%'
+
+
+def compile_search(terms, personel=None, after=None, table='database_record'):
+    """(page_sql, count_sql, params) for a ranked search on PostgreSQL.
+
+    page_sql selects (id, score) and takes :limit and :offset.
+    """
+    params = {}
+    conditions, scores = [], []
+    for i, term in enumerate(terms):
+        params[f't{i}'] = term
+        params[f'l{i}'] = _like_pattern(term)
+        like = f"search_text LIKE :l{i} ESCAPE '!'"
+        if len(term) >= MIN_FUZZY_LENGTH:
+            conditions.append(f'({like} OR :t{i} <% search_text)')
+            scores.append(f'CASE WHEN {like} THEN 1.0 ELSE word_similarity(:t{i}, search_text) END')
+        else:
+            conditions.append(like)
+            scores.append('1.0')
+    if personel is not None:
+        params['personel'] = personel
+        conditions.append('personel = :personel')
+    where = ' AND '.join(conditions) or 'TRUE'
+    score = f"round((({' + '.join(scores) or '0'}) / {max(len(terms), 1)})::numeric, 4)"
+
+    page_sql = f'SELECT id, score FROM (SELECT id, {score} AS score FROM {table} WHERE {where}) ranked'
+    if after is not None:
+        params['after_score'], params['after_id'] = after
+        page_sql += ' WHERE score < :after_score OR (score = :after_score AND id < :after_id)'
+    page_sql += ' ORDER BY score DESC, id DESC LIMIT :limit OFFSET :offset'
+    count_sql = f'SELECT count(*) FROM {table} WHERE {where}'
+    return page_sql, count_sql, params
@@ -0,0 +1,276 @@
+"""Approximate distinct counts and heavy hitters kept as sketches over the dataset.
+
+Exact distinct counts and top-N slices are full scans of the records. The
+sketch store keeps, per record column, a HyperLogLog distinct-count sketch
+and a Count-Min sketch with a small candidate set of heavy hitters, plus
+positive-TOTAL-MH weighted heavy hitters per dashboard dimension. Queries are
+answered from the sketches in constant time, each with its error bound.
+
+The store is built once from a snapshot (over distinct values, so the cost is
+one factorize per column) and then updated in place by single-record writes.
+Count-Min handles removals by subtracting; HyperLogLog cannot, so after
+removals distinct counts are upper bounds, and once removals exceed
+``REBUILD_RATIO`` of the rows the store is rebuilt from the next snapshot.
+"""
+import hashlib
+import math
+import threading
+
+import numpy as np
+import pandas as pd
+
+from app_package.services.aggregation import DIMENSIONS, dimension_values, measure_values
+from app_package.services.filters import value_text
+from app_package.services.snapshot import build_frame
+
+
+# HyperLogLog registers are 2**HLL_PRECISION (relative standard error 1.04 / sqrt(registers))
+HLL_PRECISION = 12
+
+# Count-Min sketch shape: overestimate at most e / width of the total, with probability 1 - e**-depth
+CMS_WIDTH = 2048
+CMS_DEPTH = 5
+
+# Heavy-hitter candidates tracked per sketch
+CANDIDATES = 64
+
+# Share of removed rows after which the store is rebuilt from a fresh snapshot
+REBUILD_RATIO = 0.05
+
+# Measure used for the weighted dimension sketches (positive values only, like the MH pies)
+WEIGHT_FIELD = 'totalMH'
+
+_MASK64 = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+
+def hash_value(value):
+    """Stable 64-bit hash of a cell value; numbers hash like their text (158.0 like 158)"""
+    digest = hashlib.blake2b(value_text(value).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+def _hashes(values):
+    return np.fromiter((hash_value(v) for v in values), dtype=np.uint64, count=len(values))
+
+
+class HyperLogLog:
+    """Distinct-count sketch (Flajolet et al.) with linear counting for small cardinalities"""
+
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add(self, hashes):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        if not len(hashes):
+            return
+        bits = 64 - self.precision
+        index = (hashes >> np.uint64(bits)).astype(np.int64)
+        rest = hashes & np.uint64((1 << bits) - 1)
+        # Rank = position of the lowest set bit of the remaining bits (bits + 1 when they are all zero)
+        lowest = rest & ((~rest + np.uint64(1)) & _MASK64)
+        rank = np.where(rest == 0, bits + 1, np.log2(np.maximum(lowest, 1).astype(float)).astype(np.int64) + 1)
+        np.maximum.at(self.registers, index, rank.astype(np.uint8))
+
+    @property
+    def relative_error(self):
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            return m * math.log(m / zeros)
+        return float(raw)
+
+
+class CountMinSketch:
+    """Frequency sketch; estimates never undercount while all true counts are non-negative"""
+
+    def __init__(self, width=CMS_WIDTH, depth=CMS_DEPTH):
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=float)
+        self.total = 0.0
+
+    def _columns(self, hashes):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        low = (hashes & np.uint64(0xFFFFFFFF)).astype(np.int64)
+        high = (hashes >> np.uint64(32)).astype(np.int64)
+        return [(low + row * high) % self.width for row in range(self.depth)]
+
+    def add(self, hashes, weights):
+        weights = np.asarray(weights, dtype=float)
+        for row, columns in enumerate(self._columns(hashes)):
+            np.add.at(self.table[row], columns, weights)
+        self.total += float(weights.sum())
+
+    def estimate(self, hashes):
+        columns = self._columns(hashes)
+        return np.min([self.table[row, cols] for row, cols in enumerate(columns)], axis=0)
+
+    @property
+    def epsilon(self):
+        return math.e / self.width
+
+    @property
+    def confidence(self):
+        return 1 - math.exp(-self.depth)
+
+    @property
+    def error_bound(self):
+        """Largest overestimate of any single value (holds with probability confidence)"""
+        return self.epsilon * max(self.total, 0.0)
+
+
+class HeavyHitters:
+    """Count-Min sketch plus the CANDIDATES values with the largest estimates"""
+
+    def __init__(self, capacity=CANDIDATES):
+        self.capacity = capacity
+        self.sketch = CountMinSketch()
+        self.candidates = {}
+
+    def add(self, values, weights):
+        """Add distinct values with their summed weights (negative weights remove)"""
+        if not len(values):
+            return
+        hashes = _hashes(values)
+        self.sketch.add(hashes, weights)
+        newcomers = [(h, v) for h, v, w in zip(hashes.tolist(), values, weights) if w > 0 and h not in self.candidates]
+        if not newcomers:
+            return
+        if len(self.candidates) + len(newcomers) <= self.capacity:
+            self.candidates.update(newcomers)
+            return
+        # Keep the capacity values with the largest estimates among candidates and newcomers
+        pool = dict(self.candidates)
+        pool.update(newcomers)
+        keys = list(pool)
+        estimates = self.sketch.estimate(np.asarray(keys, dtype=np.uint64))
+        keep = np.argsort(-estimates, kind='stable')[:self.capacity]
+        self.candidates = {keys[i]: pool[keys[i]] for i in keep}
+
+    def top(self, limit=10):
+        """[(value, estimate)] of the largest candidates, largest first"""
+        if not self.candidates:
+            return []
+        keys = list(self.candidates)
+        estimates = self.sketch.estimate(np.asarray(keys, dtype=np.uint64))
+        order = np.argsort(-estimates, kind='stable')[:limit]
+        return [(self.candidates[keys[i]], float(estimates[i])) for i in order if estimates[i] > 0]
+
+    def result(self, limit=10):
+        """Top values with their estimate range and the sketch's error bound"""
+        bound = self.sketch.error_bound
+        return {
+            'items': [
+                {'value': value_text(value), 'estimate': estimate, 'low': max(estimate - bound, 0.0), 'high': estimate}
+                for value, estimate in self.top(limit)
+            ],
+            'total': self.sketch.total,
+            'errorBound': bound,
+            'confidence': self.sketch.confidence,
+        }
+
+
+class _ColumnSketch:
+    def __init__(self):
+        self.distinct = HyperLogLog()
+        self.frequent = HeavyHitters()
+
+
+def _value_counts(series):
+    """(distinct values, row counts) of a column, missing values left out"""
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+    return list(uniques), counts
+
+
+def _weighted_counts(labels, weights):
+    """(distinct labels, summed weights) over rows with a label and a positive weight"""
+    keep = pd.notna(labels) & (weights > 0)
+    if not keep.any():
+        return [], np.zeros(0)
+    codes, uniques = pd.factorize(pd.Series(labels[keep], dtype=object))
+    return list(uniques), np.bincount(codes, weights=weights[keep], minlength=len(uniques))
+
+
+class SketchStore:
+    """Sketches of one dataset version, updated in place by record writes"""
+
+    def __init__(self, version):
+        self.version = version
+        self.rows = 0
+        self.removed = 0
+        self.columns = {}
+        self.dimensions = {key: HeavyHitters() for key in DIMENSIONS}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, snapshot):
+        store = cls(snapshot.version)
+        store._update(snapshot.frame, 1)
+        return store
+
+    def _update(self, df, sign):
+        if df.empty:
+            return
+        for col in df.columns:
+            values, counts = _value_counts(df[col])
+            sketch = self.columns.get(col)
+            if sketch is None:
+                sketch = self.columns[col] = _ColumnSketch()
+            if sign > 0:
+                sketch.distinct.add(_hashes(values))
+            sketch.frequent.add(values, sign * counts)
+        weights = measure_values(df, WEIGHT_FIELD)
+        for key, sketch in self.dimensions.items():
+            labels = dimension_values(df, key)
+            if labels is not None:
+                values, sums = _weighted_counts(labels, np.nan_to_num(weights))
+                sketch.add(values, sign * sums)
+        self.rows += sign * len(df)
+
+    def apply(self, version, added=(), removed=()):
+        """Fold record dicts written since self.version into the sketches; version is the new dataset version"""
+        with self._lock:
+            if removed:
+                self._update(build_frame(list(removed)), -1)
+                self.removed += len(removed)
+            if added:
+                self._update(build_frame(list(added)), 1)
+            self.version = version
+
+    @property
+    def stale(self):
+        return self.removed > REBUILD_RATIO * max(self.rows, 1)
+
+    def distinct_count(self, col):
+        """{estimate, low, high, relativeError, upperBound} for a column, or None if it is not sketched"""
+        sketch = self.columns.get(col)
+        if sketch is None:
+            return None
+        estimate = sketch.distinct.estimate()
+        error = sketch.distinct.relative_error
+        return {
+            'estimate': round(estimate),
+            # Two standard errors: the true count is in range about 95% of the time
+            'low': math.floor(estimate * (1 - 2 * error)),
+            'high': math.ceil(estimate * (1 + 2 * error)),
+            'relativeError': error,
+            # HyperLogLog keeps values whose rows were removed, so it can only overcount
+            'upperBound': self.removed > 0,
+        }
+
+    def top_values(self, col, limit=10):
+        """Most frequent values of a column with their row-count estimates, or None if it is not sketched"""
+        sketch = self.columns.get(col)
+        return None if sketch is None else sketch.frequent.result(limit)
+
+    def top_weighted(self, dimension, limit=10):
+        """Dimension labels with the largest positive TOTAL MH, or None for an unknown dimension"""
+        sketch = self.dimensions.get(dimension)
+        return None if sketch is None else sketch.result(limit)
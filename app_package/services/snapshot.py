@@ -0,0 +1,232 @@
+"""In-memory snapshot of the records table, rebuilt only when the dataset version changes.
+
+Every analytics endpoint used to re-read and re-parse all JSON records on each
+request. The snapshot holds the parsed DataFrame together with the database id
+and personel of each row, so per-user views are a boolean selection instead of
+another query.
+
+Repetitive text columns are dictionary-encoded as pandas Categoricals and
+columns holding JSON numbers are stored as nullable Int64 (whole numbers only)
+or float64, so the resident frame is a fraction of the size of the object
+frame and filters, group-bys and distinct value listings work on integer
+codes. ``decode_frame`` turns a selection back into plain object columns, with
+the ints and None the records hold, for code that writes into the frame.
+"""
+import json
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from app_package.services.numeric import parse_series
+
+
+# Text columns with at most this share of distinct values are dictionary-encoded
+CATEGORY_MAX_RATIO = 0.5
+
+_NUMERIC_KINDS = ('integer', 'floating', 'mixed-integer-float')
+
+
+class DatasetSnapshot:
+    """Parsed records for one dataset version"""
+
+    def __init__(self, frame, version, record_ids, personel):
+        self.frame = frame
+        self.version = version
+        self.record_ids = record_ids
+        self.personel = personel
+        self.built_at = datetime.now()
+        # Parsed numeric columns and their parse reports, filled on first use
+        self._numeric = {}
+        self._numeric_lock = threading.Lock()
+        # Frames derived from this one (see derived)
+        self._derived = {}
+        self._derived_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.frame)
+
+    def rows_for_user(self, user_filter):
+        """Boolean mask of rows owned by user_filter (matches DatabaseRecord.personel exactly)"""
+        return self.personel == user_filter
+
+    def view(self, user_filter=None):
+        """The snapshot frame, restricted to one user's records if user_filter is set"""
+        if user_filter is None:
+            return self.frame
+        return self.frame[self.rows_for_user(user_filter)]
+
+    def _parsed(self, col):
+        parsed = self._numeric.get(col)
+        if parsed is None:
+            with self._numeric_lock:
+                parsed = self._numeric.get(col)
+                if parsed is None:
+                    parsed = parse_series(self.frame[col])
+                    self._numeric[col] = parsed
+        return parsed
+
+    def numeric(self, col):
+        """Column col as cleaned float64 values aligned with frame; parsed once per snapshot"""
+        return self._parsed(col)[0]
+
+    def derived(self, name, build):
+        """build(frame), computed once per snapshot and shared by every caller under name"""
+        value = self._derived.get(name)
+        if value is None:
+            with self._derived_lock:
+                value = self._derived.get(name)
+                if value is None:
+                    value = build(self.frame)
+                    self._derived[name] = value
+        return value
+
+    def numeric_report(self, columns=None):
+        """{column: {parsed, blank, failed, examples}} for the given (default: all) columns"""
+        columns = self.frame.columns if columns is None else [c for c in columns if c in self.frame.columns]
+        return {col: self._parsed(col)[1] for col in columns}
+
+
+def build_frame(records):
+    """Build the working DataFrame from parsed record dicts"""
+    df = pd.DataFrame(records, dtype=object)
+
+    # Ensure date columns stay as strings (don't let pandas auto-convert)
+    for col in df.columns:
+        if 'week' in str(col).lower() or 'month' in str(col).lower() or 'date' in str(col).lower():
+            df[col] = df[col].astype(str)
+
+    # Ensure PERSONEL column exists for filtering but don't expose it
+    if 'Name Surname' in df.columns and 'PERSONEL' not in df.columns:
+        df['PERSONEL'] = df['Name Surname']
+    elif 'PERSONEL' in df.columns and 'Name Surname' not in df.columns:
+        # If only PERSONEL exists, create Name Surname
+        df['Name Surname'] = df['PERSONEL']
+    return df
+
+
+def encode_frame(df):
+    """Store JSON-number columns as Int64 or float64 and low-cardinality text columns as Categoricals"""
+    converted = {}
+    for col in df.columns:
+        series = df[col]
+        kind = pd.api.types.infer_dtype(series, skipna=True)
+        if kind == 'integer':
+            # Nullable, so an ID column with gaps still reads back as 905100 rather than 905100.0
+            converted[col] = series.astype('Int64')
+        elif kind in _NUMERIC_KINDS:
+            converted[col] = series.astype('float64')
+        elif kind == 'string' and series.nunique(dropna=True) <= CATEGORY_MAX_RATIO * len(series):
+            converted[col] = series.astype('category')
+    # Record keys are JSON object keys, so always strings
+    return df.assign(**converted) if converted else df
+
+
+def decode_frame(df):
+    """Copy of df with Categorical and Int64 columns turned back into object columns"""
+    encoded = [col for col in df.columns if isinstance(df[col].dtype, (pd.CategoricalDtype, pd.Int64Dtype))]
+    if not encoded:
+        return df.copy()
+    # Missing integers go back to None, as in the record dicts, rather than pd.NA
+    return df.assign(**{col: df[col].astype(object).where(df[col].notna(), None) for col in encoded})
+
+
+def build_snapshot(rows, version):
+    """Build a snapshot from (id, personel, data_json) rows"""
+    records, ids, personel = [], [], []
+    for record_id, record_personel, data in rows:
+        try:
+            records.append(json.loads(data))
+        except (TypeError, ValueError):
+            continue
+        ids.append(record_id)
+        personel.append(record_personel)
+
+    frame = encode_frame(build_frame(records)) if records else pd.DataFrame()
+    return DatasetSnapshot(
+        frame,
+        version,
+        np.asarray(ids, dtype=np.int64),
+        np.asarray(personel, dtype=object),
+    )
+
+
+class SnapshotCache:
+    """Holds the latest snapshot; concurrent requests for a stale version wait for one rebuild"""
+
+    def __init__(self):
+        self._snapshot = None
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @property
+    def generation(self):
+        """Local counter bumped by invalidate(); part of the dataset version"""
+        return self._generation
+
+    def get(self, version, load_rows):
+        """Return the snapshot for version, building it from load_rows() if needed"""
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == version:
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.version != version:
+                snapshot = build_snapshot(load_rows(), version)
+                self._snapshot = snapshot
+            return snapshot
+
+    def peek(self):
+        return self._snapshot
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+            self._generation += 1
+
+
+class DerivedCache:
+    """Keeps a structure derived from the latest snapshot and folds single-record writes into it.
+
+    build(snapshot) creates the structure; it has a ``version``, an
+    ``apply(version, added, removed)`` method taking record dicts and a
+    ``stale`` flag for when incremental updates have degraded it.
+    """
+
+    def __init__(self, build):
+        self._build = build
+        self._value = None
+        self._lock = threading.Lock()
+
+    def get(self, version, load_snapshot):
+        """The structure for version, built from load_snapshot() when missing or outdated"""
+        value = self._value
+        if value is not None and value.version == version:
+            return value
+        with self._lock:
+            value = self._value
+            if value is None or value.version != version:
+                value = self._build(load_snapshot())
+                self._value = value
+            return value
+
+    def apply(self, version_before, version_after, added=(), removed=()):
+        """Fold a write that moved the dataset from version_before to version_after.
+
+        A structure for another version (a missed write) is dropped and rebuilt on next use.
+        """
+        with self._lock:
+            value = self._value
+            if value is None:
+                return
+            if value.version != version_before:
+                self._value = None
+                return
+            value.apply(version_after, added, removed)
+            if value.stale:
+                self._value = None
+
+    def invalidate(self):
+        with self._lock:
+            self._value = None
@@ -0,0 +1,325 @@
+"""Constant-memory xlsx export.
+
+pandas' ExcelWriter holds every cell of the workbook in memory until it
+saves, on top of the DataFrame it writes. Here xlsxwriter runs in
+constant_memory mode, which flushes each row to a temporary file as soon as
+the next row starts, and rows come from a generator that converts the frame
+a block of rows at a time. Memory stays flat at any row count; the workbook
+goes to a file the caller streams.
+
+Cells are converted the way DataFrame.to_excel converts them (missing values
+blank, infinities as 'inf', numpy scalars as Python numbers, dates with a date
+format, anything else as text), so the files match a to_excel export cell
+for cell.
+
+Reading goes the same way: SheetChunks walks a sheet with openpyxl's
+read_only row iterator (pyxlsb for .xlsb) and hands out DataFrames of a
+block of rows, so fill_sheet can read, transform and write a workbook of any
+size holding one block at a time.
+"""
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import openpyxl
+import pandas as pd
+import xlsxwriter
+from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+from pandas.io.parsers import TextParser
+
+
+# Rows converted per block
+CHUNK_ROWS = 10000
+
+# Number formats DataFrame.to_excel gives date cells
+DATETIME_FORMAT = 'YYYY-MM-DD HH:MM:SS'
+DATE_FORMAT = 'YYYY-MM-DD'
+
+_PLAIN = (str, int, float, bool)
+
+
+def open_workbook(target):
+    """xlsxwriter Workbook writing to target (a path or binary file) in constant_memory mode; rows go in order"""
+    return xlsxwriter.Workbook(target, {'constant_memory': True})
+
+
+def excel_value(value):
+    """Cell value of one frame value, as DataFrame.to_excel writes it"""
+    if value is None or (pd.api.types.is_scalar(value) and pd.isna(value)):
+        return ''
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, (float, np.floating)):
+        if np.isinf(value):
+            return 'inf' if value > 0 else '-inf'
+        return float(value)
+    if isinstance(value, (datetime, date, timedelta)):
+        return value
+    return str(value)
+
+
+def _column_values(series, fill_numeric):
+    """Cell values of one column block; fill_numeric replaces NaN and inf in numeric columns"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Convert each category once and look rows up by code
+        categories = [excel_value(value) for value in series.cat.categories] + ['']
+        return [categories[code] for code in series.cat.codes.to_numpy()]
+    if fill_numeric is not None and pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        if pd.api.types.is_integer_dtype(series):
+            return series.fillna(fill_numeric).to_numpy().tolist()
+        values = series.to_numpy(dtype=float, na_value=np.nan)
+        return np.where(np.isfinite(values), values, fill_numeric).tolist()
+    return [excel_value(value) for value in series.to_numpy(dtype=object)]
+
+
+def frame_rows(df, fill_numeric=None, chunk_rows=CHUNK_ROWS):
+    """Rows of cell values of df, converted a block of rows at a time"""
+    for start in range(0, len(df), chunk_rows):
+        block = df.iloc[start:start + chunk_rows]
+        columns = [_column_values(block.iloc[:, i], fill_numeric) for i in range(block.shape[1])]
+        yield from zip(*columns)
+
+
+def write_rows(workbook, worksheet, header, rows, header_format=None, column_formats=None):
+    """Write a header row then rows, in order; column_formats maps column positions to cell formats"""
+    column_formats = column_formats or {}
+    date_formats = {}
+
+    def date_format(num_format):
+        if num_format not in date_formats:
+            date_formats[num_format] = workbook.add_format({'num_format': num_format})
+        return date_formats[num_format]
+
+    for col_num, name in enumerate(header):
+        worksheet.write(0, col_num, name, header_format)
+    for row_num, row in enumerate(rows, start=1):
+        for col_num, value in enumerate(row):
+            cell_format = column_formats.get(col_num)
+            if cell_format is None and value.__class__ not in _PLAIN:
+                if isinstance(value, datetime):
+                    cell_format = date_format(DATETIME_FORMAT)
+                elif isinstance(value, date):
+                    cell_format = date_format(DATE_FORMAT)
+                elif isinstance(value, timedelta):
+                    value, cell_format = value.total_seconds() / 86400, date_format('0')
+            worksheet.write(row_num, col_num, value, cell_format)
+
+
+def _trim(row):
+    """Row without its trailing empty cells"""
+    row = list(row)
+    while row and row[-1] == '':
+        row.pop()
+    return row
+
+
+def _openpyxl_value(cell):
+    """Cell value as pd.read_excel reads it: blank as '', errors missing, whole numbers as int"""
+    if cell.value is None:
+        return ''
+    if cell.data_type == TYPE_ERROR:
+        return np.nan
+    if cell.data_type == TYPE_NUMERIC:
+        value = int(cell.value)
+        return value if value == cell.value else float(cell.value)
+    return cell.value
+
+
+def _xlsb_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        whole = int(value)
+        return whole if whole == value else value
+    return value
+
+
+def _sheet_rows(path, sheet_name):
+    """Rows of one xlsx or xlsb sheet, trimmed of trailing empty cells, read one row at a time"""
+    if path.lower().endswith('.xlsb'):
+        from pyxlsb import open_workbook as open_xlsb
+
+        with open_xlsb(path) as workbook:
+            with workbook.get_sheet(sheet_name) as sheet:
+                for row in sheet.rows():
+                    yield _trim(_xlsb_value(cell.v) for cell in row)
+        return
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet_name]
+        # Read to the last row actually stored, whatever dimension the sheet claims
+        worksheet.reset_dimensions()
+        for row in worksheet.rows:
+            yield _trim(_openpyxl_value(cell) for cell in row)
+    finally:
+        workbook.close()
+
+
+def _header(row, width):
+    """Column names of a header row, as pd.read_excel names them: 'Unnamed: i' for blanks, duplicates as name.1"""
+    row = list(row) + [''] * (width - len(row))
+    names, seen = [], {}
+    for i, value in enumerate(row):
+        name = f'Unnamed: {i}' if value == '' else value
+        if name in seen:
+            seen[name] += 1
+            name = f'{name}.{seen[name]}'
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+# Block dtypes read_excel parses as numbers together; booleans count as 0 and 1
+_NUMERIC = {np.dtype(bool), np.dtype('int64'), np.dtype('float64')}
+
+
+def _merge_kind(kind, dtype):
+    """Column dtype over two blocks of rows; None is a block with only missing values"""
+    if kind is None or kind == dtype:
+        return dtype
+    if dtype is None:
+        return kind
+    if {kind, dtype} <= _NUMERIC:
+        return np.dtype('float64')
+    return np.dtype(object)
+
+
+def _sheet_dtype(kind, has_missing):
+    """Whole-sheet dtype of a column, as pd.read_excel infers it"""
+    if kind is None:
+        return np.dtype('float64')
+    if has_missing and kind == np.dtype('int64'):
+        return np.dtype('float64')
+    if has_missing and kind == np.dtype(bool):
+        return np.dtype('float64')
+    return kind
+
+
+class SheetChunks:
+    """One sheet of a workbook as DataFrames of up to chunk_rows rows, read one row at a time.
+
+    The frames hold what pd.read_excel would read for those rows: the first
+    row gives the columns, blank cells and NA strings are missing, blank rows
+    inside the sheet are kept and trailing ones dropped, and rows are indexed
+    0, 1, ... across chunks. So that the dtypes do not depend on the chunk
+    size, a first pass over the sheet settles each column's dtype for the
+    whole sheet (float64 for an all-empty column, object where blocks
+    disagree), and every chunk is cast to it. row_count is the number of data
+    rows. Iterate once.
+    """
+
+    def __init__(self, path, sheet_name, chunk_rows=CHUNK_ROWS):
+        self.path = path
+        self.sheet_name = sheet_name
+        self.chunk_rows = chunk_rows
+        if path.lower().endswith('.xls'):
+            # Legacy workbooks (at most 65536 rows) have no streaming reader
+            self._frame = pd.read_excel(path, sheet_name=sheet_name)
+            self.columns = list(self._frame.columns)
+            self.row_count = len(self._frame)
+            return
+        self._frame = None
+        self._scan()
+
+    def _scan(self):
+        """Header, data row count and per-column dtypes of the sheet, in one pass"""
+        rows = _sheet_rows(self.path, self.sheet_name)
+        header = next(rows, [])
+        # Rows are padded to the widest one, as read_excel pads them; columns past a row's end are missing there
+        width, count = len(header), 0
+        kinds, missing = [], []
+        for block, start in self._blocks(rows):
+            width = max([width] + [len(row) for row in block])
+            kinds.extend([None] * (width - len(kinds)))
+            missing.extend([count > 0] * (width - len(missing)))
+            frame = self._parse(block, start, _header(header, width))
+            for i in range(width):
+                values = frame.iloc[:, i]
+                present = values.notna()
+                missing[i] = missing[i] or not present.all()
+                kinds[i] = _merge_kind(kinds[i], values.dtype if present.any() else None)
+            count = start + len(block)
+        self.columns = _header(header, width)
+        self.row_count = count
+        kinds.extend([None] * (width - len(kinds)))
+        missing.extend([True] * (width - len(missing)))
+        self.dtypes = {col: _sheet_dtype(kind, gap) for col, kind, gap in zip(self.columns, kinds, missing)}
+
+    def _blocks(self, rows):
+        """(rows, first row number) blocks of data rows; blank rows are kept unless nothing follows them"""
+        block, blank, start = [], [], 0
+        for row in rows:
+            if not row:
+                blank.append(row)
+                continue
+            for pending in blank + [row]:
+                block.append(pending)
+                if len(block) == self.chunk_rows:
+                    yield block, start
+                    start += len(block)
+                    block = []
+            blank = []
+        if block:
+            yield block, start
+
+    def _parse(self, block, start, columns, dtype=None):
+        width = len(columns)
+        block = [row + [''] * (width - len(row)) for row in block]
+        frame = TextParser(block, header=None, names=columns, skip_blank_lines=False, dtype=dtype).read()
+        frame.index = pd.RangeIndex(start, start + len(block))
+        return frame
+
+    def __iter__(self):
+        if self._frame is not None:
+            for start in range(0, len(self._frame), self.chunk_rows):
+                yield self._frame.iloc[start:start + self.chunk_rows]
+            return
+        rows = _sheet_rows(self.path, self.sheet_name)
+        next(rows, None)
+        # Object columns are read as they are, without the numeric conversion a block of its own would get
+        objects = {col: object for col, dtype in self.dtypes.items() if dtype == np.dtype(object)}
+        for block, start in self._blocks(rows):
+            frame = self._parse(block, start, self.columns, objects or None)
+            casts = {col: dtype for col, dtype in self.dtypes.items() if frame[col].dtype != dtype}
+            yield frame.astype(casts) if casts else frame
+
+
+def fill_sheet(source, target, sheet_name, fill, progress=None, chunk_rows=CHUNK_ROWS):
+    """Stream one sheet of source through fill into a single-sheet xlsx at target; returns (rows, columns).
+
+    fill takes a chunk DataFrame and returns it transformed, with the same
+    columns. A column fill turns to object (a text value written into a
+    numeric column) stays object in the following chunks, as it would in one
+    frame of the whole sheet. progress(rows_done, row_count) is called before
+    the first chunk and after each one. Cells are written as
+    DataFrame.to_excel would write the filled sheet.
+    """
+    chunks = SheetChunks(source, sheet_name, chunk_rows)
+    done = 0
+    if progress is not None:
+        progress(done, chunks.row_count)
+
+    def rows():
+        nonlocal done
+        converted = {}
+        for chunk in chunks:
+            casts = {col: object for col in converted if chunk[col].dtype != object}
+            filled = fill(chunk.astype(casts) if casts else chunk)
+            converted.update((col, object) for col in filled.columns
+                             if filled[col].dtype == object and chunk[col].dtype != object)
+            yield from frame_rows(filled, chunk_rows=chunk_rows)
+            done += len(chunk)
+            if progress is not None:
+                progress(done, chunks.row_count)
+
+    workbook = open_workbook(target)
+    try:
+        worksheet = workbook.add_worksheet(sheet_name)
+        # DataFrame.to_excel's header style
+        header_format = workbook.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+        write_rows(workbook, worksheet, chunks.columns, rows(), header_format=header_format)
+    finally:
+        workbook.close()
+    return done, len(chunks.columns)
@@ -0,0 +1,192 @@
+"""Streamed bulk exports: CSV, NDJSON and Parquet.
+
+The xlsx and docx exports build the whole document before the first byte
+goes out. These encoders turn the (dictionary-encoded) rows into output one
+block of rows at a time and yield each block as soon as it is encoded, so a
+response can stream millions of rows with chunked transfer while memory holds
+only the current block:
+
+* ``csv``: header line, then the rows as DataFrame.to_csv writes them;
+* ``ndjson``: one JSON object per row (missing values as null);
+* ``parquet``: one row group per block; Categorical columns become
+  dictionary-encoded string columns, object columns text. Needs pyarrow.
+
+CSV and NDJSON can be compressed as a whole (``gzip``, or ``zstd`` with the
+zstandard package); for Parquet the compression is the column codec.
+"""
+import io
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from app_package.services.filters import value_text
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency
+    pa = None
+    pq = None
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+
+# Rows encoded per block
+STREAM_CHUNK_ROWS = 50000
+
+STREAM_FORMATS = {
+    'csv': ('csv', 'text/csv'),
+    'ndjson': ('ndjson', 'application/x-ndjson'),
+    'parquet': ('parquet', 'application/vnd.apache.parquet'),
+}
+COMPRESSIONS = {
+    'gzip': ('gz', 'application/gzip'),
+    'zstd': ('zst', 'application/zstd'),
+}
+
+
+class StreamError(ValueError):
+    """Raised for an unknown or unavailable stream format or compression"""
+
+
+def parse_stream_options(fmt, compression=None):
+    """(format, compression or None) from request parameters"""
+    fmt = str(fmt or 'csv').lower()
+    if fmt not in STREAM_FORMATS:
+        raise StreamError(f'Unknown format "{fmt}"; use one of {", ".join(STREAM_FORMATS)}')
+    if fmt == 'parquet' and pa is None:
+        raise StreamError('format=parquet needs pyarrow, which is not installed')
+    compression = str(compression).lower() if compression not in (None, '', 'none') else None
+    if compression is not None and compression not in COMPRESSIONS:
+        raise StreamError(f'Unknown compression "{compression}"; use one of {", ".join(COMPRESSIONS)}')
+    if compression == 'zstd' and zstandard is None and fmt != 'parquet':
+        raise StreamError('compression=zstd needs zstandard, which is not installed')
+    return fmt, compression
+
+
+def stream_file(fmt, compression, name):
+    """(filename, mimetype) of a stream"""
+    extension, mimetype = STREAM_FORMATS[fmt]
+    filename = f'{name}.{extension}'
+    if compression and fmt != 'parquet':
+        suffix, mimetype = COMPRESSIONS[compression]
+        filename += f'.{suffix}'
+    return filename, mimetype
+
+
+def _blocks(df, chunk_rows):
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def csv_chunks(df, chunk_rows=STREAM_CHUNK_ROWS):
+    yield df.iloc[:0].to_csv(index=False).encode('utf-8')
+    for block in _blocks(df, chunk_rows):
+        yield block.to_csv(index=False, header=False).encode('utf-8')
+
+
+def _int_objects(block):
+    """block with Int64 columns as ints and None; to_json writes a column with gaps as floats"""
+    ints = [col for col in block.columns if isinstance(block[col].dtype, pd.Int64Dtype)]
+    if not ints:
+        return block
+    return block.assign(**{col: block[col].astype(object).where(block[col].notna(), None) for col in ints})
+
+
+def ndjson_chunks(df, chunk_rows=STREAM_CHUNK_ROWS):
+    for block in _blocks(df, chunk_rows):
+        block = _int_objects(block)
+        # 15 significant digits (pandas' most; its default is 10), as many as Excel keeps
+        text = block.to_json(orient='records', lines=True, date_format='iso', force_ascii=False, double_precision=15)
+        yield (text if text.endswith('\n') else text + '\n').encode('utf-8')
+
+
+class _Sink(io.RawIOBase):
+    """Write-only file keeping what the Parquet writer wrote since the last drain"""
+
+    def __init__(self):
+        self._parts = []
+        self._size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._size += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._size
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def _arrow_type(series):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return pa.dictionary(pa.int32(), pa.string())
+    if isinstance(series.dtype, pd.Int64Dtype):
+        return pa.int64()
+    if series.dtype.kind in 'biuf':
+        return pa.from_numpy_dtype(series.dtype)
+    if series.dtype.kind == 'M':
+        return pa.timestamp('ns')
+    return pa.string()
+
+
+def _arrow_column(series, arrow_type, dictionaries, position):
+    if pa.types.is_dictionary(arrow_type):
+        if position not in dictionaries:
+            dictionaries[position] = pa.array([value_text(v) for v in series.cat.categories], type=pa.string())
+        codes = series.cat.codes.to_numpy().astype(np.int32)
+        return pa.DictionaryArray.from_arrays(pa.array(codes, mask=codes < 0), dictionaries[position])
+    if pa.types.is_string(arrow_type):
+        return pa.array([None if v is None or (not isinstance(v, str) and pd.isna(v)) else value_text(v)
+                         for v in series.to_numpy(dtype=object)], type=pa.string())
+    return pa.array(series, type=arrow_type, from_pandas=True)
+
+
+def parquet_chunks(df, compression=None, chunk_rows=STREAM_CHUNK_ROWS):
+    names = [str(col) for col in df.columns]
+    types = [_arrow_type(df.iloc[:, i]) for i in range(df.shape[1])]
+    schema = pa.schema(list(zip(names, types)))
+    sink = _Sink()
+    dictionaries = {}
+    writer = pq.ParquetWriter(sink, schema, compression=compression or 'snappy')
+    try:
+        for block in _blocks(df, chunk_rows):
+            arrays = [_arrow_column(block.iloc[:, i], types[i], dictionaries, i) for i in range(block.shape[1])]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def _compressed(chunks, compression):
+    if compression == 'gzip':
+        compressor = zlib.compressobj(wbits=31)  # gzip container
+    else:
+        compressor = zstandard.ZstdCompressor().compressobj()
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_chunks(df, fmt, compression=None, chunk_rows=STREAM_CHUNK_ROWS):
+    """Bytes of df encoded as fmt, one block of rows at a time"""
+    if fmt == 'parquet':
+        return parquet_chunks(df, compression, chunk_rows)
+    chunks = csv_chunks(df, chunk_rows) if fmt == 'csv' else ndjson_chunks(df, chunk_rows)
+    return _compressed(chunks, compression) if compression else chunks
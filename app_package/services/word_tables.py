@@ -0,0 +1,86 @@
+"""Word tables built in one pass.
+
+doc.add_table(rows=n) appends rows one element at a time, and each
+table.rows[i].cells[j].text assignment walks the table's XML again to find
+the cell, so filling a table costs more per cell the larger it gets; the
+reports capped their tables at a few dozen rows because of it. add_table
+writes the XML those calls produce (one paragraph with one run per cell, a
+bold header row) as a single string built from column arrays, with each
+column's cell properties rendered once, and parses it in one go.
+"""
+import re
+from xml.sax.saxutils import escape
+
+import pandas as pd
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+from lxml import etree
+
+
+# Rows of pivot tables written into Word exports
+WORD_TABLE_ROWS = 5000
+
+_NSDECL = ' ' + nsdecls('w')
+_BREAKS = re.compile(r'([\t\r\n])')
+
+
+def plain_text(value):
+    """Cell text of a data value"""
+    return str(value) if pd.notna(value) else ''
+
+
+def number_text(value):
+    """Cell text of a pivot or chart value: numbers with separators and 2 decimals, missing numbers as 0"""
+    if isinstance(value, (int, float)):
+        return f'{value:,.2f}' if not pd.isna(value) else '0'
+    return str(value) if pd.notna(value) else ''
+
+
+def frame_columns(df, text=plain_text):
+    """Cell texts per column of df.
+
+    Values come from df.values, as iterrows hands them out: one array with
+    the frame's common dtype, so e.g. integers in a frame with a float column
+    are formatted as floats.
+    """
+    values = df.values
+    return [[text(value) for value in values[:, j]] for j in range(values.shape[1])]
+
+
+def _t(text):
+    if len(text.strip()) < len(text):
+        return f'<w:t xml:space="preserve">{escape(text)}</w:t>'
+    return f'<w:t>{escape(text)}</w:t>'
+
+
+def _run(text, bold=False):
+    """<w:r> of a text as Run.text writes it: tabs and line breaks become elements"""
+    if not _BREAKS.search(text):
+        content = _t(text) if text else ''
+    else:
+        content = ''.join('<w:tab/>' if part == '\t' else '<w:br/>' if part in '\r\n' else _t(part)
+                          for part in _BREAKS.split(text) if part)
+    properties = '<w:rPr><w:b/></w:rPr>' if bold else ''
+    return f'<w:r>{properties}{content}</w:r>'
+
+
+def add_table(doc, header, columns, style=None):
+    """Append a table of a bold header row plus one row per position of columns (lists of cell texts)"""
+    table = doc.add_table(rows=1, cols=len(header))
+    if style:
+        table.style = style
+    tbl = table._tbl
+    template = tbl.tr_lst[0]
+    # Cell properties (width) of each column, from the row add_table created
+    properties = [etree.tostring(tc.tcPr, encoding='unicode').replace(_NSDECL, '') if tc.tcPr is not None else ''
+                  for tc in template.tc_lst]
+
+    rows = ['<w:tr>' + ''.join(f'<w:tc>{properties[j]}<w:p>{_run(str(name), bold=True)}</w:p></w:tc>'
+                               for j, name in enumerate(header)) + '</w:tr>']
+    for cells in zip(*columns):
+        rows.append('<w:tr>' + ''.join(f'<w:tc>{properties[j]}<w:p>{_run(text)}</w:p></w:tc>'
+                                       for j, text in enumerate(cells)) + '</w:tr>')
+
+    tbl.remove(template)
+    tbl.extend(list(parse_xml(f'<w:tbl{_NSDECL}>{"".join(rows)}</w:tbl>')))
+    return table
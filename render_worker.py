@@ -0,0 +1,20 @@
+"""Entry points of the chart renderer's worker processes.
+
+The workers are spawned, so they import what they run from scratch. This
+module imports plotly only (Kaleido loads on the first image), and nothing
+from app.py or app_package, so a worker starts without the web app.
+"""
+import plotly.io as pio
+
+
+def warm_up():
+    """Worker initializer: start Kaleido before the first real figure arrives"""
+    try:
+        pio.to_image({'data': [], 'layout': {}}, format='png', width=10, height=10)
+    except Exception as e:
+        print(f"[RENDER] Renderer warm-up failed: {e}")
+
+
+def render(spec, width, height, scale):
+    """PNG bytes of a figure given as Plotly JSON"""
+    return pio.to_image(pio.from_json(spec), format='png', width=width, height=height, scale=scale)
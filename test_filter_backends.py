@@ -0,0 +1,76 @@
+"""
+Check that the SQL and DataFrame filter backends select the same records.
+
+Each filter spec is compiled for SQLite and run over an in-memory records table
+(the same JSON column the app stores), with the residual predicate applied to
+the loaded rows like query_records() does. The result must equal the DataFrame
+mask over the same records.
+"""
+import json
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app_package.services.filters import compile_sql, filter_records, parse_filters
+
+ALIASES = {'nameSurname': ['Name Surname', 'nameSurname'], 'company': ['Company', 'company']}
+
+records = [
+    {'ID': 1, 'Name Surname': 'Gökhan Yılmaz', 'Company': 'AP-CB', 'TOTAL MH': 10.0},
+    {'ID': 2, 'Name Surname': 'GÖKHAN YILMAZ', 'Company': 'ap-cb ', 'TOTAL MH': 10},
+    {'ID': 3, 'Name Surname': ' gökhan yılmaz', 'Company': 'Subcon', 'TOTAL MH': '10'},
+    {'ID': 4, 'Name Surname': 'Ayşe Öztürk', 'Company': 'Subcon', 'TOTAL MH': 10.5},
+    {'ID': 5, 'Name Surname': 'Jean-Baptiste', 'Company': '', 'TOTAL MH': '10.0'},
+    {'ID': 6, 'Name Surname': 'nan', 'Company': None, 'TOTAL MH': None},
+    {'ID': 7, 'nameSurname': 'İlker Şahin', 'TOTAL MH': True},
+    {'ID': 8, 'Name Surname': 'Yilmaz', 'Company': 'AP-CB', 'TOTAL MH': 0.1},
+]
+
+specs = [
+    ({'nameSurname': ['gökhan yılmaz']}, True),
+    ({'nameSurname': ['Gökhan Yılmaz']}, False),
+    ({'nameSurname': ['YILMAZ', 'İlker Şahin']}, True),
+    ({'nameSurname': {'contains': 'yılmaz'}}, False),
+    ({'nameSurname': {'prefix': 'gök'}}, False),
+    ({'nameSurname': {'prefix': 'na'}}, False),
+    ({'company': ['ap-cb']}, True),
+    ({'company': ['AP-CB']}, False),
+    ({'company': {'not_in': ['Subcon']}}, False),
+    ({'TOTAL MH': ['10']}, False),
+    ({'TOTAL MH': ['10.0']}, False),
+    ({'TOTAL MH': [10.5]}, True),
+    ({'TOTAL MH': ['True']}, False),
+    ({'TOTAL MH': {'contains': '10.'}}, False),
+    ({'TOTAL MH': {'gte': 10}}, False),
+    ({'TOTAL MH': {'gt': 0, 'lt': 10}}, False),
+    ({'TOTAL MH': {'not': ['10']}, 'company': ['subcon']}, True),
+]
+
+conn = sqlite3.connect(':memory:')
+conn.execute('CREATE TABLE records (id INTEGER PRIMARY KEY, data TEXT)')
+conn.executemany('INSERT INTO records (data) VALUES (?)', [(json.dumps(r),) for r in records])
+
+print("Comparing SQL and DataFrame filter backends:")
+print("=" * 80)
+
+failures = 0
+for spec, loose in specs:
+    predicate = parse_filters(spec, aliases=ALIASES, loose=loose)
+    compiled = compile_sql(predicate, 'sqlite')
+    sql = 'SELECT data FROM records'
+    if compiled.clause:
+        sql += f' WHERE {compiled.clause}'
+    loaded = [json.loads(row[0]) for row in conn.execute(sql, compiled.params)]
+    via_sql = sorted(r['ID'] for r in filter_records(loaded, compiled.residual))
+    via_mask = sorted(r['ID'] for r in filter_records(records, predicate))
+    ok = via_sql == via_mask
+    failures += not ok
+    pushed = 'pushed' if compiled.clause else 'residual'
+    print(f"{'OK  ' if ok else 'FAIL'} {json.dumps(spec, ensure_ascii=False)} loose={loose} ({pushed}): "
+          f"sql={via_sql} mask={via_mask}")
+
+print("=" * 80)
+print(f"{len(specs) - failures} of {len(specs)} specs agree")
+sys.exit(1 if failures else 0)